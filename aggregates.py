@@ -0,0 +1,317 @@
+"""
+Per magic number aggregates kept next to the trades: the metrics kernel's state
+in 'magic_aggregates' and day/week/month rollups in 'magic_rollups', folded one
+trade at a time on in-order writes and rebuilt from 'trades' otherwise.
+"""
+# Standard Library Imports
+import json
+import logging
+import os
+import sqlite3
+
+# Third-Party Imports
+import numpy as np
+import pandas as pd
+
+# Local Imports
+from database import begin_write, db_pool, get_db_path
+from monitoring import metrics
+from schema import _read_sync_meta, _trade_code, _trade_time, load_trade_codes
+from snapshot import read_filtered_trades
+from trade_metrics import (
+    AGGREGATE_STATE_KEYS, _label_mask, _prepare_trades_frame, _to_float, build_aggregate_state,
+    empty_aggregate_state, fold_trade
+)
+
+logger = logging.getLogger(__name__)
+
+# ==================================================== #
+def _load_aggregate_state(row):
+    """Decode a stored aggregate state; None when missing or written before a state field was added."""
+    if row is None:
+        return None
+    state = json.loads(row[0])
+    return state if state.keys() >= AGGREGATE_STATE_KEYS else None
+
+def _ensure_aggregate_table(cursor):
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS magic_aggregates (magic_number INTEGER PRIMARY KEY, state TEXT NOT NULL)"
+    )
+
+# ==================================================== #
+# Period rollups: one row per (magic number, period, bucket start), bucketed by close time.
+ROLLUP_PERIODS = ("day", "week", "month")
+ROLLUP_SUMS = (
+    "trades", "profit", "win_n", "loss_n", "buy_n", "sell_n", "buy_profit", "sell_profit",
+    "volume", "commission", "swap"
+)
+
+def _ensure_rollup_table(cursor):
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS magic_rollups (magic_number INTEGER NOT NULL, period TEXT NOT NULL, "
+        "bucket TEXT NOT NULL, trades INTEGER NOT NULL, profit REAL NOT NULL, win_n INTEGER NOT NULL, "
+        "loss_n INTEGER NOT NULL, buy_n INTEGER NOT NULL, sell_n INTEGER NOT NULL, buy_profit REAL NOT NULL, "
+        "sell_profit REAL NOT NULL, volume REAL NOT NULL, commission REAL NOT NULL, swap REAL NOT NULL, "
+        "equity REAL NOT NULL, PRIMARY KEY (magic_number, period, bucket))"
+    )
+
+def rollup_buckets(close_time):
+    """Start date of the day, week (Monday) and month a close time falls in."""
+    day = _trade_time(close_time).normalize()
+    return {
+        "day": day.strftime("%Y-%m-%d"),
+        "week": (day - pd.Timedelta(days=day.weekday())).strftime("%Y-%m-%d"),
+        "month": day.strftime("%Y-%m-01")
+    }
+
+def build_rollups(df):
+    """
+    Sum the trades of one magic number into day, week and month buckets.
+
+    Parameters:
+        df (pd.DataFrame): Lower-cased columns with close times parsed, ordered by close time.
+
+    Returns:
+        list: (period, bucket, *ROLLUP_SUMS, equity) tuples; equity is the running
+              profit total at the bucket's last trade.
+    """
+    if df.empty:
+        return []
+    profit = df["profit"].astype(np.float64).fillna(0.0)
+    buy = pd.Series(_label_mask(df["order_type"], "buy", lower=True), index=df.index)
+    sell = pd.Series(_label_mask(df["order_type"], "sell", lower=True), index=df.index)
+    columns = pd.DataFrame({
+        "trades": 1, "profit": profit,
+        "win_n": (profit > 0).astype(int), "loss_n": (profit < 0).astype(int),
+        "buy_n": buy.astype(int), "sell_n": sell.astype(int),
+        "buy_profit": profit.where(buy, 0.0), "sell_profit": profit.where(sell, 0.0),
+        "volume": df["volume"].astype(np.float64).fillna(0.0),
+        "commission": df["commission"].astype(np.float64).fillna(0.0),
+        "swap": df["swap"].astype(np.float64).fillna(0.0),
+        "equity": profit.cumsum()
+    })
+    day = df["close_time"].dt.normalize()
+    starts = {
+        "day": day,
+        "week": day - pd.to_timedelta(day.dt.weekday, unit="D"),
+        "month": day.dt.to_period("M").dt.start_time
+    }
+
+    rows = []
+    for period in ROLLUP_PERIODS:
+        grouped = columns.groupby(starts[period].dt.strftime("%Y-%m-%d").to_numpy(), sort=True)
+        sums = grouped[list(ROLLUP_SUMS)].sum()
+        sums["equity"] = grouped["equity"].last()
+        rows.extend((period, bucket, *values) for bucket, values in zip(sums.index, sums.itertuples(index=False)))
+    return rows
+
+def _store_rollups(cursor, magic_number, rows):
+    """Replace the rollups of one magic number with build_rollups() output."""
+    _ensure_rollup_table(cursor)
+    cursor.execute("DELETE FROM magic_rollups WHERE magic_number = ?", (magic_number,))
+    placeholders = ", ".join("?" for _ in range(len(ROLLUP_SUMS) + 4))
+    cursor.executemany(
+        f"INSERT INTO magic_rollups VALUES ({placeholders})",
+        [(magic_number, period, bucket, *(value.item() if hasattr(value, "item") else value for value in values))
+         for period, bucket, *values in rows]
+    )
+
+def _fold_rollups(cursor, magic_number, trade, equity):
+    """Add one trade to its day, week and month buckets; `equity` is the running total after it."""
+    profit = _to_float(trade.get("profit"))
+    profit = 0.0 if np.isnan(profit) else profit
+    side = str(_trade_code("order_type", trade.get("order_type"))).lower()
+    amounts = {key: _to_float(trade.get(key)) for key in ("volume", "commission", "swap")}
+    values = (
+        1, profit, int(profit > 0), int(profit < 0), int(side == "buy"), int(side == "sell"),
+        profit if side == "buy" else 0.0, profit if side == "sell" else 0.0,
+        *(0.0 if np.isnan(value) else value for value in amounts.values())
+    )
+    updates = ", ".join(f"{name} = {name} + excluded.{name}" for name in ROLLUP_SUMS)
+    placeholders = ", ".join("?" for _ in range(len(ROLLUP_SUMS) + 4))
+    for period, bucket in rollup_buckets(trade.get("close_time")).items():
+        cursor.execute(
+            f"INSERT INTO magic_rollups VALUES ({placeholders}) ON CONFLICT (magic_number, period, bucket) "
+            f"DO UPDATE SET {updates}, equity = excluded.equity",
+            (magic_number, period, bucket, *values, equity)
+        )
+
+def _has_rollups(cursor, magic_number):
+    cursor.execute("SELECT 1 FROM magic_rollups WHERE magic_number = ? LIMIT 1", (magic_number,))
+    return cursor.fetchone() is not None
+
+# ==================================================== #
+def rebuild_aggregates(conn, magic_numbers=None):
+    """
+    Rebuild the aggregate state and period rollups of the given magic numbers
+    (default: all of them) from the 'trades' table, inside the caller's transaction.
+    """
+    cursor = conn.cursor()
+    _ensure_aggregate_table(cursor)
+    _ensure_rollup_table(cursor)
+    if magic_numbers is None:
+        cursor.execute("DELETE FROM magic_aggregates")
+        cursor.execute("DELETE FROM magic_rollups")
+        cursor.execute("SELECT DISTINCT Magic_Number FROM trades")
+        magic_numbers = [row[0] for row in cursor.fetchall()]
+
+    codes = load_trade_codes(cursor)
+    for magic_number in magic_numbers:
+        with metrics.timer("stage_duration_seconds", stage="sql_read"):
+            df = pd.read_sql_query(
+                "SELECT * FROM trades WHERE Magic_Number = ? ORDER BY Close_Time", conn, params=(magic_number,)
+            )
+        df = _prepare_trades_frame(df, codes)
+        state = build_aggregate_state(df)
+        cursor.execute(
+            "INSERT OR REPLACE INTO magic_aggregates (magic_number, state) VALUES (?, ?)",
+            (magic_number, json.dumps(state))
+        )
+        with metrics.timer("stage_duration_seconds", stage="build_rollups"):
+            _store_rollups(cursor, magic_number, build_rollups(df))
+
+# ==================================================== #
+def apply_trades_to_aggregates(conn, trades):
+    """
+    Fold newly inserted trades into their magic number's aggregate state and period
+    rollups, O(1) per trade.
+
+    Must run in the same transaction as the insert. A magic number without a stored
+    state or rollups, or one receiving a trade closed before its latest close, is
+    rebuilt from the 'trades' table instead so both always match a full recomputation.
+
+    Parameters:
+        conn (sqlite3.Connection): Connection holding the insert transaction.
+        trades (iterable): Dicts of lower-cased column name -> raw value.
+    """
+    cursor = conn.cursor()
+    _ensure_aggregate_table(cursor)
+    _ensure_rollup_table(cursor)
+    states = {}
+    stale = set()
+
+    for trade in trades:
+        magic_number = int(trade["magic_number"])
+        if magic_number in stale:
+            continue
+        if magic_number not in states:
+            cursor.execute("SELECT state FROM magic_aggregates WHERE magic_number = ?", (magic_number,))
+            state = _load_aggregate_state(cursor.fetchone())
+            if state is None or (state["n"] and not _has_rollups(cursor, magic_number)):
+                stale.add(magic_number)
+                continue
+            states[magic_number] = state
+
+        state = states[magic_number]
+        if state["max_close"] is not None and _trade_time(trade.get("close_time")) < pd.Timestamp(state["max_close"]):
+            stale.add(magic_number)
+            del states[magic_number]
+            continue
+        fold_trade(state, trade)
+        _fold_rollups(cursor, magic_number, trade, state["equity"]["all"]["equity"])
+
+    for magic_number, state in states.items():
+        cursor.execute(
+            "UPDATE magic_aggregates SET state = ? WHERE magic_number = ?", (json.dumps(state), magic_number)
+        )
+    if stale:
+        rebuild_aggregates(conn, sorted(stale))
+
+# ==================================================== #
+def read_aggregate_state(client_id, magic_number):
+    """
+    Read the aggregate state of one Magic_Number, building it on first use for
+    databases ingested before aggregates (or one of their fields) existed.
+    """
+    db_path = get_db_path(client_id)
+
+    if not os.path.exists(db_path):
+        logger.error(f"Original database not found: {db_path}")
+        return {"status": "error", "message": "Original database not found"}
+
+    try:
+        with metrics.timer("stage_duration_seconds", stage="sql_read"), db_pool.connection(db_path) as conn:
+            cursor = conn.cursor()
+            _ensure_aggregate_table(cursor)
+            cursor.execute("SELECT state FROM magic_aggregates WHERE magic_number = ?", (magic_number,))
+            state = _load_aggregate_state(cursor.fetchone())
+
+        if state is None:
+            # Build from the columnar snapshot; store it only if no write landed meanwhile
+            trades = read_filtered_trades(client_id, magic_number)
+            if trades["status"] == "error":
+                return trades
+            state = build_aggregate_state(trades["data"]) if trades["status"] == "success" else empty_aggregate_state()
+            with db_pool.connection(db_path) as conn:
+                cursor = conn.cursor()
+                begin_write(cursor)
+                if trades.get("fingerprint") == _read_sync_meta(cursor)["fingerprint"]:
+                    cursor.execute(
+                        "INSERT OR REPLACE INTO magic_aggregates (magic_number, state) VALUES (?, ?)",
+                        (magic_number, json.dumps(state))
+                    )
+                    if trades["status"] == "success":
+                        _store_rollups(cursor, magic_number, build_rollups(trades["data"]))
+
+        if state["n"] == 0:
+            logger.warning(f"No transactions found for Magic_Number {magic_number}.")
+            return {"status": "warning", "message": "No transactions found for the specified Magic_Number"}
+
+        return {"status": "success", "message": "Aggregate state loaded", "data": state}
+
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+        return {"status": "error", "message": f"Database error: {e}"}
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        return {"status": "error", "message": f"Unexpected error: {e}"}
+
+# ==================================================== #
+def read_period_rollups(client_id, magic_number, period, start=None, end=None):
+    """
+    Read the day/week/month rollups of one Magic_Number, oldest bucket first.
+
+    Buckets overlapping `start`..`end` are returned. Databases ingested before
+    rollups existed get them built on first use.
+    """
+    db_path = get_db_path(client_id)
+
+    if not os.path.exists(db_path):
+        logger.error(f"Original database not found: {db_path}")
+        return {"status": "error", "message": "Original database not found"}
+
+    query = "SELECT * FROM magic_rollups WHERE magic_number = ? AND period = ?"
+    params = [magic_number, period]
+    if start is not None:
+        query += " AND bucket >= ?"
+        params.append(rollup_buckets(start)[period])
+    if end is not None:
+        query += " AND bucket <= ?"
+        params.append(end.strftime("%Y-%m-%d"))
+
+    try:
+        with metrics.timer("stage_duration_seconds", stage="sql_read"), db_pool.connection(db_path) as conn:
+            cursor = conn.cursor()
+            _ensure_rollup_table(cursor)
+            if not _has_rollups(cursor, magic_number):
+                begin_write(cursor)
+                cursor.execute("SELECT 1 FROM trades WHERE Magic_Number = ? LIMIT 1", (magic_number,))
+                if cursor.fetchone() is not None and not _has_rollups(cursor, magic_number):
+                    rebuild_aggregates(conn, [magic_number])
+                conn.commit()
+            cursor.execute(query + " ORDER BY bucket", params)
+            names = [column[0] for column in cursor.description]
+            rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+
+        if not rows:
+            logger.warning(f"No rollups found for Magic_Number {magic_number}.")
+            return {"status": "warning", "message": "No transactions found for the specified Magic_Number and range"}
+
+        return {"status": "success", "message": "Rollups loaded", "data": rows}
+
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+        return {"status": "error", "message": f"Database error: {e}"}
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        return {"status": "error", "message": f"Unexpected error: {e}"}
@@ -1,17 +1,54 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
+from werkzeug.utils import secure_filename
 import os
 
+from uploads import (
+    ChunkedUploadStore, DecompressingReader, UploadError, UnknownUploadError, IncompleteUploadError,
+    UploadTooLargeError, decompress_request_body, is_path_segment, split_compression
+)
+
 app = Flask(__name__)
 
 # Set the base directory to save files
 UPLOAD_FOLDER = '/root/EA_Server/ServerUpload'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Partial resumable uploads are assembled here, next to the client folders
+chunked_uploads = ChunkedUploadStore(os.path.join(UPLOAD_FOLDER, '_chunked'))
+
+# Upload bodies sent with Content-Encoding: gzip / zstd are inflated as they are read
+DECOMPRESSED_BODY_ENDPOINTS = {'upload_csv', 'put_upload_chunk'}
+
+@app.before_request
+def decompress_body():
+    if request.endpoint not in DECOMPRESSED_BODY_ENDPOINTS:
+        return None
+    try:
+        g.body_decompression = decompress_request_body(request.environ)
+    except UploadError as e:
+        return jsonify({'status': 'fail', 'message': str(e)}), 415
+
+# Write a .gz / .zst upload to file_path uncompressed, streaming
+def save_decompressed(stream, encoding, file_path):
+    try:
+        with open(file_path, 'wb') as f:
+            for piece in DecompressingReader(stream, encoding):
+                f.write(piece)
+    except UploadError:
+        os.remove(file_path)
+        raise
+
 @app.route('/upload_csv', methods=['POST'])
 def upload_csv():
     client_id = request.form.get('clientID')
+    # The form parser drops a body that inflates past the limit without raising
+    reader = g.get('body_decompression')
+    if reader and reader.bytes_out > reader.max_bytes:
+        return jsonify({'status': 'fail', 'message': f'Upload inflates to more than {reader.max_bytes} bytes'}), 413
     if not client_id:
         return jsonify({'status': 'fail', 'message': 'Missing clientID'}), 400
+    if not is_path_segment(client_id):
+        return jsonify({'status': 'fail', 'message': 'Invalid clientID'}), 400
 
     if 'file' not in request.files:
         return jsonify({'status': 'fail', 'message': 'No file part'}), 400
@@ -24,14 +61,101 @@ def upload_csv():
     client_folder = os.path.join(app.config['UPLOAD_FOLDER'], client_id)
     os.makedirs(client_folder, exist_ok=True)
 
-    # Check if the file already exists
-    file_path = os.path.join(client_folder, file.filename)
+    # Check if the file already exists (compressed uploads are stored uncompressed)
+    filename, encoding = split_compression(secure_filename(file.filename))
+    file_path = os.path.join(client_folder, filename)
     if os.path.exists(file_path):
         return jsonify({'status': 'fail', 'message': 'File already exists', 'path': file_path}), 409
 
     # Save the file in the client's folder
-    file.save(file_path)
+    if encoding:
+        try:
+            save_decompressed(file.stream, encoding, file_path)
+        except UploadError as e:
+            return jsonify({'status': 'fail', 'message': str(e)}), 413 if isinstance(e, UploadTooLargeError) else 400
+    else:
+        file.save(file_path)
+
+    return jsonify({'status': 'success', 'message': 'File uploaded successfully', 'path': file_path}), 200
+
+# Resumable upload_csv: init with clientID, filename, size and chunk_size, send every
+# chunk as a raw body with ?offset=<bytes>&checksum=<sha256 hex>, check which are
+# missing, then finalize.
+def chunked_upload_error(e):
+    status_code = (
+        404 if isinstance(e, UnknownUploadError) else 409 if isinstance(e, IncompleteUploadError)
+        else 413 if isinstance(e, UploadTooLargeError) else 400
+    )
+    return jsonify({'status': 'fail', 'message': str(e)}), status_code
+
+@app.route('/upload_csv/chunked', methods=['POST'])
+def init_chunked_upload():
+    client_id = request.form.get('clientID')
+    filename = secure_filename(request.form.get('filename', ''))
+    stored_name, _ = split_compression(filename)
+    if not client_id:
+        return jsonify({'status': 'fail', 'message': 'Missing clientID'}), 400
+    if not is_path_segment(client_id):
+        return jsonify({'status': 'fail', 'message': 'Invalid clientID'}), 400
+    if filename == '':
+        return jsonify({'status': 'fail', 'message': 'No selected file'}), 400
+
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], client_id, stored_name)
+    if os.path.exists(file_path):
+        return jsonify({'status': 'fail', 'message': 'File already exists', 'path': file_path}), 409
+
+    try:
+        upload = chunked_uploads.create(
+            request.form.get('size'), request.form.get('chunk_size'), {'clientID': client_id, 'filename': filename}
+        )
+    except UploadError as e:
+        return chunked_upload_error(e)
+    return jsonify({'status': 'success', **upload}), 201
+
+@app.route('/upload_csv/chunked/<upload_id>/<int:index>', methods=['PUT', 'POST'])
+def put_upload_chunk(upload_id, index):
+    try:
+        result = chunked_uploads.write_chunk(
+            upload_id, index, request.args.get('offset'), request.stream, request.args.get('checksum')
+        )
+    except UploadError as e:
+        return chunked_upload_error(e)
+    return jsonify({'status': 'success', **result}), 200
+
+@app.route('/upload_csv/chunked/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    try:
+        return jsonify({'status': 'success', **chunked_uploads.status(upload_id)}), 200
+    except UploadError as e:
+        return chunked_upload_error(e)
+
+@app.route('/upload_csv/chunked/<upload_id>/finalize', methods=['POST'])
+def finalize_chunked_upload(upload_id):
+    try:
+        meta = chunked_uploads.get(upload_id)['meta']
+        if not is_path_segment(meta['clientID']) or not is_path_segment(meta['filename']):
+            chunked_uploads.discard(upload_id)
+            return jsonify({'status': 'fail', 'message': 'Invalid clientID or filename'}), 400
+        client_folder = os.path.join(app.config['UPLOAD_FOLDER'], meta['clientID'])
+        os.makedirs(client_folder, exist_ok=True)
+
+        filename, encoding = split_compression(meta['filename'])
+        file_path = os.path.join(client_folder, filename)
+        if os.path.exists(file_path):
+            chunked_uploads.discard(upload_id)
+            return jsonify({'status': 'fail', 'message': 'File already exists', 'path': file_path}), 409
 
+        if encoding:
+            compressed_path = chunked_uploads.complete(upload_id, os.path.join(client_folder, f'.{upload_id}.part'))
+            try:
+                with open(compressed_path, 'rb') as f:
+                    save_decompressed(f, encoding, file_path)
+            finally:
+                os.remove(compressed_path)
+        else:
+            chunked_uploads.complete(upload_id, file_path)
+    except UploadError as e:
+        return chunked_upload_error(e)
     return jsonify({'status': 'success', 'message': 'File uploaded successfully', 'path': file_path}), 200
 
 @app.route('/check_file', methods=['GET'])
@@ -0,0 +1,352 @@
+"""
+Benchmark suite for the metrics kernel (trade_metrics.py), ingestion and endpoints in main.py.
+
+Trades come from a deterministic synthetic MT5 generator, so runs on the same
+machine are comparable. Every benchmark runs against a temporary UPLOAD_DIR and
+main database; nothing under the configured folders is touched.
+
+    python benchmark.py --sizes 1000,100000 --output baseline.json
+    python benchmark.py --sizes 1000,100000 --compare baseline.json --threshold 0.15
+"""
+# Standard Library Imports
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# Third-Party Imports
+import numpy as np
+import pandas as pd
+
+# Local Imports
+import config
+import main
+import schema
+import trade_metrics
+
+DEFAULT_SIZES = (1_000, 100_000, 10_000_000)
+
+# The calculate_* helpers in the order calculate_outputs_legacy calls them.
+LEGACY_HELPERS = [
+    "calculate_most_volume", "get_smallest_open_time", "get_largest_close_time", "calculate_total_profit",
+    "calculate_profit_factor", "calculate_trades_won_percentage", "calculate_expected_payoff",
+    "calculate_net_profit", "calculate_net_loss", "calculate_balance_max_drawdown", "calculate_drawdown",
+    "calculate_max_min_drawdowns", "calculate_floating_drawdown", "calculate_quantity_metrics",
+    "calculate_profitability_metrics", "calculate_profit_distribution", "calculate_time_metrics",
+    "calculate_time_extremes", "calculate_win_loss_metrics", "calculate_closure_metrics",
+    "calculate_additional_metrics", "calculate_streak_metrics", "calculate_drawdown_timing"
+]
+
+# Helpers that are slow enough per call to only be run once above this size.
+SINGLE_RUN_ROWS = 1_000_000
+
+# ==================================================== #
+def generate_trades(n, seed=0, magic_number=1, start="2023-01-01"):
+    """
+    Generate n closed trades with the columns of the EA's CSV export.
+
+    The schema matches what upload_transaction_to_db accepts (Order_Type is sent
+    as "Type" there). Trades are ordered by open time; the same (n, seed) always
+    gives the same frame.
+    """
+    rng = np.random.default_rng(seed)
+    open_offsets = np.sort(rng.integers(0, 30_000_000, n))
+    durations = rng.integers(60, 200_000, n)
+    open_time = pd.Timestamp(start) + pd.to_timedelta(open_offsets, unit="s")
+    close_time = open_time + pd.to_timedelta(durations, unit="s")
+    open_price = np.round(rng.uniform(1.05, 1.15, n), 5)
+    close_price = np.round(open_price + rng.normal(0, 0.002, n), 5)
+
+    return pd.DataFrame({
+        "Open_Time": open_time.strftime("%Y.%m.%d %H:%M:%S"),
+        "Symbol": "EURUSD",
+        "Magic_Number": magic_number,
+        "Order_Type": rng.choice(["buy", "sell"], n),
+        "Volume": np.round(rng.uniform(0.01, 2, n), 2),
+        "Open_Price": open_price,
+        "S_L": np.round(open_price - 0.005, 5),
+        "T_P": np.round(open_price + 0.005, 5),
+        "Close_Price": close_price,
+        "Close_Time": close_time.strftime("%Y.%m.%d %H:%M:%S"),
+        "Commission": np.round(-rng.uniform(0, 3, n), 2),
+        "Swap": np.round(rng.normal(0, 1, n), 2),
+        "Profit": np.round(rng.normal(2, 50, n), 2),
+        "Profit_Points": rng.integers(-500, 500, n),
+        "Duration": durations,
+        "Open_Comment": "",
+        "Close_Comment": "",
+        "Close_Reason": rng.choice(["sl", "tp", "order"], n),
+        "Floating_Drawdown": np.round(rng.uniform(-10, 0, n), 2),
+        "Floating_Drawdown_Currency": np.round(rng.uniform(-500, 0, n), 2)
+    })
+
+# ==================================================== #
+def transaction_payloads(df, client_id):
+    """Turn generated trades into /upload_transaction JSON bodies."""
+    records = df.rename(columns={"Order_Type": "Type"}).to_dict(orient="records")
+    for record in records:
+        record["client_id"] = client_id
+        for key, value in record.items():
+            if isinstance(value, np.generic):
+                record[key] = value.item()
+    return records
+
+def prepared_frame(df):
+    """The lower-cased, time-parsed frame the calculate_* helpers expect."""
+    return trade_metrics._prepare_trades_frame(df.copy())
+
+# ==================================================== #
+class BenchmarkRun:
+    """Collects timings as {"name", "rows", "seconds", "rows_per_sec"} records."""
+
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = []
+
+    def time(self, name, rows, func, setup=None, repeat=None):
+        """Run func (after an untimed setup, if given) and keep the best of the repeats."""
+        repeat = repeat or (1 if rows > SINGLE_RUN_ROWS else self.repeat)
+        best = None
+        for _ in range(repeat):
+            argument = setup() if setup else None
+            started = time.perf_counter()
+            func(argument) if setup else func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        self.results.append({
+            "name": name,
+            "rows": rows,
+            "seconds": round(best, 6),
+            "rows_per_sec": round(rows / best, 1) if best > 0 else None
+        })
+        print(f"{name:<45} {rows:>10} rows {best:>10.4f} s", file=sys.stderr)
+
+    def memory(self, name, rows, func):
+        """Run func once under tracemalloc and record the peak of its allocations as "peak_bytes"."""
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.results.append({"name": name, "rows": rows, "peak_bytes": peak})
+        print(f"{name:<45} {rows:>10} rows {peak / 2 ** 20:>10.1f} MiB", file=sys.stderr)
+
+# ==================================================== #
+def bench_metrics(run, df):
+    """Each calculate_* helper, then the legacy and fused pipelines."""
+    n = len(df)
+    frame = prepared_frame(df)
+
+    # The helpers modify the frame (durations become timedeltas), so each one runs
+    # on a copy of the frame as the legacy pipeline leaves it at that point.
+    staged = frame.copy()
+    helpers = LEGACY_HELPERS + sorted(
+        name for name in dir(trade_metrics)
+        if name.startswith("calculate_") and name not in LEGACY_HELPERS + ["calculate_outputs", "calculate_outputs_legacy"]
+    )
+    for name in helpers:
+        run.time(name, n, getattr(trade_metrics, name), setup=staged.copy)
+        getattr(trade_metrics, name)(staged)
+
+    run.time("calculate_outputs_legacy", n, trade_metrics.calculate_outputs_legacy, setup=frame.copy)
+    run.time("compute_metrics", n, trade_metrics.compute_metrics, setup=frame.copy)
+    run.time("build_aggregate_state", n, trade_metrics.build_aggregate_state, setup=frame.copy)
+    state = trade_metrics.build_aggregate_state(frame.copy())
+    run.time("render_outputs", n, lambda: trade_metrics.render_outputs(state))
+    run.time("render_outputs (structured)", n, lambda: trade_metrics.render_outputs(state, trade_metrics.StructuredFields))
+    run.time("pipeline", n, trade_metrics.calculate_outputs, setup=df.copy)
+
+def bench_ingestion(run, df, workdir):
+    """CSV ingestion through save_csv_to_database, a delta append and the snapshot read."""
+    n = len(df)
+    csv_path = os.path.join(workdir, "trades.csv")
+    df.to_csv(csv_path, index=False)
+    client_id = "bench_ingest"
+    os.makedirs(os.path.join(config.UPLOAD_DIR, client_id), exist_ok=True)
+
+    run.time("save_csv_to_database", n, lambda: main.save_csv_to_database(client_id, csv_path))
+
+    delta = generate_trades(max(1, n // 100), seed=99, start="2031-01-01")
+    delta_path = os.path.join(workdir, "delta.csv")
+    delta.to_csv(delta_path, index=False)
+
+    def append():
+        main.save_csv_to_database(client_id, csv_path)
+        return main.count_database_rows(client_id)
+
+    run.time(
+        "append_csv_to_database", len(delta),
+        lambda rows: main.append_csv_to_database(client_id, delta_path, rows + len(delta)),
+        setup=append
+    )
+    run.time("read_filtered_trades", n, lambda: main.read_filtered_trades(client_id, 1))
+
+def bench_endpoints(run, df):
+    """The Flask endpoints through the test client."""
+    n = len(df)
+    client = main.app.test_client()
+    client_id = "bench_api"
+    csv_bytes = df.to_csv(index=False).encode()
+    upload_url = f"/{config.call_back_token}/check_and_upload"
+    outputs_url = f"/{config.call_back_token_sync}/get_filtered_outputs?client_id={client_id}&magic_number=1"
+
+    first_uploads = (f"{client_id}_{i}" for i in itertools.count())
+    fingerprint = schema.csv_fingerprint(io.StringIO(csv_bytes.decode()))
+
+    def upload(target=None):
+        """A full upload, to a client without trades yet unless `target` is given."""
+        response = client.post(upload_url, data={
+            "clientID": target or next(first_uploads), "rows_count": str(n),
+            "file": (io.BytesIO(csv_bytes), "trades.csv")
+        }, content_type="multipart/form-data")
+        assert response.status_code == 201, response.get_json()
+
+    def up_to_date():
+        response = client.post(upload_url, data={"clientID": client_id, "rows_count": str(n), "fingerprint": fingerprint})
+        assert response.get_json()["fingerprint"] == fingerprint, response.get_json()
+
+    run.time("POST check_and_upload (full)", n, upload)
+    run.memory("POST check_and_upload (full) peak memory", n, upload)
+    upload(client_id)
+    run.time("POST check_and_upload (up to date)", n, up_to_date)
+
+    run.time("GET get_filtered_outputs (cold)", n, lambda _: client.get(outputs_url),
+             setup=lambda: main.result_cache.invalidate_client(client_id))
+    run.time("GET get_filtered_outputs (cached)", n, lambda: client.get(outputs_url))
+    run.time("GET get_filtered_outputs (structured, cached)", n, lambda: client.get(outputs_url + "&format=structured"))
+    if main.msgpack is not None:
+        run.time("GET get_filtered_outputs (msgpack, cached)", n, lambda: client.get(outputs_url + "&format=msgpack"))
+
+    payloads = iter(transaction_payloads(generate_trades(1_000, seed=7, start="2032-01-01"), client_id))
+    run.time("POST upload_transaction", 1, lambda: client.post("/upload_transaction", json=next(payloads)), repeat=10)
+    batch = transaction_payloads(generate_trades(100, seed=8, start="2033-01-01"), client_id)
+    run.time("POST upload_transactions (100)", 100, lambda: client.post("/upload_transactions", json=batch), repeat=1)
+    run.time("GET portfolio", n, lambda: client.get(f"/{config.call_back_token_sync}/portfolio").get_data())
+
+# ==================================================== #
+def create_main_database(path):
+    """Create the Trade_Transaction table upload_transaction_to_db writes to."""
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS Trade_Transaction (open_time, symbol, magic_number, type, volume, "
+            "open_price, sl, tp, close_price, close_time, commission, swap, profit, profit_points, duration, "
+            "open_comment, close_comment, floating_drawdown, floating_drawdown_currency)"
+        )
+
+def run_benchmarks(sizes, repeat, seed, suites):
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    saved = (config.UPLOAD_DIR, config.database_file_path)
+    config.UPLOAD_DIR = os.path.join(workdir, "uploads")
+    config.database_file_path = os.path.join(workdir, "main.db")
+    os.makedirs(config.UPLOAD_DIR)
+    create_main_database(config.database_file_path)
+    main.logger.setLevel("WARNING")
+
+    run = BenchmarkRun(repeat)
+    try:
+        for n in sizes:
+            df = generate_trades(n, seed)
+            if "metrics" in suites:
+                bench_metrics(run, df)
+            if "ingestion" in suites:
+                bench_ingestion(run, df, workdir)
+            if "endpoints" in suites:
+                bench_endpoints(run, df)
+    finally:
+        config.UPLOAD_DIR, config.database_file_path = saved
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "sizes": list(sizes),
+            "seed": seed,
+            "repeat": repeat
+        },
+        "results": run.results
+    }
+
+# ==================================================== #
+def compare_results(current, baseline, threshold):
+    """
+    Compare timings by (name, rows) against a saved baseline; memory records are
+    reported as measured but not compared.
+
+    Returns:
+        list: One record per benchmark found in both, flagged "regression" when it
+              got slower by more than `threshold` (0.1 = 10 %).
+    """
+    previous = {
+        (result["name"], result["rows"]): result["seconds"] for result in baseline["results"] if "seconds" in result
+    }
+    report = []
+    for result in current["results"]:
+        before = previous.get((result["name"], result["rows"])) if "seconds" in result else None
+        if not before:
+            continue
+        ratio = result["seconds"] / before
+        report.append({
+            "name": result["name"],
+            "rows": result["rows"],
+            "baseline_seconds": before,
+            "seconds": result["seconds"],
+            "ratio": round(ratio, 3),
+            "regression": ratio > 1 + threshold
+        })
+    return report
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the metrics, ingestion and endpoints.")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES),
+                        help="Comma-separated row counts (default: 1k, 100k and 10M)")
+    parser.add_argument("--suites", default="metrics,ingestion,endpoints",
+                        help="Comma-separated subset of metrics, ingestion, endpoints")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark, the best one is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this file (default: stdout)")
+    parser.add_argument("--compare", help="Baseline JSON to compare against; exits 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown before flagging (0.10 = 10 %%)")
+    return parser.parse_args(argv)
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    suites = {suite.strip() for suite in args.suites.split(",")}
+
+    results = run_benchmarks(sizes, args.repeat, args.seed, suites)
+
+    if args.compare:
+        with open(args.compare) as f:
+            results["comparison"] = compare_results(results, json.load(f), args.threshold)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    regressions = [item for item in results.get("comparison", []) if item["regression"]]
+    for item in regressions:
+        print(f"REGRESSION {item['name']} [{item['rows']} rows]: {item['baseline_seconds']}s -> "
+              f"{item['seconds']}s (x{item['ratio']})", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
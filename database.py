@@ -0,0 +1,171 @@
+"""
+Per-client SQLite databases: where they live, the pool of WAL connections every
+reader and writer checks out, and BEGIN IMMEDIATE write transactions.
+
+    with db_pool.connection(get_db_path(client_id)) as conn:
+        cursor = conn.cursor()
+        begin_write(cursor)
+        ...
+
+main.py installs the schema upgrades (migrations.upgrade_schema) as the pool's
+on_connect hook, so every connection handed out sees the current schema.
+"""
+# Standard Library Imports
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Local Imports
+import config
+from monitoring import metrics
+
+# SQLite connection pool: connections kept per database file, seconds before an
+# idle connection is closed, busy timeout, and the mmap/page cache sizes.
+SQLITE_POOL_SIZE = getattr(config, "SQLITE_POOL_SIZE", 8)
+SQLITE_POOL_IDLE_TIMEOUT = getattr(config, "SQLITE_POOL_IDLE_TIMEOUT", 60)
+SQLITE_BUSY_TIMEOUT = getattr(config, "SQLITE_BUSY_TIMEOUT", 30)
+SQLITE_MMAP_SIZE = getattr(config, "SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+SQLITE_CACHE_KIB = getattr(config, "SQLITE_CACHE_KIB", 16 * 1024)
+
+# ==================================================== #
+def begin_write(cursor):
+    """Start a write transaction with BEGIN IMMEDIATE, recording the lock wait."""
+    started = time.perf_counter()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+    except sqlite3.OperationalError as e:
+        if "locked" in str(e):
+            metrics.inc("sqlite_lock_errors_total")
+        raise
+    finally:
+        metrics.observe("sqlite_lock_wait_seconds", time.perf_counter() - started)
+
+# ==================================================== #
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections per database file.
+
+    Connections are opened in WAL mode with the synchronous, mmap_size and
+    cache_size pragmas applied once, so readers never block on a concurrent
+    upload. A connection is committed when its block exits cleanly and rolled
+    back otherwise, like `with sqlite3.connect(...)`. Connections idle for longer
+    than idle_timeout are closed on the next checkout or return. `on_connect`, if
+    given, is called with every new connection before it is handed out.
+    """
+
+    def __init__(self, max_per_db, idle_timeout, busy_timeout, on_connect=None):
+        self.max_per_db = max_per_db
+        self.idle_timeout = idle_timeout
+        self.busy_timeout = busy_timeout
+        self.on_connect = on_connect
+        self._idle = {}
+        self._open = {}
+        self._cond = threading.Condition()
+
+    def _connect(self, db_path):
+        conn = sqlite3.connect(db_path, timeout=self.busy_timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+        conn.execute(f"PRAGMA cache_size=-{int(SQLITE_CACHE_KIB)}")
+        if self.on_connect:
+            try:
+                self.on_connect(conn)
+            except BaseException:
+                conn.close()
+                raise
+        return conn
+
+    def _close_idle(self):
+        deadline = time.monotonic() - self.idle_timeout
+        for db_path, idle in self._idle.items():
+            while idle and idle[0][1] < deadline:
+                conn, _ = idle.pop(0)
+                conn.close()
+                self._open[db_path] -= 1
+
+    def _acquire(self, db_path):
+        with self._cond:
+            self._close_idle()
+            give_up = time.monotonic() + self.busy_timeout
+            waited = None
+            while True:
+                idle = self._idle.setdefault(db_path, [])
+                if idle or self._open.get(db_path, 0) < self.max_per_db:
+                    if waited is not None:
+                        metrics.observe("sqlite_pool_wait_seconds", time.monotonic() - waited)
+                    if idle:
+                        return idle.pop()[0]
+                    self._open[db_path] = self._open.get(db_path, 0) + 1
+                    break
+                remaining = give_up - time.monotonic()
+                if remaining <= 0:
+                    raise sqlite3.OperationalError(f"Connection pool exhausted for {db_path}")
+                waited = waited or time.monotonic()
+                self._cond.wait(remaining)
+        try:
+            return self._connect(db_path)
+        except BaseException:
+            with self._cond:
+                self._open[db_path] -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, db_path, conn, broken=False):
+        with self._cond:
+            if broken:
+                conn.close()
+                self._open[db_path] -= 1
+            else:
+                self._idle.setdefault(db_path, []).append((conn, time.monotonic()))
+            self._close_idle()
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, db_path):
+        """Check out a pooled connection to db_path for the duration of the block."""
+        conn = self._acquire(db_path)
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                broken = True
+            raise
+        finally:
+            self._release(db_path, conn, broken)
+
+    def stats(self):
+        """Return the number of open and idle connections over all database files."""
+        with self._cond:
+            return {
+                "open": sum(self._open.values()),
+                "idle": sum(len(idle) for idle in self._idle.values())
+            }
+
+    def close_all(self):
+        """Close every idle connection."""
+        with self._cond:
+            for db_path, idle in self._idle.items():
+                for conn, _ in idle:
+                    conn.close()
+                self._open[db_path] -= len(idle)
+                idle.clear()
+
+db_pool = ConnectionPool(SQLITE_POOL_SIZE, SQLITE_POOL_IDLE_TIMEOUT, SQLITE_BUSY_TIMEOUT)
+
+def _pool_metrics():
+    return [("sqlite_pool_connections", {"state": state}, count) for state, count in db_pool.stats().items()]
+
+metrics.add_collector(_pool_metrics)
+
+# ==================================================== #
+# TODO test function ✅
+def get_db_path(client_id):
+    """Construct the database path for a given client."""
+    return os.path.join(config.UPLOAD_DIR, client_id, config.DATABASE_FILENAME)
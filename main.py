@@ -1,23 +1,74 @@
 # Standard Library Imports 14
 import os
+import gzip
 import shutil
 import csv
+import codecs
 import sqlite3
 import logging
+import json
+import hashlib
+import time
+import threading
+import queue
+import uuid
+import re
+import heapq
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from collections import OrderedDict
 
 # Third-Party Imports
 import pandas as pd
 import numpy as np
-from flask import Flask, flash, request, jsonify, Response, redirect, url_for, session, abort
+from flask import Flask, flash, request, jsonify, Response, redirect, url_for, session, abort, stream_with_context, g
 from flask_login import LoginManager, UserMixin, login_required, login_user, logout_user
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from werkzeug.utils import secure_filename
+from werkzeug.sansio.multipart import MultipartDecoder, NeedData, Field, File, Epilogue
 from redis import Redis
+from dateutil import parser as date_parser
+
+try:
+    import brotli
+except ImportError:  # optional: responses fall back to gzip without it
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # optional: structured outputs fall back to the json module
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: format=msgpack is refused without it
+    msgpack = None
 
 # Local Imports
 import config
+from uploads import (
+    ChunkedUploadStore, DecompressingReader, UploadError, UnknownUploadError, IncompleteUploadError,
+    UploadTooLargeError, MAX_DECOMPRESSED_BYTES, decompress_request_body, is_path_segment, split_compression
+)
+from aggregates import (
+    ROLLUP_PERIODS, ROLLUP_SUMS, apply_trades_to_aggregates, read_aggregate_state, read_period_rollups,
+    rebuild_aggregates
+)
+from database import begin_write, db_pool, get_db_path
+from migrations import upgrade_schema
+from monitoring import metrics
+from schema import (
+    TRADE_COLUMN_KINDS, _fingerprint_rows, _hash_trades_after, _last_trade_rowid, _read_magic_version,
+    _read_sync_meta, _write_sync_meta, canonical_column, canonical_header, create_trades_table, encode_trade_rows,
+    format_close_time, insert_new_rows, load_trade_codes
+)
+from snapshot import _sync_trade_snapshot, read_filtered_trades
+from trade_metrics import (
+    LegacyFields, StructuredFields, _label_mask, _prepare_trades_frame, compute_metrics, render_outputs
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -29,19 +80,168 @@ app = Flask(__name__)
 # Load configurations from environment variables or config file
 app.config['UPLOAD_FOLDER'] = config.UPLOAD_DIR
 
+# Streaming upload settings: bytes read from the request per step, and the
+# bound on parsed rows buffered before each executemany flush.
+UPLOAD_CHUNK_SIZE = getattr(config, "UPLOAD_CHUNK_SIZE", 64 * 1024)
+UPLOAD_BUFFER_BYTES = getattr(config, "UPLOAD_BUFFER_BYTES", 4 * 1024 * 1024)
+
+# Most a gzip/zstd upload may inflate to; past it the upload is answered 413.
+UPLOAD_MAX_DECOMPRESSED_BYTES = getattr(config, "UPLOAD_MAX_DECOMPRESSED_BYTES", MAX_DECOMPRESSED_BYTES)
+
+# Largest body /upload_transaction(s) reads; bigger requests are answered 413.
+TRANSACTION_BODY_MAX_BYTES = getattr(config, "TRANSACTION_BODY_MAX_BYTES", 16 * 1024 * 1024)
+
+# Content hashes of ingested uploads remembered per client, so a byte-identical
+# retry is acknowledged without being parsed again.
+UPLOAD_HASH_HISTORY = getattr(config, "UPLOAD_HASH_HISTORY", 100)
+
+# Resumable chunked uploads: where partial uploads are assembled (on the same
+# filesystem as UPLOAD_DIR, so finalizing is a rename), the largest chunk
+# accepted, and seconds of inactivity before a partial upload is deleted.
+CHUNKED_UPLOAD_DIR = getattr(config, "CHUNKED_UPLOAD_DIR", os.path.join(config.UPLOAD_DIR, "_chunked"))
+CHUNKED_UPLOAD_MAX_CHUNK = getattr(config, "CHUNKED_UPLOAD_MAX_CHUNK", 16 * 1024 * 1024)
+CHUNKED_UPLOAD_TTL = getattr(config, "CHUNKED_UPLOAD_TTL", 24 * 3600)
+
+# Result cache for get_filtered_outputs: maximum number of entries and their
+# time to live in seconds.
+RESULT_CACHE_MAX_ENTRIES = getattr(config, "RESULT_CACHE_MAX_ENTRIES", 1024)
+RESULT_CACHE_TTL = getattr(config, "RESULT_CACHE_TTL", 300)
+
+# Background ingestion: worker threads, uploads allowed to wait in the queue,
+# and finished jobs kept for the status endpoint.
+INGEST_WORKERS = getattr(config, "INGEST_WORKERS", 2)
+INGEST_QUEUE_DEPTH = getattr(config, "INGEST_QUEUE_DEPTH", 16)
+INGEST_JOB_HISTORY = getattr(config, "INGEST_JOB_HISTORY", 1000)
+
+# Portfolio report: worker processes computing client outputs in parallel
+# (default: one per core).
+PORTFOLIO_WORKERS = getattr(config, "PORTFOLIO_WORKERS", None) or os.cpu_count() or 1
+# Reports over at most this many clients are computed in-process: spawning and
+# warming up workers costs more than it saves on small portfolios.
+PORTFOLIO_INPROCESS_MAX_CLIENTS = getattr(config, "PORTFOLIO_INPROCESS_MAX_CLIENTS", 4)
+
+# Equity curve endpoint: points returned when the request does not ask, and the
+# most it may ask for.
+EQUITY_CURVE_POINTS = getattr(config, "EQUITY_CURVE_POINTS", 1000)
+EQUITY_CURVE_MAX_POINTS = getattr(config, "EQUITY_CURVE_MAX_POINTS", 10000)
+
+# Response compression: bodies smaller than this stay uncompressed, and the
+# gzip level / brotli quality used (fast settings suit per-request compression).
+RESPONSE_COMPRESS_MIN_BYTES = getattr(config, "RESPONSE_COMPRESS_MIN_BYTES", 1024)
+RESPONSE_GZIP_LEVEL = getattr(config, "RESPONSE_GZIP_LEVEL", 6)
+RESPONSE_BROTLI_QUALITY = getattr(config, "RESPONSE_BROTLI_QUALITY", 5)
+
+# get_filtered_outputs formats: the legacy strings (default, parsed by the MQL5
+# client) or the structured numeric document as JSON or MessagePack.
+OUTPUT_FORMATS = ("legacy", "structured", "msgpack")
+
 # # Initialize Flask-Login
 # login_manager = LoginManager()
 # login_manager.init_app(app)
 
+# Every new pooled connection is brought up to the current schema before use.
+db_pool.on_connect = upgrade_schema
 
+# ==================================================== #
+@app.before_request
+def _start_request_metrics():
+    g.request_started = time.perf_counter()
+    metrics.inc("http_requests_in_flight")
+
+@app.after_request
+def _record_response_status(response):
+    g.response_status = response.status_code
+    return response
 
+# Endpoints taking a streamed upload body; every other endpoint reads its body as sent.
+DECOMPRESSED_BODY_ENDPOINTS = {"check_and_upload", "put_upload_chunk"}
+
+@app.before_request
+def _decompress_request_body():
+    """
+    Inflate gzip/zstd request bodies (Content-Encoding) of the streaming upload
+    endpoints as they are read, up to UPLOAD_MAX_DECOMPRESSED_BYTES.
+    """
+    if request.endpoint not in DECOMPRESSED_BODY_ENDPOINTS:
+        return None
+    try:
+        g.body_decompression = decompress_request_body(request.environ, UPLOAD_MAX_DECOMPRESSED_BYTES)
+    except UploadError as e:
+        logger.error(f"Rejected request body: {e}")
+        return jsonify({"error": str(e)}), 415
+
+def record_decompression(stats):
+    """Add a DecompressingReader's stats() to the ingestion metrics."""
+    metrics.inc("ingest_compressed_bytes_total", stats["bytes_in"], encoding=stats["encoding"])
+    metrics.inc("ingest_decompressed_bytes_total", stats["bytes_out"], encoding=stats["encoding"])
+    metrics.observe("stage_duration_seconds", stats["seconds"], stage="ingest_decompress")
+    if stats["bytes_per_second"]:
+        metrics.set("ingest_decompress_bytes_per_second", stats["bytes_per_second"], encoding=stats["encoding"])
+
+@app.after_request
+def _compress_response(response):
+    """
+    Compress JSON, MessagePack and text responses of at least RESPONSE_COMPRESS_MIN_BYTES with
+    brotli or gzip, whichever the client prefers in Accept-Encoding (brotli only
+    when the optional package is installed). Streamed responses pass through.
+    """
+    if (
+        response.status_code != 200
+        or response.is_streamed
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or not (response.mimetype.startswith("text/") or response.mimetype.endswith(("json", "msgpack")))
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = request.accept_encodings.best_match(["br", "gzip"] if brotli else ["gzip"])
+    if not encoding:
+        return response
+    body = response.get_data()
+    if len(body) < RESPONSE_COMPRESS_MIN_BYTES:
+        return response
+
+    with metrics.timer("stage_duration_seconds", stage="response_compression"):
+        if encoding == "br":
+            body = brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY)
+        else:
+            body = gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+@app.teardown_request
+def _finish_request_metrics(error=None):
+    metrics.inc("http_requests_in_flight", -1)
+    reader = g.pop("body_decompression", None)
+    if reader is not None and reader.bytes_out:
+        record_decompression(reader.stats())
+    started = g.pop("request_started", None)
+    if started is not None:
+        metrics.observe(
+            "http_request_duration_seconds", time.perf_counter() - started,
+            endpoint=request.endpoint or "unmatched", method=request.method,
+            status=g.pop("response_status", 500)
+        )
 
+# ==================================================== #
+@app.route(f'/{config.call_back_token_check_server}/metrics')
+def metrics_endpoint():
+    """Export the instrumentation in the Prometheus text format."""
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 # ==================================================== #
 # TODO some health check url ✅
 @app.route(f'/{config.call_back_token_check_server}/v1/ok')
 def health_check():
-    response_data = {"status": "success", "message": "Server is running"}
+    response_data = {
+        "status": "success",
+        "message": "Server is running",
+        "cache": result_cache.stats(),
+        "ingest": ingest_jobs.stats()
+    }
     return jsonify(response_data), 200
 
 # ==================================================== #
@@ -50,29 +250,40 @@ def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in config.allowed_extensions
 
 # ==================================================== #
-# TODO test function ✅
-def get_db_path(client_id):
-    """Construct the database path for a given client."""
-    return os.path.join(config.UPLOAD_DIR, client_id, config.DATABASE_FILENAME)
-
-# ==================================================== #
-# TODO test function ✅
-def count_database_rows(client_id):
-    """Count the number of rows in the 'trades' table for a given client."""
+def read_sync_meta(client_id, magic_number=None):
+    """
+    Return the row count, max Close_Time (in the EA's text format), content
+    fingerprint, data version and dropped duplicate count of a client's trades,
+    or None when the client has no database. With `magic_number`, the data
+    version of that Magic_Number is included as "magic_version".
+    """
     db_path = get_db_path(client_id)
-    
+
     if not os.path.exists(db_path):
-        return 0
-    
+        return None
+
     try:
-        with sqlite3.connect(db_path) as conn:
+        with db_pool.connection(db_path) as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM trades")
-            row_count = cursor.fetchone()[0]
-        return row_count
+            meta = _read_sync_meta(cursor)
+            if magic_number is not None:
+                meta["magic_version"] = _read_magic_version(cursor, magic_number, meta["version"])
+            return {**meta, "last_close_time": format_close_time(meta["last_close_time"])}
     except sqlite3.Error as e:
         logger.error(f"Database error: {e}")
-        return 0
+        return None
+
+# ==================================================== #
+def count_database_rows(client_id):
+    """Return the number of rows in the 'trades' table for a given client."""
+    meta = read_sync_meta(client_id)
+    return meta["rows"] if meta else 0
+
+# ==================================================== #
+def get_last_close_time(client_id):
+    """Return the latest Close_Time stored in the 'trades' table for a given client."""
+    meta = read_sync_meta(client_id)
+    return meta["last_close_time"] if meta else None
 
 # ==================================================== #
 # TODO test function ✅
@@ -82,74 +293,930 @@ def database_exists(client_id):
     return os.path.exists(db_path)
 
 # ==================================================== #
-# TODO test function ✅
-def save_csv_to_database(client_id, csv_path):
-    """Save CSV data to the database and return the number of rows saved."""
+class HistoryDivergedError(Exception):
+    """Raised when a delta upload does not line up with the history stored on the server."""
+
+# ==================================================== #
+class MultipartStream:
+    """
+    Pull-based reader over a multipart/form-data request body.
+
+    Parts are read straight from the WSGI input in UPLOAD_CHUNK_SIZE pieces, in the
+    order the client sent them, so nothing is spooled to a temporary file.
+    """
+
+    def __init__(self, stream, boundary, chunk_size=None):
+        self._stream = stream
+        self._chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+        self._decoder = MultipartDecoder(boundary.encode("latin-1"))
+        self._eof = False
+        self._in_part = False
+
+    def _next_event(self):
+        event = self._decoder.next_event()
+        while isinstance(event, NeedData):
+            if self._eof:
+                raise ValueError("Unexpected end of multipart body")
+            chunk = self._stream.read(self._chunk_size)
+            if not chunk:
+                self._eof = True
+                chunk = None
+            self._decoder.receive_data(chunk)
+            event = self._decoder.next_event()
+        return event
+
+    def __iter__(self):
+        """Yield (name, filename) for each part; filename is None for plain form fields."""
+        while True:
+            for _ in self.read_part():
+                pass
+            event = self._next_event()
+            if isinstance(event, Epilogue):
+                return
+            if isinstance(event, (Field, File)):
+                self._in_part = True
+                yield event.name, getattr(event, "filename", None)
+
+    def read_part(self):
+        """Yield the body of the current part as byte chunks."""
+        while self._in_part:
+            event = self._next_event()
+            if event.data:
+                yield bytes(event.data)
+            if not event.more_data:
+                self._in_part = False
+
+    def read_field(self, limit=64 * 1024):
+        """Read the current part as a short text field."""
+        value = bytearray()
+        for data in self.read_part():
+            value.extend(data)
+            if len(value) > limit:
+                raise ValueError("Form field too large")
+        return value.decode("utf-8")
+
+# ==================================================== #
+def _iter_csv_lines(chunks, stats):
+    """Decode byte chunks incrementally and yield complete text lines."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    for chunk in chunks:
+        stats["bytes_read"] += len(chunk)
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+# ==================================================== #
+def _ensure_upload_ledger(cursor):
+    """Create the 'ingested_uploads' table (content hash -> result) if it doesn't exist yet."""
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS ingested_uploads (content_hash TEXT PRIMARY KEY, mode TEXT NOT NULL, "
+        "rows INTEGER NOT NULL, duplicates INTEGER NOT NULL, fingerprint TEXT NOT NULL, ingested_at TEXT NOT NULL)"
+    )
+
+def _record_upload(cursor, content_hash, mode, stats):
+    """Remember an ingested upload by content hash, keeping the newest UPLOAD_HASH_HISTORY."""
+    _ensure_upload_ledger(cursor)
+    cursor.execute(
+        "INSERT OR REPLACE INTO ingested_uploads VALUES (?, ?, ?, ?, ?, ?)",
+        (content_hash, mode, stats["rows"], stats["duplicates"], stats["fingerprint"],
+         datetime.now().isoformat(timespec="seconds"))
+    )
+    cursor.execute(
+        "DELETE FROM ingested_uploads WHERE rowid NOT IN "
+        "(SELECT rowid FROM ingested_uploads ORDER BY ingested_at DESC, rowid DESC LIMIT ?)",
+        (UPLOAD_HASH_HISTORY,)
+    )
+
+# ==================================================== #
+def find_ingested_upload(client_id, content_hash, fingerprint):
+    """
+    Return the recorded result of an upload with this SHA-256 content hash when it
+    was the last write to the client's trades (the stored fingerprint still equals
+    the one it produced), else None. Ingesting it again would change nothing.
+    """
+    db_path = get_db_path(client_id)
+    if not content_hash or not fingerprint or not os.path.exists(db_path):
+        return None
+
+    try:
+        with db_pool.connection(db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'ingested_uploads'")
+            if not cursor.fetchone():
+                return None
+            cursor.execute(
+                "SELECT mode, rows, duplicates, ingested_at FROM ingested_uploads "
+                "WHERE content_hash = ? AND fingerprint = ?",
+                (content_hash.lower(), fingerprint)
+            )
+            row = cursor.fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+        return None
+    if row is None:
+        return None
+    return {"content_hash": content_hash.lower(), "mode": row[0], "rows": row[1], "duplicates": row[2], "ingested_at": row[3]}
+
+# ==================================================== #
+def ingest_csv_stream(
+    client_id, chunks, mode="replace", expected_rows=None, on_progress=None, content_hash=None, encoding=None
+):
+    """
+    Parse CSV byte chunks incrementally and write them to the 'trades' table.
+
+    Rows are bulk-inserted with executemany in batches of at most UPLOAD_BUFFER_BYTES,
+    all inside one SQLite transaction, so memory stays flat whatever the upload size.
+    Columns are renamed to the canonical schema and every batch is converted to typed
+    values (encode_trade_rows) before the insert, so reads never parse text.
+    Trades whose natural key is already stored (see trade_key_columns) are dropped
+    by INSERT OR IGNORE and counted as duplicates; sync_meta keeps counting and
+    fingerprinting them, so the handshake still matches the client's CSV.
+    In "replace" mode the table is recreated; in "append" mode the delta must start at
+    or after the last stored Close_Time and the table must end up with `expected_rows`
+    rows, otherwise HistoryDivergedError is raised and nothing is written. The
+    sync_meta row is updated in the same transaction and the columnar snapshot
+    right after the commit. `on_progress`, if given, is called with the running
+    row count after every batch.
+
+    The SHA-256 of the raw bytes is recorded in 'ingested_uploads' with the result
+    (see find_ingested_upload); when `content_hash` is given the upload must match
+    it, otherwise ValueError is raised and nothing is written. With `encoding`
+    ("gzip" or "zstd") the chunks are inflated on the fly; the hash is still taken
+    over the compressed bytes, as the client sent them.
+
+    Returns:
+        dict: Rows written, duplicates dropped, bytes read, the buffer limit and an
+        estimate of the peak buffer (the largest batch plus one read chunk, not a
+        measurement; benchmark.py measures the real peak with tracemalloc),
+        the content hash, the new fingerprint and, for compressed uploads, the
+        decompression statistics.
+    """
     db_path = get_db_path(client_id)
+    stats = {
+        "rows": 0, "duplicates": 0, "bytes_read": 0,
+        "buffer_limit_bytes": UPLOAD_BUFFER_BYTES, "estimated_peak_buffer_bytes": 0
+    }
+    digest = hashlib.sha256()
+
+    def hashed(chunks):
+        for chunk in chunks:
+            digest.update(chunk)
+            yield chunk
+
+    source = hashed(chunks)
+    if encoding:
+        source = DecompressingReader(source, encoding, UPLOAD_CHUNK_SIZE, UPLOAD_MAX_DECOMPRESSED_BYTES)
+    reader = csv.reader(_iter_csv_lines(source, stats))
+    header = [column.strip() for column in next(reader, [])]
+    if not header:
+        raise ValueError("Empty CSV upload")
+    names = canonical_header(header)
+
+    columns = ", ".join(f'"{name}"' for name in names)
+    placeholders = ", ".join("?" for _ in names)
+    insert_sql = f"INSERT OR IGNORE INTO trades ({columns}) VALUES ({placeholders})"
+    close_index = names.index("close_time") if "close_time" in names else None
+    started = time.perf_counter()
+
+    with db_pool.connection(db_path) as conn:
+        cursor = conn.cursor()
+        begin_write(cursor)
+
+        if mode == "append":
+            base_meta = _read_sync_meta(cursor)
+            last_close_time = base_meta["last_close_time"]
+            cursor.execute("PRAGMA table_info(trades)")
+            existing = {row[1].lower() for row in cursor.fetchall()}
+            if set(names) != existing:
+                raise HistoryDivergedError("Uploaded columns do not match the stored history")
+        else:
+            base_meta = last_close_time = None
+            cursor.execute("DROP TABLE IF EXISTS trades")
+            cursor.execute("DROP TABLE IF EXISTS trade_codes")
+        codes = load_trade_codes(cursor)
+
+        table_ready = mode == "append"
+        batch = []
+        batch_bytes = 0
+        first_rowid = None
+        duplicate_fingerprint = 0
+        magic_index = names.index("magic_number") if "magic_number" in names else None
+        touched_magics = set()
+
+        def flush():
+            nonlocal table_ready, first_rowid, duplicate_fingerprint
+            if not table_ready:
+                create_trades_table(cursor, names, batch)
+                table_ready = True
+            with metrics.timer("stage_duration_seconds", stage="ingest_normalize"):
+                rows = encode_trade_rows(cursor, names, batch, codes) if batch else []
+            if close_index is not None and last_close_time is not None:
+                first_new_close = min((row[close_index] for row in rows if row[close_index] is not None), default=None)
+                if first_new_close is not None and first_new_close < last_close_time:
+                    raise HistoryDivergedError(
+                        f"Delta starts at {format_close_time(first_new_close)} "
+                        f"before last stored close time {format_close_time(last_close_time)}"
+                    )
+            if first_rowid is None:
+                first_rowid = _last_trade_rowid(cursor)
+            written = insert_new_rows(cursor, insert_sql, rows)
+            if not all(written):
+                _, fingerprint = _fingerprint_rows(names, (row for row, new in zip(rows, written) if not new), codes)
+                duplicate_fingerprint += fingerprint
+            rows = [row for row, new in zip(rows, written) if new]
+            if mode == "append" and magic_index is not None:
+                apply_trades_to_aggregates(conn, (dict(zip(names, row)) for row in rows))
+                touched_magics.update(row[magic_index] for row in rows if row[magic_index] is not None)
+            stats["rows"] += len(rows)
+            stats["duplicates"] += len(batch) - len(rows)
+            stats["estimated_peak_buffer_bytes"] = max(
+                stats["estimated_peak_buffer_bytes"], batch_bytes + UPLOAD_CHUNK_SIZE
+            )
+            if on_progress:
+                on_progress(stats["rows"])
+
+        with metrics.timer("stage_duration_seconds", stage="ingest_parse_insert"):
+            for line_number, row in enumerate(reader, start=2):
+                if not row:
+                    continue
+                if len(row) != len(header):
+                    raise ValueError(f"Line {line_number}: expected {len(header)} fields, got {len(row)}")
+                batch.append([value if value != "" else None for value in row])
+                batch_bytes += sum(len(value) for value in row) + len(row)
+                if batch_bytes >= UPLOAD_BUFFER_BYTES:
+                    flush()
+                    batch = []
+                    batch_bytes = 0
+            flush()
+
+        if encoding:
+            stats["decompression"] = source.stats()
+        stats["content_hash"] = digest.hexdigest()
+        if content_hash and content_hash.lower() != stats["content_hash"]:
+            raise ValueError(f"Upload does not match content_hash {content_hash}")
+
+        if "magic_number" in names and "close_time" in names:
+            with metrics.timer("stage_duration_seconds", stage="ingest_index_aggregates"):
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_trades_magic_close ON trades (Magic_Number, Close_Time)")
+                if mode == "replace":
+                    rebuild_aggregates(conn)
+
+        fingerprint, max_close_time = 0, None
+        if first_rowid is not None:
+            with metrics.timer("stage_duration_seconds", stage="ingest_fingerprint"):
+                _, fingerprint, max_close_time = _hash_trades_after(cursor, first_rowid)
+        meta = _write_sync_meta(
+            cursor, base_meta, stats["rows"], fingerprint + duplicate_fingerprint, max_close_time, stats["duplicates"],
+            touched_magics if mode == "append" else None
+        )
+        if expected_rows is not None and meta["rows"] + meta["duplicates"] != expected_rows:
+            raise HistoryDivergedError(
+                f"Expected {expected_rows} rows after append, got {meta['rows'] + meta['duplicates']}"
+            )
+        stats["fingerprint"] = meta["fingerprint"]
+        _record_upload(cursor, stats["content_hash"], mode, stats)
+
+    if mode == "replace":
+        remove_filtered_databases(client_id)
+        _sync_trade_snapshot(client_id)
+    elif first_rowid is not None:
+        _sync_trade_snapshot(client_id, first_rowid, base_meta["fingerprint"])
+    invalidate_client_outputs(client_id)
+    elapsed = time.perf_counter() - started
+    if encoding:
+        record_decompression(stats["decompression"])
+    metrics.inc("ingested_rows_total", stats["rows"], mode=mode)
+    if elapsed > 0:
+        metrics.set("ingest_rows_per_second", round(stats["rows"] / elapsed, 1), mode=mode)
+    logger.info(
+        f"Ingested {stats['rows']} rows for client {client_id} ({mode}), {stats['duplicates']} duplicates dropped, "
+        f"estimated peak buffer {stats['estimated_peak_buffer_bytes']} bytes"
+    )
+    return stats
+
+# ==================================================== #
+def remove_filtered_databases(client_id):
+    """Delete the per-magic filtered_*.db files older versions materialized on every request."""
+    client_folder = os.path.join(config.UPLOAD_DIR, client_id)
+    for name in os.listdir(client_folder):
+        if name.startswith("filtered_") and name.endswith(".db"):
+            try:
+                os.remove(os.path.join(client_folder, name))
+            except OSError as e:
+                logger.warning(f"Could not remove {name}: {e}")
 
+# ==================================================== #
+def _iter_file_chunks(path):
+    """Yield the contents of a file in UPLOAD_CHUNK_SIZE pieces."""
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            yield chunk
+
+# ==================================================== #
+def save_csv_to_database(client_id, csv_path):
+    """Save CSV data to the database and return the number of rows saved."""
     try:
-        df = pd.read_csv(csv_path)
-        with sqlite3.connect(db_path) as conn:
-            df.to_sql("trades", conn, if_exists="replace", index=False)
-        row_count = len(df)
-        return row_count
+        return ingest_csv_stream(client_id, _iter_file_chunks(csv_path))["rows"]
     except Exception as e:
         logger.error(f"Failed to process file: {e}")
         return str(e)
 
 # ==================================================== #
-# TODO test function ✅
+def append_csv_to_database(client_id, csv_path, expected_rows):
+    """
+    Append the delta rows of a CSV file to the 'trades' table in one transaction.
+
+    Returns:
+        int: Number of rows appended, or the error message as a string.
+        Raises HistoryDivergedError when the delta does not fit the stored history.
+    """
+    try:
+        return ingest_csv_stream(client_id, _iter_file_chunks(csv_path), "append", expected_rows)["rows"]
+    except HistoryDivergedError:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to append file: {e}")
+        return str(e)
+
+# ==================================================== #
+class IngestionJobQueue:
+    """
+    Bounded queue of CSV ingestion jobs run by a fixed pool of worker threads.
+
+    Uploads are spooled to disk by the request thread and ingested here, so a large
+    upload never holds a request worker. At most `workers` jobs write at once and at
+    most `max_queued` wait; submit() raises queue.Full beyond that. Each job moves
+    through queued -> running -> done | failed.
+    """
+
+    def __init__(self, workers, max_queued, history):
+        self.workers = workers
+        self.history = history
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start(self):
+        """Start the worker threads on first use."""
+        if self._threads:
+            return
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ingest-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, client_id, csv_path, mode="replace", expected_rows=None, content_hash=None, encoding=None):
+        """Queue the ingestion of a spooled CSV file (gzip/zstd compressed with `encoding`) and return the job record."""
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "client_id": client_id,
+            "mode": mode,
+            "status": "queued",
+            "rows_processed": 0,
+            "submitted_at": datetime.now().isoformat(timespec="seconds"),
+            "duration": None,
+            "error": None
+        }
+        with self._lock:
+            self._start()
+            self._queue.put_nowait((job["job_id"], csv_path, expected_rows, content_hash, encoding))
+            self._jobs[job["job_id"]] = job
+            self._trim()
+            return dict(job)
+
+    def get(self, job_id):
+        """Return a copy of the job record, or None if it is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self):
+        """Return the queue depth and job counts per status."""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return {"workers": self.workers, "queued": self._queue.qsize(), "max_queued": self._queue.maxsize, "jobs": counts}
+
+    def _trim(self):
+        """Forget the oldest finished jobs past the history limit."""
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _work(self):
+        while True:
+            job_id, csv_path, expected_rows, content_hash, encoding = self._queue.get()
+            job = self.get(job_id)
+            started = time.monotonic()
+            self._update(job_id, status="running")
+            try:
+                mode = "append" if job["mode"] == "delta" else "replace"
+                result = ingest_csv_stream(
+                    job["client_id"], _iter_file_chunks(csv_path), mode, expected_rows,
+                    on_progress=lambda rows: self._update(job_id, rows_processed=rows),
+                    content_hash=content_hash, encoding=encoding
+                )
+                self._update(job_id, status="done", rows_processed=result["rows"], memory=result)
+                logger.info(f"Ingestion job {job_id} for client {job['client_id']} finished: {result['rows']} rows")
+            except HistoryDivergedError as e:
+                logger.warning(f"Ingestion job {job_id} rejected: {e}")
+                self._update(job_id, status="failed", error="History diverged. Full upload required.")
+            except Exception as e:
+                logger.error(f"Ingestion job {job_id} failed: {e}")
+                self._update(job_id, status="failed", error=f"Failed to process file: {str(e)}")
+            finally:
+                self._update(job_id, duration=round(time.monotonic() - started, 3))
+                try:
+                    os.remove(csv_path)
+                except OSError as e:
+                    logger.warning(f"Could not remove spooled upload {csv_path}: {e}")
+                self._queue.task_done()
+
+ingest_jobs = IngestionJobQueue(INGEST_WORKERS, INGEST_QUEUE_DEPTH, INGEST_JOB_HISTORY)
+def _ingest_metrics():
+    stats = ingest_jobs.stats()
+    return [("ingest_queue_depth", {}, stats["queued"])] + [
+        ("ingest_jobs", {"status": status}, count) for status, count in stats["jobs"].items()
+    ]
+
+metrics.add_collector(_ingest_metrics)
+
+# ==================================================== #
+def spool_upload(client_id, chunks):
+    """
+    Write an uploaded file's chunks to a spool file in the client folder.
+
+    Returns:
+        tuple: (spool path, SHA-256 hex digest of the content).
+    """
+    spool_path = os.path.join(config.UPLOAD_DIR, client_id, f"upload_{uuid.uuid4().hex}.csv")
+    digest = hashlib.sha256()
+    try:
+        with open(spool_path, "wb") as f:
+            for chunk in chunks:
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+        raise
+    return spool_path, digest.hexdigest()
+
+def spool_early_file(chunks):
+    """
+    Park a file part that arrived before the clientID/rows_count fields in
+    UPLOAD_DIR, until the fields tell whose upload it is. Returns the path.
+    """
+    spool_path = os.path.join(config.UPLOAD_DIR, f"upload_{uuid.uuid4().hex}.part")
+    try:
+        with open(spool_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+        raise
+    return spool_path
+
+# ==================================================== #
 @app.route(f'/{config.call_back_token}/check_and_upload', methods=["POST"])
 def check_and_upload():
-    """API endpoint to check if a file needs to be uploaded and process it."""
+    """
+    API endpoint to check if a file needs to be uploaded and process it.
+
+    The response always reports the server's "rows" (the lines ingested, copies
+    of a trade the server stores once included) and "last_close_time" so the
+    client can send only the trades closed after it with mode=delta and
+    base_rows=<rows>. A delta is appended in one transaction; a full replace is
+    only needed when the server answers 409 because the histories diverged.
+    Equal row counts count as up to date only when the optional `fingerprint`
+    field, computed from the client's CSV as FINGERPRINT_FIELDS describes (see
+    csv_fingerprint), matches the server's too.
+
+    Multipart bodies are parsed as a stream: when clientID and rows_count come
+    before the file part, the file is fed straight into the CSV parser and SQLite
+    writer (fields sent after it are not read). A file sent first is spooled to
+    disk until the rest of the body has been read, then ingested the same way. With
+    async=1 the file is spooled to disk instead and ingested by a background
+    worker; the 202 response carries a job id for the jobs/<job_id> endpoint.
+
+    The file may be gzip or zstd compressed ("trades.csv.gz", "trades.csv.zst"),
+    or the whole body sent with Content-Encoding: gzip / zstd; either way it is
+    inflated as it streams into the parser.
+
+    Retries are idempotent: a client sending the file's SHA-256 as content_hash
+    gets 200 without the file being read when that exact upload was the last
+    write, and an async upload is checked the same way once spooled.
+    """
     if request.method != "POST":
         return jsonify({"error": "Method not allowed. Use POST."}), 405
 
-    client_id = request.form.get("clientID")
-    rows_mql5 = request.form.get("rows_count")
+    if request.mimetype != "multipart/form-data":
+        form = request.form
+        # The form parser drops a body that inflates past the limit without raising
+        reader = g.get("body_decompression")
+        if reader and reader.bytes_out > reader.max_bytes:
+            return jsonify({"error": f"Upload inflates to more than {reader.max_bytes} bytes"}), 413
+        return sync_client_history(form, None)
+
+    boundary = request.mimetype_params.get("boundary")
+    if not boundary:
+        return jsonify({"error": "Missing multipart boundary"}), 400
+
+    early_file = None
+    try:
+        upload = MultipartStream(request.stream, boundary)
+        form = {}
+        for name, filename in upload:
+            if filename is None:
+                form[name] = upload.read_field()
+            elif name == "file" and early_file is None:
+                if "clientID" in form and "rows_count" in form:
+                    return sync_client_history(form, (filename, upload.read_part()))
+                early_file = (filename, spool_early_file(upload.read_part()))
+    except ValueError as e:
+        if early_file:
+            os.remove(early_file[1])
+        logger.error(f"Malformed upload: {e}")
+        return jsonify({"error": f"Malformed upload: {str(e)}"}), 413 if isinstance(e, UploadTooLargeError) else 400
+
+    if early_file is None:
+        return sync_client_history(form, None)
+    filename, spool_path = early_file
+    try:
+        return sync_client_history(form, (filename, _iter_file_chunks(spool_path)))
+    finally:
+        os.remove(spool_path)
+
+# ==================================================== #
+def sync_handshake(form):
+    """
+    Check the check_and_upload form fields against the client's stored history.
+
+    Returns:
+        tuple: (response, upload). `response` is the reply to send straight away
+        (data up to date, upload already ingested, history diverged, invalid
+        fields) and `upload` None; otherwise `response` is None and `upload` holds
+        what ingesting the file needs: client_id, mode, rows_mql5, content_hash
+        and the sync_state to echo.
+    """
+    client_id = form.get("clientID")
+    rows_mql5 = form.get("rows_count")
+    mode = form.get("mode", "full")
 
     if not client_id or rows_mql5 is None:
-        return jsonify({"error": "Missing clientID or rows_count"}), 400
+        return (jsonify({"error": "Missing clientID or rows_count"}), 400), None
+
+    # clientID names the client folder, so it must stay a single path segment
+    if not is_path_segment(client_id):
+        return (jsonify({"error": "Invalid clientID"}), 400), None
+
+    if mode not in ("full", "delta"):
+        return (jsonify({"error": "Invalid mode. Must be 'full' or 'delta'."}), 400), None
 
     try:
         rows_mql5 = int(rows_mql5)
         if rows_mql5 < 0:
-            return jsonify({"error": "Invalid rows_count. Must be a non-negative integer."}), 400
+            return (jsonify({"error": "Invalid rows_count. Must be a non-negative integer."}), 400), None
     except ValueError:
-        return jsonify({"error": "Invalid rows_count. Must be an integer."}), 400
+        return (jsonify({"error": "Invalid rows_count. Must be an integer."}), 400), None
 
     client_folder = os.path.join(config.UPLOAD_DIR, client_id)
     os.makedirs(client_folder, exist_ok=True)
 
-    rows_db = count_database_rows(client_id)
+    meta = read_sync_meta(client_id) or {"rows": 0, "last_close_time": None, "fingerprint": None, "duplicates": 0}
+    # The client counts every line it sent, including the duplicates the server dropped
+    rows_db = meta["rows"] + meta["duplicates"]
+    last_close_time = meta["last_close_time"]
+    sync_state = {"rows": rows_db, "last_close_time": last_close_time, "fingerprint": meta["fingerprint"]}
+
+    # Matching row counts are only trusted when the content fingerprints agree too
+    fingerprint = form.get("fingerprint")
+    same_content = fingerprint is None or fingerprint.lower() == meta["fingerprint"]
+
+    if database_exists(client_id) and rows_db == rows_mql5 and same_content:
+        return (jsonify({"message": "No need to upload. Data is up-to-date.", **sync_state}), 200), None
+
+    content_hash = form.get("content_hash")
+    ingested = find_ingested_upload(client_id, content_hash, meta["fingerprint"])
+    if ingested:
+        return (jsonify({"message": "Upload already ingested", "rows_saved": ingested["rows"], **ingested, **sync_state}), 200), None
+
+    if mode == "delta":
+        base_rows = form.get("base_rows")
+        base_close_time = form.get("base_close_time")
+        if (
+            not database_exists(client_id)
+            or not same_content
+            or base_rows is None
+            or base_rows != str(rows_db)
+            or (base_close_time is not None and base_close_time != str(last_close_time))
+        ):
+            return (jsonify({"error": "History diverged. Full upload required.", **sync_state}), 409), None
+
+    return None, {
+        "client_id": client_id, "mode": mode, "rows_mql5": rows_mql5,
+        "content_hash": content_hash, "sync_state": sync_state
+    }
+
+# ==================================================== #
+def sync_client_history(form, file):
+    """
+    Answer the check_and_upload handshake and ingest the uploaded CSV, if any.
 
-    if database_exists(client_id) and rows_db == rows_mql5:
-        return jsonify({"message": "No need to upload. Data is up-to-date.", "rows": rows_db}), 200
+    Parameters:
+        form (Mapping): Form fields sent before the file part.
+        file (tuple | None): (filename, iterator of byte chunks) of the file part.
+    """
+    response, upload = sync_handshake(form)
+    if response:
+        return response
 
-    if "file" not in request.files:
-        return jsonify({"error": "No file provided"}), 400
+    if file is None:
+        return jsonify({"error": "No file provided", **upload["sync_state"]}), 400
 
-    file = request.files["file"]
+    filename, chunks = file
+    filename, encoding = split_compression(filename)
 
-    if not allowed_file(file.filename):
+    if not allowed_file(filename):
         return jsonify({"error": "Invalid file type"}), 400
 
-    csv_path = os.path.join(client_folder, config.CSV_FILENAME)
+    if form.get("async", "").lower() in ("1", "true", "yes"):
+        return queue_client_upload(chunks=chunks, encoding=encoding, **upload)
+    return ingest_client_upload(chunks=chunks, encoding=encoding, **upload)
+
+# ==================================================== #
+def ingest_client_upload(client_id, mode, rows_mql5, chunks, content_hash, sync_state, encoding=None):
+    """Ingest an accepted upload in the request thread; answers 201 with the ingestion statistics."""
+    try:
+        if mode == "delta":
+            result = ingest_csv_stream(
+                client_id, chunks, "append", rows_mql5, content_hash=content_hash, encoding=encoding
+            )
+            return jsonify({
+                "message": "Delta appended to database",
+                "rows_saved": result["rows"],
+                "rows": rows_mql5,
+                "memory": result
+            }), 201
+
+        result = ingest_csv_stream(client_id, chunks, content_hash=content_hash, encoding=encoding)
+        return jsonify({
+            "message": "File uploaded and saved to database",
+            "rows_saved": result["rows"],
+            "memory": result
+        }), 201
+    except HistoryDivergedError as e:
+        logger.warning(f"Delta upload rejected for client {client_id}: {e}")
+        return jsonify({"error": "History diverged. Full upload required.", **sync_state}), 409
+    except UploadTooLargeError as e:
+        logger.error(f"Upload too large: {e}")
+        return jsonify({"error": str(e)}), 413
+    except UploadError as e:
+        logger.error(f"Malformed upload: {e}")
+        return jsonify({"error": f"Malformed upload: {str(e)}"}), 400
+    except Exception as e:
+        logger.error(f"Failed to process file: {e}")
+        return jsonify({"error": f"Failed to process file: {str(e)}"}), 500
+
+# ==================================================== #
+def queue_client_upload(client_id, mode, rows_mql5, chunks, content_hash, sync_state, encoding=None):
+    """
+    Spool an accepted upload and hand it to the ingestion workers; answers 202 with
+    the job id, or 200 without queuing when the spooled bytes were already ingested.
+    """
     try:
-        file.save(csv_path)
+        spool_path, spooled_hash = spool_upload(client_id, chunks)
     except Exception as e:
-        logger.error(f"Failed to save file: {e}")
-        return jsonify({"error": f"Failed to save file: {str(e)}"}), 500
+        logger.error(f"Failed to queue file: {e}")
+        return jsonify({"error": f"Failed to queue file: {str(e)}"}), 413 if isinstance(e, UploadTooLargeError) else 500
+
+    if content_hash and content_hash.lower() != spooled_hash:
+        os.remove(spool_path)
+        return jsonify({"error": f"Upload does not match content_hash {content_hash}"}), 400
+    ingested = find_ingested_upload(client_id, spooled_hash, sync_state["fingerprint"])
+    if ingested:
+        os.remove(spool_path)
+        return jsonify({"message": "Upload already ingested", "rows_saved": ingested["rows"], **ingested, **sync_state}), 200
+    return submit_spooled_upload(client_id, mode, rows_mql5, spool_path, spooled_hash, encoding)
 
+# ==================================================== #
+def submit_spooled_upload(client_id, mode, rows_mql5, spool_path, content_hash=None, encoding=None):
+    """Queue the ingestion of a file already on disk, which the worker deletes when done."""
     try:
-        result = save_csv_to_database(client_id, csv_path)
-        if isinstance(result, int):
-            return jsonify({"message": "File uploaded, saved to database, and deleted", "rows_saved": result}), 201
-        else:
-            return jsonify({"error": f"Failed to process file: {result}"}), 500
+        job = ingest_jobs.submit(
+            client_id, spool_path, mode, rows_mql5 if mode == "delta" else None, content_hash, encoding
+        )
+    except queue.Full:
+        os.remove(spool_path)
+        logger.warning(f"Ingestion queue full, rejected upload for client {client_id}")
+        return jsonify({"error": "Ingestion queue is full. Retry later."}), 503, {"Retry-After": "30"}
+    except Exception as e:
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+        logger.error(f"Failed to queue file: {e}")
+        return jsonify({"error": f"Failed to queue file: {str(e)}"}), 500
+
+    logger.info(f"Queued ingestion job {job['job_id']} for client {client_id}")
+    return jsonify({
+        "message": "Upload accepted for processing",
+        **job,
+        "status_url": url_for("ingestion_job_status", job_id=job["job_id"])
+    }), 202
+
+# ==================================================== #
+@app.route(f'/{config.call_back_token}/jobs/<job_id>', methods=["GET"])
+def ingestion_job_status(job_id):
+    """
+    API endpoint to report an ingestion job: queued, running, done or failed,
+    with the rows processed so far and the duration once finished.
+    """
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    return jsonify(job), 200
+
+# ==================================================== #
+chunked_uploads = ChunkedUploadStore(CHUNKED_UPLOAD_DIR, CHUNKED_UPLOAD_MAX_CHUNK, CHUNKED_UPLOAD_TTL, UPLOAD_CHUNK_SIZE)
+
+def _chunked_upload_error(e):
+    """Reply for a ChunkedUploadStore error: 404 unknown, 409 incomplete, 413 too large, 400 otherwise."""
+    status_code = (
+        404 if isinstance(e, UnknownUploadError) else 409 if isinstance(e, IncompleteUploadError)
+        else 413 if isinstance(e, UploadTooLargeError) else 400
+    )
+    logger.warning(f"Chunked upload rejected: {e}")
+    return jsonify({"error": str(e)}), status_code
+
+# ==================================================== #
+@app.route(f'/{config.call_back_token}/check_and_upload/chunked', methods=["POST"])
+def init_chunked_upload():
+    """
+    API endpoint to open a resumable upload for check_and_upload.
+
+    Takes the check_and_upload form fields plus filename, size (bytes) and
+    chunk_size. The handshake runs first, so an up-to-date, already ingested or
+    diverged history is answered here without any upload. Otherwise answers 201
+    with the upload id; the client then sends every chunk, can ask for the
+    missing ones at any time, and finalizes. A compressed file (filename ending
+    in .gz or .zst) is sent as is and inflated while it is ingested.
+    """
+    form = request.form
+    response, upload = sync_handshake(form)
+    if response:
+        return response
+
+    filename, _ = split_compression(form.get("filename", ""))
+    if not allowed_file(filename):
+        return jsonify({"error": "Invalid file type"}), 400
+
+    try:
+        status = chunked_uploads.create(form.get("size"), form.get("chunk_size"), {"form": form.to_dict()})
+    except UploadError as e:
+        return _chunked_upload_error(e)
+
+    logger.info(f"Opened chunked upload {status['upload_id']} for client {upload['client_id']} ({status['size']} bytes)")
+    return jsonify({
+        **status,
+        "status_url": url_for("chunked_upload_status", upload_id=status["upload_id"]),
+        **upload["sync_state"]
+    }), 201
+
+# ==================================================== #
+@app.route(f'/{config.call_back_token}/check_and_upload/chunked/<upload_id>/<int:index>', methods=["PUT", "POST"])
+def put_upload_chunk(upload_id, index):
+    """
+    API endpoint to store chunk `index` of a resumable upload.
+
+    The raw request body is the chunk; the query string carries its byte offset
+    and SHA-256 as offset=...&checksum=.... Resending a chunk is safe.
+    """
+    try:
+        result = chunked_uploads.write_chunk(
+            upload_id, index, request.args.get("offset"), request.stream, request.args.get("checksum")
+        )
+    except UploadError as e:
+        return _chunked_upload_error(e)
+    return jsonify(result), 200
+
+# ==================================================== #
+@app.route(f'/{config.call_back_token}/check_and_upload/chunked/<upload_id>', methods=["GET"])
+def chunked_upload_status(upload_id):
+    """API endpoint to list the chunks a resumable upload has received and still misses."""
+    try:
+        return jsonify(chunked_uploads.status(upload_id)), 200
+    except UploadError as e:
+        return _chunked_upload_error(e)
+
+# ==================================================== #
+@app.route(f'/{config.call_back_token}/check_and_upload/chunked/<upload_id>/finalize', methods=["POST"])
+def finalize_chunked_upload(upload_id):
+    """
+    API endpoint to finish a resumable upload and ingest it.
+
+    The handshake is checked again, as other uploads may have landed since the
+    upload was opened. The assembled file is renamed into the client folder and
+    ingested like a check_and_upload file: in the request, or by the ingestion
+    workers (202 with a job id) when the upload was opened with async=1.
+    """
+    try:
+        manifest = chunked_uploads.get(upload_id)
+        form = manifest["meta"]["form"]
+        response, upload = sync_handshake(form)
+        if response:
+            chunked_uploads.discard(upload_id)
+            return response
+        spool_path = chunked_uploads.complete(
+            upload_id, os.path.join(config.UPLOAD_DIR, upload["client_id"], f"upload_{upload_id}.csv")
+        )
+    except UploadError as e:
+        return _chunked_upload_error(e)
+
+    _, encoding = split_compression(form.get("filename", ""))
+    if form.get("async", "").lower() in ("1", "true", "yes"):
+        return submit_spooled_upload(
+            upload["client_id"], upload["mode"], upload["rows_mql5"], spool_path, upload["content_hash"], encoding
+        )
+    try:
+        return ingest_client_upload(chunks=_iter_file_chunks(spool_path), encoding=encoding, **upload)
     finally:
-        if os.path.exists(csv_path):
-            os.remove(csv_path)
+        os.remove(spool_path)
+
+# ==================================================== #
+# Required trade fields, by canonical name (see canonical_column).
+TRANSACTION_REQUIRED_FIELDS = [
+    'open_time', 'symbol', 'magic_number', 'order_type', 'volume', 'open_price',
+    's_l', 't_p', 'close_price', 'close_time', 'commission', 'swap',
+    'profit', 'profit_points', 'duration', 'open_comment', 'close_comment',
+    'floating_drawdown', 'floating_drawdown_currency'  # New columns
+]
+
+TRADE_TRANSACTION_INSERT = '''
+    INSERT OR IGNORE INTO Trade_Transaction 
+    (open_time, symbol, magic_number, type, volume, open_price, sl, tp, 
+     close_price, close_time, commission, swap, profit, profit_points, 
+     duration, open_comment, close_comment, floating_drawdown, floating_drawdown_currency)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# ==================================================== #
+def transaction_row(transaction_data):
+    """Build the Trade_Transaction insert parameters from a transaction with canonical keys."""
+    return (
+        transaction_data['open_time'], transaction_data['symbol'], transaction_data['magic_number'],
+        transaction_data['order_type'], transaction_data['volume'], transaction_data['open_price'],
+        transaction_data['s_l'], transaction_data['t_p'],
+        transaction_data['close_price'], transaction_data['close_time'], transaction_data['commission'],
+        transaction_data['swap'], transaction_data['profit'], transaction_data['profit_points'],
+        transaction_data['duration'], transaction_data['open_comment'], transaction_data['close_comment'],
+        transaction_data['floating_drawdown'], transaction_data['floating_drawdown_currency']
+    )
+
+def transaction_value_error(transaction_data):
+    """
+    Check every value of a transaction (canonical keys) the way encode_trade_rows()
+    will convert it; returns the error message for the first bad one, else None.
+    """
+    for name, value in transaction_data.items():
+        if value is None or value == "":
+            continue
+        if isinstance(value, (dict, list)):
+            return f"Column {name}: expected a single value"
+        kind = TRADE_COLUMN_KINDS.get(name)
+        try:
+            if kind == "time" and not isinstance(value, (int, float)):
+                pd.Timestamp(value)
+            elif kind == "duration" and not isinstance(value, (int, float)):
+                try:
+                    float(value)
+                except ValueError:
+                    pd.Timedelta(value)
+            elif kind == "integer" and not float(value).is_integer():
+                return f"Column {name}: {value!r} is not an integer"
+            elif kind == "real":
+                float(value)
+        except (ValueError, TypeError, OverflowError) as e:
+            return f"Column {name}: {e}"
+    return None
+
+def read_transaction_body():
+    """Read the request body up to TRANSACTION_BODY_MAX_BYTES; None when it is larger."""
+    if request.content_length is not None and request.content_length > TRANSACTION_BODY_MAX_BYTES:
+        return None
+    body = request.stream.read(TRANSACTION_BODY_MAX_BYTES + 1)
+    return None if len(body) > TRANSACTION_BODY_MAX_BYTES else body
 
 # ==================================================== #
 # TODO test function
@@ -158,62 +1225,65 @@ def upload_transaction_to_db():
     """
     API endpoint to upload a single trade transaction to the main database.
     """
-    transaction_data = request.json
+    body = read_transaction_body()
+    if body is None:
+        logger.error("Transaction body too large")
+        return jsonify({"error": f"Request body exceeds {TRANSACTION_BODY_MAX_BYTES} bytes"}), 413
+    try:
+        transaction_data = json.loads(body) if body.strip() else None
+    except (ValueError, UnicodeDecodeError) as e:
+        logger.error(f"Invalid transaction: {e}")
+        return jsonify({"error": f"Invalid JSON: {e}"}), 400
+    if not isinstance(transaction_data, dict):
+        transaction_data = None
     if not transaction_data:
         logger.error("No transaction data provided")
         return jsonify({"error": "Missing transaction data"}), 400
 
-    # Normalize keys in transaction_data to lowercase
-    transaction_data = {k.lower(): v for k, v in transaction_data.items()}
-
-    required_fields = [
-        'open_time', 'symbol', 'magic_number', 'type', 'volume', 'open_price',
-        's_l', 't_p', 'close_price', 'close_time', 'commission', 'swap',
-        'profit', 'profit_points', 'duration', 'open_comment', 'close_comment',
-        'floating_drawdown', 'floating_drawdown_currency'  # New columns
-    ]
+    # Normalize keys in transaction_data to their canonical column names
+    transaction_data = {canonical_column(k): v for k, v in transaction_data.items()}
 
-    missing_fields = [field for field in required_fields if field not in transaction_data]
+    missing_fields = [field for field in TRANSACTION_REQUIRED_FIELDS if field not in transaction_data]
     if missing_fields:
         logger.error(f"Missing required fields: {missing_fields}")
         return jsonify({"error": f"Missing required fields: {missing_fields}"}), 400
 
+    value_error = transaction_value_error(transaction_data)
+    if value_error:
+        logger.error(f"Invalid transaction: {value_error}")
+        return jsonify({"error": value_error}), 400
+    if transaction_data.get("client_id") and not is_path_segment(str(transaction_data["client_id"])):
+        logger.error(f"Invalid Client_ID: {transaction_data['client_id']}")
+        return jsonify({"error": "Invalid Client_ID"}), 400
+
     try:
-        with sqlite3.connect(config.database_file_path) as conn:
+        with db_pool.connection(config.database_file_path) as conn:
             cur = conn.cursor()
+            begin_write(cur)
 
             # Insert the new transaction into the main database
-            cur.execute('''
-                INSERT INTO Trade_Transaction 
-                (open_time, symbol, magic_number, type, volume, open_price, sl, tp, 
-                 close_price, close_time, commission, swap, profit, profit_points, 
-                 duration, open_comment, close_comment, floating_drawdown, floating_drawdown_currency)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                transaction_data['open_time'], transaction_data['symbol'], transaction_data['magic_number'],
-                transaction_data['type'], transaction_data['volume'], transaction_data['open_price'],
-                transaction_data['s/l'], transaction_data['t/p'], transaction_data['close_price'],
-                transaction_data['close_time'], transaction_data['commission'], transaction_data['swap'],
-                transaction_data['profit'], transaction_data['profit_points'], transaction_data['duration'],
-                transaction_data['open_comment'], transaction_data['close_comment'],
-                transaction_data['floating_drawdown'], transaction_data['floating_drawdown_currency']
-            ))
+            cur.execute(TRADE_TRANSACTION_INSERT, transaction_row(transaction_data))
 
             conn.commit()
 
-        # **Update the filtered database for the specific magic number**
+        # **Add the transaction to the client's trades for its magic number**
         client_id = transaction_data.get("client_id")  # Ensure this field is available
         magic_number = transaction_data["magic_number"]
 
         if not client_id:
             logger.error("Client_ID is missing in the transaction data.")
-            return jsonify({"error": "Client_ID is required to update the filtered database"}), 400
+            return jsonify({"error": "Client_ID is required to update the client database"}), 400
 
-        success = add_single_transaction(client_id, magic_number, transaction_data)
-        if not success:
-            logger.warning(f"Failed to update filtered database for Magic_Number {magic_number}")
-            return jsonify({"error": "Failed to update filtered database"}), 500
+        written = add_single_transaction(client_id, magic_number, transaction_data)
+        if written is None:
+            logger.warning(f"Failed to update client database for Magic_Number {magic_number}")
+            return jsonify({"error": "Failed to update client database"}), 500
 
+        if not written:
+            logger.info(f"Duplicate transaction ignored for Magic_Number {magic_number}")
+            return jsonify({"message": "Transaction already stored", "duplicate": True}), 200
+
+        invalidate_client_outputs(client_id)
         logger.info("Transaction uploaded successfully")
         return jsonify({"message": "Transaction uploaded successfully"}), 200
 
@@ -225,6 +1295,108 @@ def upload_transaction_to_db():
         logger.error(f"Unexpected error: {e}")
         return jsonify({"error": "An unexpected error occurred"}), 500
 
+# ==================================================== #
+def parse_transaction_batch(body, content_type):
+    """
+    Parse a batch upload body: a JSON array of trades, or NDJSON with one trade per line.
+
+    Raises:
+        ValueError: If the body is neither.
+    """
+    text = body.decode("utf-8-sig")
+    if "ndjson" not in (content_type or "") and text.lstrip().startswith("["):
+        transactions = json.loads(text)
+    else:
+        transactions = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if not isinstance(transactions, list) or not all(isinstance(item, dict) for item in transactions):
+        raise ValueError("Expected a JSON array or NDJSON stream of trade objects")
+    return transactions
+
+# ==================================================== #
+@app.route("/upload_transactions", methods=["POST"])
+def upload_transactions_to_db():
+    """
+    API endpoint to upload a batch of trade transactions.
+
+    Accepts a JSON array or an NDJSON stream of at most TRANSACTION_BODY_MAX_BYTES.
+    Every trade is validated against TRANSACTION_REQUIRED_FIELDS and its values
+    checked as the client database will store them (transaction_value_error), so
+    a bad row is rejected on its own before anything is written; valid ones are
+    written to the main database and to each client's 'trades' table with
+    executemany, one commit per database. The response holds a result for every
+    row in request order; a trade already stored (same natural key) is reported
+    as "duplicate" and not written again.
+    """
+    body = read_transaction_body()
+    if body is None:
+        logger.error("Transaction batch too large")
+        return jsonify({"error": f"Request body exceeds {TRANSACTION_BODY_MAX_BYTES} bytes"}), 413
+    try:
+        transactions = parse_transaction_batch(body, request.content_type)
+    except (ValueError, UnicodeDecodeError) as e:
+        logger.error(f"Invalid transaction batch: {e}")
+        return jsonify({"error": f"Invalid transaction batch: {e}"}), 400
+
+    if not transactions:
+        logger.error("No transaction data provided")
+        return jsonify({"error": "Missing transaction data"}), 400
+
+    results = []
+    valid = []
+    for index, transaction_data in enumerate(transactions):
+        # Normalize keys in transaction_data to their canonical column names
+        transaction_data = {canonical_column(k): v for k, v in transaction_data.items()}
+        missing_fields = [field for field in TRANSACTION_REQUIRED_FIELDS if field not in transaction_data]
+        value_error = None if missing_fields else transaction_value_error(transaction_data)
+        if missing_fields:
+            results.append({"index": index, "status": "error", "error": f"Missing required fields: {missing_fields}"})
+        elif value_error:
+            results.append({"index": index, "status": "error", "error": value_error})
+        elif not transaction_data.get("client_id"):
+            results.append({"index": index, "status": "error", "error": "Client_ID is required to update the client database"})
+        elif not is_path_segment(str(transaction_data["client_id"])):
+            results.append({"index": index, "status": "error", "error": "Invalid Client_ID"})
+        else:
+            results.append({"index": index, "status": "ok"})
+            valid.append((index, transaction_data))
+
+    try:
+        if valid:
+            with db_pool.connection(config.database_file_path) as conn:
+                cur = conn.cursor()
+                begin_write(cur)
+                cur.executemany(
+                    TRADE_TRANSACTION_INSERT, [transaction_row(transaction_data) for _, transaction_data in valid]
+                )
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+        return jsonify({"error": "Failed to upload transactions due to a database error"}), 500
+
+    # Group the accepted trades per client so each client database commits once
+    by_client = {}
+    for index, transaction_data in valid:
+        by_client.setdefault(str(transaction_data["client_id"]), []).append((index, transaction_data))
+
+    for client_id, items in by_client.items():
+        written = add_transactions(client_id, [transaction_data for _, transaction_data in items])
+        if written is None:
+            logger.warning(f"Failed to update client database for client {client_id}")
+            for index, _ in items:
+                results[index] = {"index": index, "status": "error", "error": "Failed to update client database"}
+            continue
+        if any(written):
+            invalidate_client_outputs(client_id)
+        for (index, _), new in zip(items, written):
+            if not new:
+                results[index] = {"index": index, "status": "duplicate"}
+
+    accepted = sum(1 for result in results if result["status"] == "ok")
+    duplicates = sum(1 for result in results if result["status"] == "duplicate")
+    rejected = len(results) - accepted - duplicates
+    logger.info(f"Batch upload: {accepted} of {len(results)} transactions stored, {duplicates} duplicates")
+    status_code = 200 if rejected == 0 else 207
+    return jsonify({"accepted": accepted, "duplicates": duplicates, "rejected": rejected, "results": results}), status_code
+
 
 
 
@@ -235,38 +1407,155 @@ def upload_transaction_to_db():
 
 
 # ==================================================== #
-# TODO test function
-def create_filtered_database(client_id, magic_number):
+class ResultCache:
+    """
+    In-process LRU cache for computed outputs with TTL eviction.
+
+    Keys are (client_id, magic_number, data_version) tuples, so a write that bumps
+    the client's data version makes its old entries unreachable; they are also
+    dropped eagerly through invalidate_client().
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """Store value under key, evicting the least recently used entries past max_entries."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_client(self, client_id):
+        """Drop every entry that belongs to client_id."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == client_id]:
+                del self._entries[key]
+
+    def stats(self):
+        """Return the hit/miss counters and current size."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+result_cache = ResultCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL)
+def _result_cache_metrics():
+    stats = result_cache.stats()
+    return [
+        ("result_cache_entries", {}, stats["entries"]),
+        ("result_cache_requests_total", {"result": "hit"}, stats["hits"]),
+        ("result_cache_requests_total", {"result": "miss"}, stats["misses"])
+    ]
+
+metrics.add_collector(_result_cache_metrics)
+
+# ==================================================== #
+def get_data_version(client_id):
+    """Return the current data version of a client's trade history."""
+    meta = read_sync_meta(client_id)
+    return meta["version"] if meta else 0
+
+def output_etag(client_id, version, *params):
+    """
+    ETag of a response computed from one Magic_Number's trades: its data version
+    (see _write_magic_versions) plus the request parameters, so it changes whenever
+    a write to that magic number could change the answer, and only then.
+    """
+    key = json.dumps([client_id, version, *params], default=str)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+# ==================================================== #
+def invalidate_client_outputs(client_id):
+    """Drop a client's cached outputs after a write changed its data version."""
+    result_cache.invalidate_client(client_id)
+
+# ==================================================== #
+def _has_time_of_day(value):
+    """
+    True if a date string names a time of day: parsed once with midnight and once
+    with 23:00 as the default, a time that was given comes out the same both times.
+    """
+    try:
+        midnight = date_parser.parse(value, default=datetime(2000, 1, 1, 0))
+        late = date_parser.parse(value, default=datetime(2000, 1, 1, 23))
+    except (ValueError, OverflowError):
+        # Only pandas understands it (e.g. "now"); take it as an exact instant
+        return True
+    return midnight.hour == late.hour
+
+def parse_close_time_range(date_from=None, date_to=None):
+    """
+    Parse the from/to query parameters into inclusive close time bounds.
+
+    A date without a time covers the whole day, so ?from=2024-05-01&to=2024-05-31
+    selects May. Raises ValueError on an unparseable or inverted range.
+    """
+    start = pd.Timestamp(date_from) if date_from else None
+    end = pd.Timestamp(date_to) if date_to else None
+    if end is not None and not _has_time_of_day(date_to):
+        end = end + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+    if start is not None and end is not None and start > end:
+        raise ValueError("'from' must not be after 'to'")
+    return start, end
+
+# ==================================================== #
+def read_trades_window(client_id, magic_number, start=None, end=None):
     """
-    Ensures the filtered database exists and is up to date based on Magic_Number.
+    Read the trades of one Magic_Number closed between `start` and `end` (inclusive).
+
+    The bounds are pushed down to SQLite as epoch seconds, where idx_trades_magic_close
+    turns them into a range scan, so only the rows of the window are read.
     """
-    original_db_path = os.path.join(config.UPLOAD_DIR, client_id, config.DATABASE_FILENAME)
-    filtered_db_path = os.path.join(config.UPLOAD_DIR, client_id, f"filtered_{magic_number}.db")
+    db_path = get_db_path(client_id)
 
-    if not os.path.exists(original_db_path):
-        logger.error(f"Original database not found: {original_db_path}")
+    if not os.path.exists(db_path):
+        logger.error(f"Original database not found: {db_path}")
         return {"status": "error", "message": "Original database not found"}
 
     try:
-        # Read transactions for the specified Magic_Number from the original database
-        with sqlite3.connect(original_db_path) as conn:
-            query = "SELECT * FROM trades WHERE Magic_Number = ?"
-            df = pd.read_sql_query(query, conn, params=(magic_number,))
+        with metrics.timer("stage_duration_seconds", stage="sql_read"), db_pool.connection(db_path) as conn:
+            codes = load_trade_codes(conn.cursor())
+            query, params = "SELECT * FROM trades WHERE Magic_Number = ?", [magic_number]
+            if start is not None:
+                query += " AND Close_Time >= ?"
+                params.append(start.value // 10**9)
+            if end is not None:
+                query += " AND Close_Time <= ?"
+                params.append(end.value // 10**9)
+            df = pd.read_sql_query(query + " ORDER BY Close_Time", conn, params=params)
 
-        # If no transactions are found, return a warning
         if df.empty:
-            logger.warning(f"No transactions found for Magic_Number {magic_number}.")
-            return {"status": "warning", "message": "No transactions found for the specified Magic_Number"}
-
-        # Save the filtered transactions to the filtered database
-        with sqlite3.connect(filtered_db_path) as conn:
-            # Create the filtered_trades table if it doesn't exist
-            df.head(0).to_sql("filtered_trades", conn, if_exists="replace", index=False)
-            # Insert the filtered data
-            df.to_sql("filtered_trades", conn, if_exists="append", index=False)
+            logger.warning(f"No transactions found for Magic_Number {magic_number} between {start} and {end}.")
+            return {"status": "warning", "message": "No transactions found in the requested range"}
 
-        logger.info(f"Filtered database created/updated for Magic_Number {magic_number}.")
-        return {"status": "success", "message": "Filtered database created/updated", "path": filtered_db_path}
+        return {"status": "success", "message": "Trades loaded", "data": _prepare_trades_frame(df, codes)}
 
     except sqlite3.Error as e:
         logger.error(f"Database error: {e}")
@@ -276,31 +1565,71 @@ def create_filtered_database(client_id, magic_number):
         return {"status": "error", "message": f"Unexpected error: {e}"}
 
 # ==================================================== #
-# TODO test function ✅
-def get_filtered_outputs(client_id, magic_number):
+def get_filtered_outputs(client_id, magic_number, start=None, end=None, fields=None):
     """
     Main function to get the filtered outputs.
-    """
-    # Step 1: Create or update the filtered database
-    create_result = create_filtered_database(client_id, magic_number)
-    if create_result["status"] != "success":
-        return {"error": f"Failed to create or access the filtered database: {create_result['message']}"}
 
-    filtered_db_path = create_result["path"]
-
-    # Step 2: Calculate outputs from the filtered database
-    outputs = calculate_outputs(filtered_db_path)
-    if not outputs:
+    Without a date range the outputs come from the stored aggregate state; with one
+    they are computed from the trades of the window only. `fields` picks the legacy
+    strings (default) or the structured numbers, see render_outputs.
+    """
+    fields = fields or LegacyFields
+    if start is not None or end is not None:
+        read_result = read_trades_window(client_id, magic_number, start, end)
+        if read_result["status"] == "warning":
+            return {"warning": read_result["message"]}
+        if read_result["status"] != "success":
+            return {"error": f"Failed to read the trades: {read_result['message']}"}
+        try:
+            return compute_metrics(read_result["data"], fields)
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}")
+            return {"error": "Failed to calculate outputs."}
+
+    # Step 1: Read the incrementally maintained aggregate state of the magic number
+    read_result = read_aggregate_state(client_id, magic_number)
+    if read_result["status"] != "success":
+        return {"error": f"Failed to read the aggregate state: {read_result['message']}"}
+
+    # Step 2: Render the outputs from the aggregate state
+    try:
+        outputs = render_outputs(read_result["data"], fields)
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
         return {"error": "Failed to calculate outputs."}
 
     return outputs
 
 # ==================================================== #
-# TODO test function ✅
 @app.route(f'/{config.call_back_token_sync}/get_filtered_outputs', methods=["GET"])
 def api_get_filtered_outputs():
     """
     API endpoint to get filtered outputs for a specific client and magic number.
+
+    Optional `from`/`to` query parameters (dates or date-times, inclusive) restrict
+    the outputs to trades closed in that range. `format` is one of OUTPUT_FORMATS:
+    "legacy" (default) keeps the "12.50 (3.10)" strings, "structured" returns the
+    composite values as separate numbers, "msgpack" the same as MessagePack.
+
+    Responses carry an ETag (see output_etag) scoped to the magic number, so writes
+    to the client's other magic numbers leave it valid; a request whose
+    If-None-Match holds it is answered 304 from the sync_meta and magic_versions
+    rows alone, before any trades or aggregates are read.
+
+    Breaking change in every format: drawdown*, max_drawdown*, min_drawdown*,
+    max_drawdown_time and max_drawdown_trades are peak-to-trough drawdowns of the
+    equity curve (trades in close-time order), with percentages of the peak capped
+    at 100. They used to be read off single trades' profits: max_drawdown_time was
+    one trade's duration and max_drawdown_trades counted every trade below the
+    best profit. max_drawdown_time now spans the deepest drawdown from its peak to
+    its recovery (or the last trade), and max_drawdown_percent/_start/_trough/
+    _recovery describe the same episode.
+
+    Likewise winning_streak and losing_streak are the longest run of consecutive
+    wins and losses; winning_streak used to total every winning trade and
+    losing_streak picked the costliest run. The legacy payload also gained
+    *_streak_current (the run still open at the last trade) and the per-side
+    *_streak_buy/_sell keys.
     """
     # Step 1: Validate input parameters
     client_id = request.args.get("client_id")
@@ -316,832 +1645,479 @@ def api_get_filtered_outputs():
         logger.error(f"Invalid magic_number: {magic_number}")
         return jsonify({"error": "Invalid magic_number. Must be an integer."}), 400
 
-    # Step 2: Get filtered outputs
+    try:
+        start, end = parse_close_time_range(request.args.get("from"), request.args.get("to"))
+    except ValueError as e:
+        logger.error(f"Invalid date range: {e}")
+        return jsonify({"error": f"Invalid date range: {e}"}), 400
+
+    output_format = request.args.get("format", "legacy")
+    if output_format not in OUTPUT_FORMATS:
+        logger.error(f"Invalid format: {output_format}")
+        return jsonify({"error": f"Invalid format. Must be one of: {', '.join(OUTPUT_FORMATS)}."}), 400
+    if output_format == "msgpack" and msgpack is None:
+        logger.error("MessagePack output requested but msgpack is not installed")
+        return jsonify({"error": "MessagePack output is not available on this server."}), 406
+    fields = LegacyFields if output_format == "legacy" else StructuredFields
+
+    # Step 2: Answer 304 while the client's copy is current, then serve from the
+    # result cache while no trade has arrived since
+    meta = read_sync_meta(client_id, magic_number)
+    etag = output_etag(client_id, meta["magic_version"], magic_number, start, end, output_format) if meta else None
+    if etag and request.if_none_match.contains_weak(etag):
+        return _tag_response(Response(status=304), etag)
+
+    cache_key = (client_id, magic_number, start, end, meta["version"] if meta else 0, fields.__name__)
+    outputs = result_cache.get(cache_key)
+    if outputs is not None:
+        logger.info(f"Serving cached outputs for client_id={client_id}, magic_number={magic_number}")
+        return _tag_response(serialize_outputs(outputs, output_format), etag), 200
+
+    # Step 3: Get filtered outputs
     logger.info(f"Fetching filtered outputs for client_id={client_id}, magic_number={magic_number}")
-    outputs = get_filtered_outputs(client_id, magic_number)
+    outputs = get_filtered_outputs(client_id, magic_number, start, end, fields)
 
-    # Step 3: Handle errors
+    # Step 4: Handle errors
+    if "warning" in outputs:
+        return jsonify({"error": outputs["warning"]}), 404
     if "error" in outputs:
         logger.error(f"Failed to get filtered outputs: {outputs['error']}")
         return jsonify({"error": "An internal error occurred while processing your request."}), 500
 
-    # Step 4: Return successful response
+    result_cache.put(cache_key, outputs)
+
+    # Step 5: Return successful response
     logger.info(f"Successfully fetched filtered outputs for client_id={client_id}, magic_number={magic_number}")
-    return jsonify(outputs), 200
+    return _tag_response(serialize_outputs(outputs, output_format), etag), 200
 
-# ==================================================== #
-# TODO test function ✅
-def calculate_outputs(filtered_db_path):
+def serialize_outputs(outputs, output_format):
     """
-    Perform calculations on the filtered database and return the results.
+    Serialize outputs as a response: legacy through jsonify (unchanged bytes),
+    structured with orjson when installed, msgpack as application/msgpack.
     """
-    if not os.path.exists(filtered_db_path):
-        logger.error(f"Filtered database not found: {filtered_db_path}")
-        return None
-
-    try:
-        # Connect to the filtered database
-        with sqlite3.connect(filtered_db_path) as conn:
-            # Read the filtered data into a DataFrame
-            query = "SELECT * FROM filtered_trades"
-            df = pd.read_sql_query(query, conn)
-
-        # Check if the DataFrame is empty
-        if df.empty:
-            logger.warning("No data found in the filtered database.")
-            return None
-
-        # Normalize column names by stripping whitespace and converting to lowercase
-        df.columns = df.columns.str.strip().str.lower()
-
-        # Debugging: Print column names
-        logger.info(f"Columns in DataFrame: {df.columns.tolist()}")
-
-        # Convert date columns to datetime
-        df["open_time"] = pd.to_datetime(df["open_time"])
-        df["close_time"] = pd.to_datetime(df["close_time"])
-
-        # Perform calculations using smaller functions
-        outputs = {
-            "Most_Volume": calculate_most_volume(df),
-            "smallest_open_time": get_smallest_open_time(df),
-            "largest_close_time": get_largest_close_time(df),
-            "total_profit": calculate_total_profit(df),
-            "profit_factor": calculate_profit_factor(df),
-            "trades_won_percentage": calculate_trades_won_percentage(df),
-            "expected_payoff": calculate_expected_payoff(df),
-            "netProfit": calculate_net_profit(df),
-            "NetLoss": calculate_net_loss(df),
-            "Balance_mDD": calculate_balance_max_drawdown(df),
-            **calculate_drawdown(df),
-            **calculate_max_min_drawdowns(df),
-            **calculate_floating_drawdown(df),
-            **calculate_quantity_metrics(df),
-            **calculate_profitability_metrics(df),
-            **calculate_profit_distribution(df),
-            **calculate_time_metrics(df),
-            **calculate_time_extremes(df),
-            **calculate_win_loss_metrics(df),
-            **calculate_closure_metrics(df),
-            **calculate_additional_metrics(df)
-        }
-
-        # Print Test Output
-        print("\n====== TEST OUTPUT ======")
-        for key, value in outputs.items():
-            print(f"{key}: {value}")
-        print("=================================")
-
-        logger.info("Calculations completed successfully.")
-        return outputs
-
-    except sqlite3.Error as e:
-        logger.error(f"Database error: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"Unexpected error: {e}")
-        return None
-
-
-
-
-
-
-
-
-
+    stage = "msgpack_serialization" if output_format == "msgpack" else "json_serialization"
+    with metrics.timer("stage_duration_seconds", stage=stage):
+        if output_format == "legacy":
+            return jsonify(outputs)
+        if output_format == "msgpack":
+            return Response(msgpack.packb(outputs), mimetype="application/msgpack")
+        if orjson is not None:
+            body = orjson.dumps(outputs, option=orjson.OPT_SERIALIZE_NUMPY)
+        else:
+            body = json.dumps(outputs, separators=(",", ":"))
+        return Response(body, mimetype="application/json")
 
+def _tag_response(response, etag):
+    """Set the ETag (weak, as compression may change the bytes) and make clients revalidate."""
+    if etag:
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "no-cache"
+    return response
 
 # ==================================================== #
-# TODO test function ✅
-def calculate_most_volume(df):
+@app.route(f'/{config.call_back_token_sync}/get_period_series', methods=["GET"])
+def api_get_period_series():
     """
-    Calculate the maximum volume from the "Volume" column and return it as a float with two decimal places.
-
-    Parameters:
-        df (pd.DataFrame): DataFrame containing a "Volume" column.
+    API endpoint returning per-day, per-week or per-month totals of a magic number,
+    read from the precomputed rollups.
 
-    Returns:
-        float: Maximum volume rounded to two decimal places.
+    Query parameters: client_id, magic_number, period (day | week | month, default
+    day) and optional from/to dates.
     """
-    most_volume = df["volume"].max()
-    return round(float(most_volume), 2)
+    client_id = request.args.get("client_id")
+    magic_number = request.args.get("magic_number")
+    period = request.args.get("period", "day")
 
-# ==================================================== #
-# TODO test function ✅
-def get_smallest_open_time(df):
-    """Find the smallest date in the Open_Time column."""
-    return df["open_time"].min().strftime("%Y-%m-%d")
+    if not client_id or not magic_number:
+        logger.error("Missing client_id or magic_number")
+        return jsonify({"error": "Missing client_id or magic_number"}), 400
+    if period not in ROLLUP_PERIODS:
+        return jsonify({"error": f"Invalid period. Must be one of {', '.join(ROLLUP_PERIODS)}."}), 400
 
-# ==================================================== #
-# TODO test function ✅
-def get_largest_close_time(df):
-    """Find the largest date in the Close_Time column."""
-    return df["close_time"].max().strftime("%Y-%m-%d")
+    try:
+        magic_number = int(magic_number)
+        start, end = parse_close_time_range(request.args.get("from"), request.args.get("to"))
+    except ValueError as e:
+        logger.error(f"Invalid period series parameters: {e}")
+        return jsonify({"error": f"Invalid parameters: {e}"}), 400
+
+    result = read_period_rollups(client_id, magic_number, period, start, end)
+    if result["status"] == "warning":
+        return jsonify({"error": result["message"]}), 404
+    if result["status"] != "success":
+        return jsonify({"error": "An internal error occurred while processing your request."}), 500
 
-# ==================================================== #
-# TODO test function ✅
-def calculate_total_profit(df):
-    """Calculate the total profit."""
-    total_profit = df["profit"].sum()
-    return round(total_profit, 2)
+    series = [
+        {
+            "bucket": row["bucket"],
+            **{key: round(value, 2) if isinstance(value, float) else value
+               for key, value in row.items() if key in ROLLUP_SUMS or key == "equity"}
+        }
+        for row in result["data"]
+    ]
+    return jsonify({"client_id": client_id, "magic_number": magic_number, "period": period, "series": series}), 200
 
 # ==================================================== #
-# TODO test function ✅
-def calculate_drawdown(df):
+def downsample_min_max(values, points):
     """
-    Calculate total drawdown and separate drawdowns for Buy and Sell trades.
-    Ensures percentages sum correctly.
+    Pick at most `points` (at least 4) indices of a series that keep its shape.
 
-    Parameters:
-        df (pd.DataFrame): DataFrame with "profit" and "order_type" columns.
+    The series is cut into points // 2 equal buckets (the last one padded with NaN
+    so it reshapes into a 2-D array) and the lowest and highest point of every
+    bucket are kept in time order, plus the first and last points. Every step is
+    a whole-array NumPy operation.
 
     Returns:
-        dict: Drawdown values formatted as "$(%)".
+        np.ndarray: Sorted int64 indices into `values`.
     """
-    if df.empty or "profit" not in df.columns:
-        return {"drawdown": "0.00 (0)", "drawdown_buy": "0.00 (0)", "drawdown_sell": "0.00 (0)"}
-
-    df = df.sort_index()
-
-    def calculate_drawdown_for_subset(sub_df):
-        if sub_df.empty:
-            return 0.00, 0.00
-
-        sub_df = sub_df.copy()
-        sub_df["peak"] = sub_df["profit"].cummax()
-        drawdown_dollar = (sub_df["peak"] - sub_df["profit"]).max()
-        peak_value = sub_df["peak"].max()
-
-        drawdown_percent = (drawdown_dollar / peak_value * 100) if peak_value > 0 else 0
-        drawdown_percent = min(drawdown_percent, 100)  # Cap at 100%
-
-        return drawdown_dollar, drawdown_percent
-
-    # Calculate total drawdown
-    total_dd, total_dd_pct = calculate_drawdown_for_subset(df)
-
-    # Calculate buy/sell drawdowns
-    if "order_type" in df.columns:
-        df["order_type"] = df["order_type"].astype(str).str.lower()
-        buy_dd, _ = calculate_drawdown_for_subset(df[df["order_type"] == "buy"])
-        sell_dd, _ = calculate_drawdown_for_subset(df[df["order_type"] == "sell"])
-    else:
-        buy_dd, sell_dd = 0.00, 0.00
-
-    # Ensure total drawdown matches buy + sell
-    if abs(total_dd - (buy_dd + sell_dd)) > 1e-2:
-        total_dd = buy_dd + sell_dd  
-
-    # Fix percentage distribution
-    buy_pct = (buy_dd / total_dd * total_dd_pct) if total_dd > 0 else 0
-    sell_pct = (sell_dd / total_dd * total_dd_pct) if total_dd > 0 else 0
-
-    return {
-        "drawdown": f"{total_dd:.2f} ({total_dd_pct:.2f})",
-        "drawdown_buy": f"{buy_dd:.2f} ({buy_pct:.2f})",
-        "drawdown_sell": f"{sell_dd:.2f} ({sell_pct:.2f})"
-    }
+    n = values.size
+    if n <= points:
+        return np.arange(n)
+    buckets = max((points - 2) // 2, 1)
+    width = -(-n // buckets)
+    padded = np.full(buckets * width, np.nan)
+    padded[:n] = values
+    padded = padded.reshape(buckets, width)
+    offsets = np.arange(buckets) * width
+    lows = offsets + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    highs = offsets + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    indices = np.concatenate(([0], np.minimum(lows, highs), np.maximum(lows, highs), [n - 1]))
+    return np.unique(indices[indices < n])
 
 # ==================================================== #
-# TODO test function ✅
-def calculate_max_min_drawdowns(df):
+@app.route(f'/{config.call_back_token_sync}/get_equity_curve', methods=["GET"])
+def api_get_equity_curve():
     """
-    Calculate maximum and minimum drawdowns for total, buy, and sell trades.
-
-    Parameters:
-        df (pd.DataFrame): DataFrame with "profit" and "order_type" columns.
+    API endpoint returning the equity curve (running profit total by close time)
+    of a magic number, downsampled to at most `points` points.
 
-    Returns:
-        dict: Formatted maximum and minimum drawdown results.
+    Query parameters: client_id, magic_number, optional points, side (all | buy |
+    sell) and from/to dates.
     """
-    if df.empty or "profit" not in df.columns or "order_type" not in df.columns:
-        return {}
+    client_id = request.args.get("client_id")
+    magic_number = request.args.get("magic_number")
+    side = request.args.get("side", "all")
 
-    # Calculate cumulative maximum profit (peak)
-    df["peak"] = df["profit"].cummax()
+    if not client_id or not magic_number:
+        logger.error("Missing client_id or magic_number")
+        return jsonify({"error": "Missing client_id or magic_number"}), 400
+    if side not in ("all", "buy", "sell"):
+        return jsonify({"error": "Invalid side. Must be one of all, buy, sell."}), 400
 
-    # Total Drawdowns
-    drawdowns_total = df["peak"] - df["profit"]
-    max_drawdown_total = drawdowns_total.max()
-    min_drawdown_total = drawdowns_total[drawdowns_total > 0].min() if any(drawdowns_total > 0) else 0
+    try:
+        magic_number = int(magic_number)
+        points = int(request.args.get("points", EQUITY_CURVE_POINTS))
+        start, end = parse_close_time_range(request.args.get("from"), request.args.get("to"))
+    except ValueError as e:
+        logger.error(f"Invalid equity curve parameters: {e}")
+        return jsonify({"error": f"Invalid parameters: {e}"}), 400
+    points = min(max(points, 4), EQUITY_CURVE_MAX_POINTS)
+
+    trades = read_filtered_trades(client_id, magic_number)
+    if trades["status"] == "warning":
+        return jsonify({"error": trades["message"]}), 404
+    if trades["status"] != "success":
+        return jsonify({"error": "An internal error occurred while processing your request."}), 500
 
-    # Maximum and Minimum Drawdown for Buy Trades
-    buy_df = df[df["order_type"] == "buy"]
-    if not buy_df.empty:
-        drawdowns_buy = buy_df["peak"] - buy_df["profit"]
-        max_drawdown_buy = drawdowns_buy.max()
-        min_drawdown_buy = drawdowns_buy[drawdowns_buy > 0].min() if any(drawdowns_buy > 0) else 0
-    else:
-        max_drawdown_buy = min_drawdown_buy = 0
-
-    # Maximum and Minimum Drawdown for Sell Trades
-    sell_df = df[df["order_type"] == "sell"]
-    if not sell_df.empty:
-        drawdowns_sell = sell_df["peak"] - sell_df["profit"]
-        max_drawdown_sell = drawdowns_sell.max()
-        min_drawdown_sell = drawdowns_sell[drawdowns_sell > 0].min() if any(drawdowns_sell > 0) else 0
-    else:
-        max_drawdown_sell = min_drawdown_sell = 0
-
-    # Calculate percentages based on peak value
-    peak_value = df["peak"].max()
-    if peak_value > 0:
-        max_drawdown_total_pct = (max_drawdown_total / peak_value) * 100
-        min_drawdown_total_pct = (min_drawdown_total / peak_value) * 100 if min_drawdown_total > 0 else 0
-        max_drawdown_buy_pct = (max_drawdown_buy / peak_value) * 100
-        min_drawdown_buy_pct = (min_drawdown_buy / peak_value) * 100 if min_drawdown_buy > 0 else 0
-        max_drawdown_sell_pct = (max_drawdown_sell / peak_value) * 100
-        min_drawdown_sell_pct = (min_drawdown_sell / peak_value) * 100 if min_drawdown_sell > 0 else 0
-    else:
-        max_drawdown_total_pct = max_drawdown_buy_pct = max_drawdown_sell_pct = 0
-        min_drawdown_total_pct = min_drawdown_buy_pct = min_drawdown_sell_pct = 0
-
-    # Return formatted results
-    return {
-        "max_drawdown": f"{max_drawdown_total:.2f} ({max_drawdown_total_pct:.2f})",
-        "max_drawdown_buy": f"{max_drawdown_buy:.2f} ({max_drawdown_buy_pct:.2f})",
-        "max_drawdown_sell": f"{max_drawdown_sell:.2f} ({max_drawdown_sell_pct:.2f})",
-        "min_drawdown": f"{min_drawdown_total:.2f} ({min_drawdown_total_pct:.2f})",
-        "min_drawdown_buy": f"{min_drawdown_buy:.2f} ({min_drawdown_buy_pct:.2f})",
-        "min_drawdown_sell": f"{min_drawdown_sell:.2f} ({min_drawdown_sell_pct:.2f})"
-    }
+    df = trades["data"]
+    close_time = df["close_time"].to_numpy()
+    profit = np.nan_to_num(df["profit"].to_numpy(dtype=np.float64), nan=0.0)
+    if side != "all":
+        mask = _label_mask(df["order_type"], side, lower=True)
+        close_time, profit = close_time[mask], profit[mask]
+    equity = np.cumsum(profit)
+
+    # The curve keeps its level from the start of the history; the range only crops it
+    first = np.searchsorted(close_time, np.datetime64(start), side="left") if start is not None else 0
+    last = np.searchsorted(close_time, np.datetime64(end), side="right") if end is not None else close_time.size
+    close_time, equity = close_time[first:last], equity[first:last]
+
+    indices = downsample_min_max(equity, points)
+    return jsonify({
+        "client_id": client_id,
+        "magic_number": magic_number,
+        "side": side,
+        "total_points": int(equity.size),
+        "time": np.datetime_as_string(close_time[indices], unit="s").tolist(),
+        "equity": np.round(equity[indices], 2).tolist()
+    }), 200
 
 # ==================================================== #
-# TODO test function ✅
-def calculate_floating_drawdown(df):
-    """
-    Calculate floating drawdown with separate entries for each metric.
-    Returns format: value (percentage) as individual dictionary items.
-    """
-    # Initialize results with separate keys
-    results = {
-        # Overall drawdown
-        "drawdown_floating_current": "0.00 (0.00)",
-        "drawdown_floating_max": "0.00 (0.00)",
-        "drawdown_floating_min": "0.00 (0.00)",
-        
-        # Buy drawdown
-        "drawdown_floating_buy_current": "0.00 (0.00)",
-        "drawdown_floating_buy_max": "0.00 (0.00)",
-        "drawdown_floating_buy_min": "0.00 (0.00)",
-        
-        # Sell drawdown
-        "drawdown_floating_sell_current": "0.00 (0.00)",
-        "drawdown_floating_sell_max": "0.00 (0.00)",
-        "drawdown_floating_sell_min": "0.00 (0.00)"
-    }
-
-    # Check for required columns
-    required_cols = ['floating_drawdown', 'floating_drawdown_currency', 'order_type']
-    if df.empty or not all(col in df.columns for col in required_cols):
-        return results
-
-    # Ensure sorted by index
-    df = df.sort_index()
-
-    # Format helper
-    def format_drawdown(dollar_val, pct_val):
-        return f"{abs(dollar_val):.2f} ({abs(pct_val):.2f})"
-
-    # Calculate overall metrics
-    results["drawdown_floating_current"] = format_drawdown(
-        df['floating_drawdown_currency'].iloc[-1],
-        df['floating_drawdown'].iloc[-1]
-    )
-    results["drawdown_floating_max"] = format_drawdown(
-        df['floating_drawdown_currency'].max(),
-        df['floating_drawdown'].max()
-    )
-    results["drawdown_floating_min"] = format_drawdown(
-        df['floating_drawdown_currency'].min(),
-        df['floating_drawdown'].min()
+def list_client_ids():
+    """Return every client folder under UPLOAD_DIR that holds a trades database."""
+    if not os.path.isdir(config.UPLOAD_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(config.UPLOAD_DIR)
+        if os.path.isfile(os.path.join(config.UPLOAD_DIR, name, config.DATABASE_FILENAME))
     )
 
-    # Calculate for Buy trades
-    buy_df = df[df["order_type"].str.lower() == "buy"]
-    if not buy_df.empty:
-        results["drawdown_floating_buy_current"] = format_drawdown(
-            buy_df['floating_drawdown_currency'].iloc[-1],
-            buy_df['floating_drawdown'].iloc[-1]
-        )
-        results["drawdown_floating_buy_max"] = format_drawdown(
-            buy_df['floating_drawdown_currency'].max(),
-            buy_df['floating_drawdown'].max()
-        )
-        results["drawdown_floating_buy_min"] = format_drawdown(
-            buy_df['floating_drawdown_currency'].min(),
-            buy_df['floating_drawdown'].min()
-        )
-
-    # Calculate for Sell trades
-    sell_df = df[df["order_type"].str.lower() == "sell"]
-    if not sell_df.empty:
-        results["drawdown_floating_sell_current"] = format_drawdown(
-            sell_df['floating_drawdown_currency'].iloc[-1],
-            sell_df['floating_drawdown'].iloc[-1]
-        )
-        results["drawdown_floating_sell_max"] = format_drawdown(
-            sell_df['floating_drawdown_currency'].max(),
-            sell_df['floating_drawdown'].max()
-        )
-        results["drawdown_floating_sell_min"] = format_drawdown(
-            sell_df['floating_drawdown_currency'].min(),
-            sell_df['floating_drawdown'].min()
-        )
-
-    return results
-
-# ==================================================== #
-# TODO test function ✅
-def calculate_profit_factor(df):
-    """Calculate the profit factor."""
-    winning_trades = df[df["profit"] > 0]
-    losing_trades = df[df["profit"] < 0]
-    total_winning_profit = winning_trades["profit"].sum()
-    total_losing_loss = abs(losing_trades["profit"].sum())
-    # Calculate profit factor and round to two decimal places
-    profit_factor = total_winning_profit / total_losing_loss if total_losing_loss != 0 else 0
-    return round(profit_factor, 2)
-# ==================================================== #
-# TODO test function ✅
-def calculate_trades_won_percentage(df):
-    """Calculate the total trades and win rate."""
-    total_trades = len(df)
-    winning_trades_count = len(df[df["profit"] > 0])
-    win_rate = (winning_trades_count / total_trades) * 100 if total_trades != 0 else 0
-    return f"{total_trades} ({win_rate:.2f} %)"
-
-# ==================================================== #
-# TODO test function ✅
-def calculate_expected_payoff(df):
-    """Calculate the expected payoff."""
-    total_profit = df["profit"].sum()
-    total_trades = len(df)
-    expected_payoff = total_profit / total_trades if total_trades != 0 else 0
-    return round(expected_payoff, 2)
-
-# ==================================================== #
-# TODO test function ✅
-def calculate_net_profit(df):
-    """Calculate the net profit (sum of positive profits)."""
-    net_profit = df[df["profit"] > 0]["profit"].sum()
-    return round(net_profit, 2)
-
 # ==================================================== #
-# TODO test function ✅
-def calculate_net_loss(df):
-    """Calculate the net loss (sum of negative profits)."""
-    net_loss = df[df["profit"] < 0]["profit"].sum()
-    return round(net_loss, 2)
+def portfolio_client_outputs(client_id):
+    """
+    Compute the outputs of every magic number of one client.
 
-# ==================================================== #
-# TODO test function ✅
-def calculate_balance_max_drawdown(df):
-    """Calculate the ratio of total profit to maximum drawdown."""
-    total_profit = df["profit"].sum()
-    max_drawdown = df["floating_drawdown"].max()
-    balance_max_drawdown = total_profit / max_drawdown if max_drawdown != 0 else 0
-    return round(balance_max_drawdown, 2)
+    Runs in a portfolio worker process, so failures come back as rows with an
+    "error" key instead of exceptions.
+    """
+    try:
+        with db_pool.connection(get_db_path(client_id)) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT Magic_Number FROM trades ORDER BY Magic_Number")
+            magic_numbers = [row[0] for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+        return [{"client_id": client_id, "error": f"Database error: {e}"}]
 
-# ==================================================== #
-# TODO test function ✅
-def calculate_quantity_metrics(df):
-    """Calculate buy and sell quantities and their percentages."""
-    total_trades = len(df)
-    buy_trades = df[df["order_type"].str.lower() == "buy"]
-    sell_trades = df[df["order_type"].str.lower() == "sell"]
-    buy_quantity = len(buy_trades)
-    sell_quantity = len(sell_trades)
-    buy_percentage = (buy_quantity / total_trades) * 100 if total_trades != 0 else 0
-    sell_percentage = (sell_quantity / total_trades) * 100 if total_trades != 0 else 0
-    return {
-        "Quantity": total_trades,
-        "Quantity_Buy": f"{buy_quantity} ({buy_percentage:.2f})",
-        "Quantity_Sell": f"{sell_quantity} ({sell_percentage:.2f})"
-    }
+    rows = []
+    for magic_number in magic_numbers:
+        outputs = get_filtered_outputs(client_id, magic_number)
+        rows.append({"client_id": client_id, "magic_number": magic_number, **outputs})
+    return rows
 
-# ==================================================== #
-# TODO test function ✅
-def calculate_profitability_metrics(df):
-    """Calculate profitable trades and their percentages."""
-    total_trades = len(df)
-    profitable_trades = df[df["profit"] > 0]
-    buy_trades = df[df["order_type"].str.lower() == "buy"]
-    sell_trades = df[df["order_type"].str.lower() == "sell"]
-    profitable_buy_trades = buy_trades[buy_trades["profit"] > 0]
-    profitable_sell_trades = sell_trades[sell_trades["profit"] > 0]
-    
-    profitable_percentage = (len(profitable_trades) / total_trades) * 100 if total_trades != 0 else 0
-    profitable_buy_percentage = (len(profitable_buy_trades) / len(buy_trades)) * 100 if len(buy_trades) != 0 else 0
-    profitable_sell_percentage = (len(profitable_sell_trades) / len(sell_trades)) * 100 if len(sell_trades) != 0 else 0
-    
-    return {
-        "Profitable": f"{len(profitable_trades)} ({profitable_percentage:.2f})",
-        "Profitable_Buy": f"{len(profitable_buy_trades)} ({profitable_buy_percentage:.2f})",
-        "Profitable_Sell": f"{len(profitable_sell_trades)} ({profitable_sell_percentage:.2f})"
-    }
+def _portfolio_worker_outputs(upload_dir, client_id):
+    """Worker entry point: compute one client against the parent's UPLOAD_DIR."""
+    config.UPLOAD_DIR = upload_dir
+    return portfolio_client_outputs(client_id)
 
-# ==================================================== #
-# TODO test function ✅
-def format_time_delta(total_seconds):
-    """Convert total seconds to days:hours:minutes format."""
-    days = int(total_seconds // 86400)  # 24 * 3600
-    hours = int((total_seconds % 86400) // 3600)
-    minutes = int((total_seconds % 3600) // 60)
-    return f"{days:02}:{hours:02}:{minutes:02}"
+_portfolio_pool = None
+_portfolio_pool_lock = threading.Lock()
 
-# ==================================================== #
-# TODO test function ✅
-def calculate_closure_metrics(df):
+def portfolio_pool(workers):
     """
-    Calculate trade closure reasons (Order, SL, TP) based on the "close_reason" column.
-    Returns:
-        dict: A dictionary with three keys:
-              - "Closed_by_Order": Count and percentage of trades closed for reasons other than SL or TP.
-              - "Closed_by_SL": Count and percentage of trades closed by stop-loss.
-              - "Closed_by_TP": Count and percentage of trades closed by take-profit.
-    """
-    # Normalize column names by stripping whitespace and converting to lowercase
-    df.columns = df.columns.str.strip().str.lower()
-
-    # Ensure the "close_reason" column exists
-    if "close_reason" not in df.columns:
-        raise ValueError("The 'close_reason' column is missing in the DataFrame.")
-
-    # Total number of trades
-    total_trades = len(df)
-
-    # Count trades by closure reason
-    closed_by_sl = df[df["close_reason"] == "sl"]
-    closed_by_tp = df[df["close_reason"] == "tp"]
-    closed_by_order = df[~df["close_reason"].isin(["sl", "tp"])]  # All reasons except SL and TP
-
-    closed_by_order_count = len(closed_by_order)
-    closed_by_sl_count = len(closed_by_sl)
-    closed_by_tp_count = len(closed_by_tp)
-
-    # Calculate percentages
-    closed_by_order_percentage = (closed_by_order_count / total_trades) * 100 if total_trades != 0 else 0
-    closed_by_sl_percentage = (closed_by_sl_count / total_trades) * 100 if total_trades != 0 else 0
-    closed_by_tp_percentage = (closed_by_tp_count / total_trades) * 100 if total_trades != 0 else 0
-
-    # Return the results
-    return {
-        "Closed_by_Order": f"{closed_by_order_count} ({closed_by_order_percentage:.2f})",
-        "Closed_by_SL": f"{closed_by_sl_count} ({closed_by_sl_percentage:.2f})",
-        "Closed_by_TP": f"{closed_by_tp_count} ({closed_by_tp_percentage:.2f})"
-    }
-# ==================================================== #
-# TODO test function ✅
-def calculate_profit_distribution(df):
+    The process-wide portfolio worker pool, created on first use and reused by
+    every later report. Recreated when the worker count changes or after a
+    worker crash broke it.
     """
-    Calculate profit distribution for buy and sell trades.
-    Returns:
-        A dictionary with the following keys:
-        - "profit_Buy": Total profit from buy trades and its percentage of total profit.
-        - "profit_Sell": Total profit from sell trades and its percentage of total profit.
-    """
-    # Filter buy and sell trades
-    buy_trades = df[df["order_type"].str.lower() == "buy"]
-    sell_trades = df[df["order_type"].str.lower() == "sell"]
-
-    # Calculate total profit from buy and sell trades
-    profit_buy = buy_trades["profit"].sum()
-    profit_sell = sell_trades["profit"].sum()
-
-    # Calculate total profit
-    total_profit = df["profit"].sum()
-
-    # Calculate percentages
-    profit_buy_percentage = (profit_buy / total_profit) * 100 if total_profit != 0 else 0
-    profit_sell_percentage = (profit_sell / total_profit) * 100 if total_profit != 0 else 0
-
-    # Ensure percentages are non-negative when profit is zero
-    if profit_buy == 0:
-        profit_buy_percentage = 0.0
-    if profit_sell == 0:
-        profit_sell_percentage = 0.0
-
-    # Format the results
-    return {
-        "profit_Buy": f"{profit_buy:.2f} ({profit_buy_percentage:.2f})",
-        "profit_Sell": f"{profit_sell:.2f} ({profit_sell_percentage:.2f})"
-    }
+    global _portfolio_pool
+    with _portfolio_pool_lock:
+        if _portfolio_pool is not None and _portfolio_pool._max_workers != workers:
+            _portfolio_pool.shutdown(wait=False)
+            _portfolio_pool = None
+        if _portfolio_pool is None:
+            _portfolio_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _portfolio_pool
+
+def _discard_portfolio_pool(pool):
+    """Drop a broken pool so the next report spawns a fresh one."""
+    global _portfolio_pool
+    with _portfolio_pool_lock:
+        if _portfolio_pool is pool:
+            _portfolio_pool = None
+    pool.shutdown(wait=False)
 
 # ==================================================== #
-# TODO test function ✅
-def calculate_time_extremes(df):
-    """Calculate max and min open time."""
-    df["duration"] = pd.to_timedelta(df["duration"])
-    max_open_time = df["duration"].max().total_seconds()
-    min_open_time = df["duration"].min().total_seconds()
-    return {
-        "Max_Open_Time": format_time_delta(max_open_time),
-        "Min_Open_Time": format_time_delta(min_open_time)
-    }
+def iter_portfolio_outputs(client_ids=None, workers=PORTFOLIO_WORKERS):
+    """
+    Yield output rows for every (client, magic number), fanned out over the shared
+    process pool with one task per client database. Rows are yielded as clients
+    finish. Small portfolios are computed in-process.
+    """
+    client_ids = list_client_ids() if client_ids is None else list(client_ids)
+    if not client_ids:
+        return
+    if workers <= 1 or len(client_ids) <= PORTFOLIO_INPROCESS_MAX_CLIENTS:
+        for client_id in client_ids:
+            yield from portfolio_client_outputs(client_id)
+        return
+
+    pool = portfolio_pool(workers)
+    try:
+        futures = {
+            pool.submit(_portfolio_worker_outputs, config.UPLOAD_DIR, client_id): client_id
+            for client_id in client_ids
+        }
+    except BrokenProcessPool:
+        # A worker of the shared pool died since the last report: start over once.
+        _discard_portfolio_pool(pool)
+        pool = portfolio_pool(workers)
+        futures = {
+            pool.submit(_portfolio_worker_outputs, config.UPLOAD_DIR, client_id): client_id
+            for client_id in client_ids
+        }
+    try:
+        for future in as_completed(futures):
+            try:
+                yield from future.result()
+            except BrokenProcessPool as e:
+                _discard_portfolio_pool(pool)
+                logger.error(f"Portfolio worker failed for client {futures[future]}: {e}")
+                yield {"client_id": futures[future], "error": f"Worker failed: {e}"}
+            except Exception as e:
+                logger.error(f"Portfolio worker failed for client {futures[future]}: {e}")
+                yield {"client_id": futures[future], "error": f"Worker failed: {e}"}
+    finally:
+        # A client that disconnects mid-stream must not leave its tasks queued
+        # in the shared pool.
+        for future in futures:
+            future.cancel()
 
 # ==================================================== #
-# TODO test function ✅
-def calculate_win_loss_metrics(df):
-    """Calculate biggest win, average win, biggest loss, and average loss, rounded to two decimal places."""
-    winning_trades = df[df["profit"] > 0]
-    losing_trades = df[df["profit"] < 0]
-    
-    biggest_win = round(winning_trades["profit"].max(), 2) if not winning_trades.empty else 0
-    average_win = round(winning_trades["profit"].mean(), 2) if not winning_trades.empty else 0
-    biggest_loss = round(losing_trades["profit"].min(), 2) if not losing_trades.empty else 0
-    average_loss = round(losing_trades["profit"].mean(), 2) if not losing_trades.empty else 0
-    
-    return {
-        "Biggest_Win": biggest_win,
-        "Average_Win": average_win,
-        "Biggest_Loss": biggest_loss,
-        "Average_Loss": average_loss
-    }
+def portfolio_sort_value(value):
+    """
+    Sortable number for an output value: plain numbers as-is, "d:hh:mm" durations
+    in minutes and formatted strings such as "174 (33.92)" by their leading number.
+    Returns None when the value has no number.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+    duration = re.match(r"^(-?\d+):(\d{2}):(\d{2})", value)
+    if duration:
+        days, hours, minutes = (int(part) for part in duration.groups())
+        return float(days * 1440 + hours * 60 + minutes)
+    number = re.match(r"^\s*(-?\d+(?:\.\d+)?)", value)
+    return float(number.group(1)) if number else None
+
+def rank_portfolio_rows(rows, sort_key=None, descending=True, top=None):
+    """
+    Order portfolio rows by an output key and keep the first `top`. Rows without a
+    number for the key go last. Without a sort key rows pass through unbuffered.
+    """
+    if sort_key is None:
+        for index, row in enumerate(rows):
+            if top is not None and index >= top:
+                return
+            yield row
+        return
+
+    def key(item):
+        value = portfolio_sort_value(item[1].get(sort_key))
+        if value is None:
+            return (0, 0.0, -item[0])
+        return (1, value if descending else -value, -item[0])
+
+    indexed = list(enumerate(rows))
+    ranked = heapq.nlargest(top, indexed, key=key) if top is not None else sorted(indexed, key=key, reverse=True)
+    for rank, (_, row) in enumerate(ranked, start=1):
+        yield {"rank": rank, **row}
 
 # ==================================================== #
-# TODO test function ✅
-def calculate_time_metrics(df):
+@app.route(f'/{config.call_back_token_sync}/portfolio', methods=["GET"])
+def api_portfolio():
     """
-    Calculate time-based metrics.
-    
-    Parameters:
-        df (pd.DataFrame): DataFrame containing "duration" and "order_type" columns.
-        
-    Returns:
-        dict: A dictionary containing time-based metrics.
-    """
-    # Ensure the "duration" column is in timedelta format
-    if not pd.api.types.is_timedelta64_dtype(df["duration"]):
-        df["duration"] = pd.to_timedelta(df["duration"], unit="s")
-
-    # Calculate total open time in seconds
-    total_open_time = df["duration"].sum().total_seconds()
-
-    # Filter buy and sell trades
-    buy_trades = df[df["order_type"].str.lower() == "buy"]
-    sell_trades = df[df["order_type"].str.lower() == "sell"]
-
-    # Calculate total open time for buy and sell trades
-    buy_open_time = buy_trades["duration"].sum().total_seconds()
-    sell_open_time = sell_trades["duration"].sum().total_seconds()
-
-    # Calculate average open times
-    avg_open_time = total_open_time / len(df) if len(df) != 0 else 0
-    avg_buy = buy_open_time / len(buy_trades) if len(buy_trades) != 0 else 0
-    avg_sell = sell_open_time / len(sell_trades) if len(sell_trades) != 0 else 0
-
-    # Calculate percentages for buy and sell open times
-    buy_percentage = (buy_open_time / total_open_time) * 100 if total_open_time != 0 else 0
-    sell_percentage = (sell_open_time / total_open_time) * 100 if total_open_time != 0 else 0
-
-    # Calculate max and min open times
-    max_open_time = df["duration"].max().total_seconds()
-    min_open_time = df["duration"].min().total_seconds()
-
-    # Return the results
-    return {
-        "Open_Time": format_time_delta(total_open_time),
-        "Open_Time_Buy": f"{format_time_delta(buy_open_time)} ({buy_percentage:.2f})",
-        "Open_Time_Sell": f"{format_time_delta(sell_open_time)} ({sell_percentage:.2f})",
-        "Avg_Open_Time": format_time_delta(avg_open_time),
-        "Avg_Buy": format_time_delta(avg_buy),
-        "Avg_Sell": format_time_delta(avg_sell),
-        "Max_Open_Time": format_time_delta(max_open_time),
-        "Min_Open_Time": format_time_delta(min_open_time)
-    }
+    API endpoint streaming the outputs of every client and magic number as NDJSON.
 
-# ==================================================== #
-# TODO test function ✅
-def calculate_additional_metrics(df):
+    Query parameters: clients (comma-separated, default all), sort (an output key),
+    order (desc|asc), top (int). Without sort, rows are streamed as each client
+    finishes; with sort they are ranked once all have finished.
     """
-    Calculate additional trading metrics based on the DataFrame.
+    clients = request.args.get("clients")
+    sort_key = request.args.get("sort")
+    order = request.args.get("order", "desc")
+    top = request.args.get("top")
 
-    Parameters:
-        df (pd.DataFrame): DataFrame containing trading data with columns like "profit", "order_type",
-                           "duration", "lots", "commission", "swap", etc.
+    if order not in ("asc", "desc"):
+        return jsonify({"error": "Invalid order. Must be 'asc' or 'desc'."}), 400
+    try:
+        top = int(top) if top is not None else None
+        if top is not None and top < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "Invalid top. Must be a positive integer."}), 400
 
-    Returns:
-        dict: A dictionary containing the following metrics:
-              - "max_flat_period": Maximum flat period in days:hours:minutes format.
-              - "max_drawdown_time": Maximum drawdown time in days:hours:minutes format.
-              - "max_drawdown_trades": Number of trades during the maximum drawdown period.
-              - "most_winning_trades": Most winning trades in "count (total_profit)" format.
-              - "most_losing_trades": Most losing trades in "count (total_loss)" format.
-              - "winning_streak": Winning streak in "total_profit (count)" format.
-              - "losing_streak": Losing streak in "total_loss (count)" format.
-              - "sum_lots": Total sum of lots traded.
-              - "sum_commission": Total commission in "total_commission (percentage)" format.
-              - "sum_swap": Total swap in "total_swap (percentage)" format.
-    """
-    # Ensure the DataFrame is sorted by index (or time) if not already
-    df = df.sort_index()
-
-    # Initialize results dictionary
-    results = {}
-
-    # 1. Max Flat Period
-    max_flat_period = df["duration"].max().total_seconds()
-    results["max_flat_period"] = format_time_delta(max_flat_period)
-
-    # 2. Max Drawdown Time
-    df["peak"] = df["profit"].cummax()
-    drawdown = df["peak"] - df["profit"]
-    max_drawdown_time = df.loc[drawdown.idxmax(), "duration"].total_seconds()
-    results["max_drawdown_time"] = format_time_delta(max_drawdown_time)
-
-    # 3. Max Drawdown Trades
-    max_drawdown_trades = len(df[df["profit"] < df["peak"]])
-    results["max_drawdown_trades"] = max_drawdown_trades
-
-    # 4. Most Winning Trades
-    winning_trades = df[df["profit"] > 0]
-    most_winning_trades_count = len(winning_trades)
-    most_winning_trades_profit = winning_trades["profit"].sum()
-    results["most_winning_trades"] = f"{most_winning_trades_count} ({most_winning_trades_profit:.2f} USD)"
-
-    # 5. Most Losing Trades
-    losing_trades = df[df["profit"] < 0]
-    most_losing_trades_count = len(losing_trades)
-    most_losing_trades_loss = losing_trades["profit"].sum()
-    results["most_losing_trades"] = f"{most_losing_trades_count} ({most_losing_trades_loss:.2f} USD)"
-
-    # 6. Winning Streak
-    winning_streak = df[df["profit"] > 0]["profit"].sum()
-    winning_streak_count = len(df[df["profit"] > 0])
-    results["winning_streak"] = f"{winning_streak:.2f} USD ({winning_streak_count})"
-
-    # 7. Losing Streak
-    losing_streak, losing_streak_count = calculate_losing_streak(df)
-    results["losing_streak"] = f"{losing_streak:.2f} USD ({losing_streak_count})"
-
-    # 8. Sum Lots
-    sum_lots = round(df["volume"].sum(), 2)  # Round to 2 decimal places
-    results["sum_lots"] = sum_lots
-
-    # 9. Sum Commission
-    sum_commission = df["commission"].sum()
-    commission_percentage = (sum_commission / df["profit"].sum()) * 100 if df["profit"].sum() != 0 else 0
-    results["sum_commission"] = f"{sum_commission:.2f} USD ({commission_percentage:.2f})"
-
-    # 10. Sum Swap
-    sum_swap = df["swap"].sum()
-    swap_percentage = (sum_swap / df["profit"].sum()) * 100 if df["profit"].sum() != 0 else 0
-    results["sum_swap"] = f"{sum_swap:.2f} USD ({swap_percentage:.2f})"
-
-    return results
+    client_ids = [client.strip() for client in clients.split(",") if client.strip()] if clients else None
+    if client_ids is not None:
+        unknown = [client_id for client_id in client_ids if not database_exists(client_id)]
+        if unknown:
+            return jsonify({"error": f"Unknown clients: {unknown}"}), 404
 
-# ==================================================== #
-# TODO test function ✅
-def format_time_delta(total_seconds):
-    """Convert total seconds to days:hours:minutes format."""
-    days = int(total_seconds // (24 * 3600))
-    total_seconds %= 24 * 3600
-    hours = int(total_seconds // 3600)
-    total_seconds %= 3600
-    minutes = int(total_seconds // 60)
-    return f"{days}:{hours:02}:{minutes:02}"
+    rows = rank_portfolio_rows(iter_portfolio_outputs(client_ids), sort_key, order == "desc", top)
+    logger.info(f"Streaming portfolio report (sort={sort_key}, order={order}, top={top})")
+    return Response(stream_with_context(json.dumps(row) + "\n" for row in rows), mimetype="application/x-ndjson")
 
 # ==================================================== #
-# TODO test function ✅
-def calculate_losing_streak(df):
+def add_single_transaction(client_id, magic_number, transaction_data):
     """
-    Calculate the losing streak (longest sequence of consecutive losing trades).
-
-    Parameters:
-        df (pd.DataFrame): DataFrame containing trading data with a "profit" column.
+    Adds a single transaction to the client's 'trades' table.
 
     Returns:
-        float: Total loss during the losing streak.
-        int: Number of trades in the losing streak.
-    """
-    losing_streak_loss = 0
-    losing_streak_count = 0
-    current_streak_loss = 0
-    current_streak_count = 0
-
-    for profit in df["profit"]:
-        if profit < 0:
-            current_streak_loss += profit
-            current_streak_count += 1
-        else:
-            if current_streak_loss < losing_streak_loss:
-                losing_streak_loss = current_streak_loss
-                losing_streak_count = current_streak_count
-            current_streak_loss = 0
-            current_streak_count = 0
-
-    # Check the last streak
-    if current_streak_loss < losing_streak_loss:
-        losing_streak_loss = current_streak_loss
-        losing_streak_count = current_streak_count
-
-    return losing_streak_loss, losing_streak_count
-
-# ==================================================== #
-# TODO test function ✅
-
+        bool | None: True when written, False when it was already stored, None on failure.
+    """
+    written = add_transactions(client_id, [transaction_data])
+    if written is None:
+        return None
+    if written[0]:
+        logger.info(f"Added new transaction to client database for Magic_Number {magic_number}.")
+    return written[0]
 
 # ==================================================== #
-# TODO test function ✅
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+def add_transactions(client_id, transactions):
+    """
+    Adds transactions to the client's 'trades' table in one transaction.
 
+    Transaction keys are matched to the table columns by their canonical name, so
+    the EA's alternative spellings ("S/L", "s_l", "Type") land in the same column.
+    Rows with the same column set are converted together with encode_trade_rows()
+    and written with one executemany; trades already stored under the same natural
+    key are ignored.
 
-# ==================================================== #
-# TODO test function ✅
-def add_single_transaction(client_id, magic_number, transaction_data):
-    """
-    Adds a single transaction to the filtered database if it matches the Magic_Number.
+    Returns:
+        list | None: One flag per transaction, True when written and False when it
+        was a duplicate, or None on failure.
     """
-    filtered_db_path = os.path.join(config.UPLOAD_DIR, client_id, f"filtered_{magic_number}.db")
-
-    if not os.path.exists(filtered_db_path):
-        logger.error(f"Filtered database for Magic_Number {magic_number} does not exist.")
-        return False
+    db_path = get_db_path(client_id)
 
-    if transaction_data.get("Magic_Number") != magic_number:
-        logger.info("Transaction does not match the specified Magic_Number.")
-        return False
+    if not os.path.exists(db_path):
+        logger.error(f"Database for client {client_id} does not exist.")
+        return None
 
     try:
-        df_new = pd.DataFrame([transaction_data])
-        with sqlite3.connect(filtered_db_path) as conn:
-            df_new.to_sql("filtered_trades", conn, if_exists="append", index=False)
-        logger.info(f"Added new transaction to filtered database for Magic_Number {magic_number}.")
-        return True
+        with db_pool.connection(db_path) as conn:
+            cursor = conn.cursor()
+            begin_write(cursor)
+            base_meta = _read_sync_meta(cursor)
+            cursor.execute("PRAGMA table_info(trades)")
+            columns = {row[1].lower() for row in cursor.fetchall()}
+            codes = load_trade_codes(cursor)
+            first_rowid = _last_trade_rowid(cursor)
+
+            groups = {}
+            for position, transaction_data in enumerate(transactions):
+                values = {}
+                for key, value in transaction_data.items():
+                    column = canonical_column(key)
+                    if column in columns and column not in values:
+                        values[column] = value
+                groups.setdefault(tuple(values), []).append((position, list(values.values())))
+
+            trades = [None] * len(transactions)
+            for names, items in groups.items():
+                quoted = ", ".join(f'"{column}"' for column in names)
+                placeholders = ", ".join("?" for _ in names)
+                raw_rows = [row for _, row in items]
+                try:
+                    rows = encode_trade_rows(cursor, list(names), raw_rows, codes)
+                except ValueError:
+                    # Values valid one by one can still defeat the column-wide
+                    # conversion (e.g. times in two formats): convert row by row
+                    rows = [encode_trade_rows(cursor, list(names), [row], codes)[0] for row in raw_rows]
+                written = insert_new_rows(cursor, f"INSERT OR IGNORE INTO trades ({quoted}) VALUES ({placeholders})", rows)
+                for (position, _), row, new in zip(items, rows, written):
+                    if new:
+                        trades[position] = dict(zip(names, row))
+
+            new_trades = [trade for trade in trades if trade is not None]
+            if new_trades:
+                _, fingerprint, max_close_time = _hash_trades_after(cursor, first_rowid)
+                _write_sync_meta(
+                    cursor, base_meta, len(new_trades), fingerprint, max_close_time,
+                    magic_numbers={trade["magic_number"] for trade in new_trades}
+                )
+                apply_trades_to_aggregates(conn, new_trades)
+        if new_trades:
+            _sync_trade_snapshot(client_id, first_rowid, base_meta["fingerprint"])
+        metrics.inc("ingested_rows_total", len(new_trades), mode="transaction")
+        return [trade is not None for trade in trades]
     except sqlite3.Error as e:
         logger.error(f"Database error: {e}")
-        return False
+        return None
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
-        return False
-    
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+        return None
 
 
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=8010)
+
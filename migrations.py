@@ -0,0 +1,121 @@
+"""
+In-place schema upgrades, run by the connection pool on every new connection and
+each a no-op once applied: the client 'trades' table up to TRADES_SCHEMA_VERSION
+and the natural-key index on the main database's Trade_Transaction table.
+"""
+# Standard Library Imports
+import logging
+import time
+
+# Local Imports
+from aggregates import rebuild_aggregates
+from database import begin_write
+from schema import (
+    TRADES_SCHEMA_VERSION, TRADE_NATURAL_KEY, _ensure_sync_meta_table, _ensure_trade_key, _ensure_unique_key,
+    _hash_trades_after, _write_sync_meta, canonical_header, create_trades_table, encode_trade_rows, load_trade_codes
+)
+
+logger = logging.getLogger(__name__)
+
+# ==================================================== #
+def upgrade_trades_schema(conn):
+    """
+    Bring a database's 'trades' table up to TRADES_SCHEMA_VERSION in place, once:
+    version 1 converts a table ingested before the canonical schema (text times,
+    original column names), version 2 moves duplicate trades to
+    'trades_duplicates' and adds the natural-key index, version 3 recomputes the fingerprint as FINGERPRINT_FIELDS
+    defines it and version 4 adds the duplicate count to sync_meta. Duplicates
+    moved aside here are counted there and kept in the fingerprint, as an upload
+    would (see _ensure_sync_meta_table).
+
+    When trades were rewritten or removed, sync_meta, the aggregates and the
+    rollups are recomputed in the same transaction and the snapshot is
+    re-exported on its next refresh.
+    """
+    cursor = conn.cursor()
+    if cursor.execute("PRAGMA user_version").fetchone()[0] >= TRADES_SCHEMA_VERSION:
+        return
+    if not cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'trades'").fetchone():
+        return
+
+    begin_write(cursor)
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    if version >= TRADES_SCHEMA_VERSION:
+        conn.commit()
+        return
+    started = time.perf_counter()
+    changed = False
+
+    _ensure_sync_meta_table(cursor)
+    if "duplicates" not in {row[1] for row in cursor.execute("PRAGMA table_info(sync_meta)").fetchall()}:
+        cursor.execute("ALTER TABLE sync_meta ADD COLUMN duplicates INTEGER NOT NULL DEFAULT 0")
+
+    if version < 1:
+        reader = conn.execute("SELECT * FROM trades ORDER BY rowid")
+        names = canonical_header([description[0] for description in reader.description])
+        placeholders = ", ".join("?" for _ in names)
+        count = 0
+        cursor.execute("DROP TABLE IF EXISTS trades_canonical")
+        while True:
+            rows = [list(row) for row in reader.fetchmany(50_000)]
+            if count == 0:
+                create_trades_table(cursor, names, rows, "trades_canonical")
+                codes = load_trade_codes(cursor)
+            if not rows:
+                break
+            cursor.executemany(
+                f"INSERT INTO trades_canonical VALUES ({placeholders})", encode_trade_rows(cursor, names, rows, codes)
+            )
+            count += len(rows)
+        cursor.execute("DROP TABLE trades")
+        cursor.execute("ALTER TABLE trades_canonical RENAME TO trades")
+        if "magic_number" in names and "close_time" in names:
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_trades_magic_close ON trades (Magic_Number, Close_Time)")
+        logger.info(f"Converted {count} trades to the canonical schema")
+        changed = True
+
+    names = [row[1].lower() for row in cursor.execute("PRAGMA table_info(trades)").fetchall()]
+    if version < 3:
+        count, fingerprint, max_close_time = _hash_trades_after(cursor, 0)
+        duplicates = _ensure_trade_key(cursor, names)
+        _write_sync_meta(cursor, None, count - duplicates, fingerprint, max_close_time, duplicates)
+        changed = duplicates > 0 or changed
+    if changed and "magic_number" in names:
+        rebuild_aggregates(conn)
+    cursor.execute(f"PRAGMA user_version = {TRADES_SCHEMA_VERSION}")
+    conn.commit()
+    logger.info(
+        f"Upgraded trades schema from version {version} to {TRADES_SCHEMA_VERSION} "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+
+# ==================================================== #
+TRANSACTION_KEY = TRADE_NATURAL_KEY + ("type", "volume", "open_price", "close_price", "profit")
+
+def upgrade_transaction_schema(conn):
+    """
+    Add the natural-key index to the main database's Trade_Transaction table once,
+    so a resent trade is ignored; duplicates stored before it are moved to
+    'Trade_Transaction_duplicates' and reported (see _ensure_unique_key). Runs
+    when the pool opens a connection, like upgrade_trades_schema.
+
+    Returns:
+        int: Number of duplicate rows moved.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE (type = 'table' AND name = 'Trade_Transaction') "
+        "OR (type = 'index' AND name = 'idx_trade_transaction_natural_key')"
+    )
+    if cursor.fetchone()[0] != 1:
+        return 0
+    begin_write(cursor)
+    moved = _ensure_unique_key(cursor, "Trade_Transaction", TRANSACTION_KEY, "idx_trade_transaction_natural_key")
+    conn.commit()
+    return moved
+
+# ==================================================== #
+def upgrade_schema(conn):
+    """Schema upgrades run on every new pooled connection; each is a no-op once applied."""
+    upgrade_trades_schema(conn)
+    upgrade_transaction_schema(conn)
@@ -0,0 +1,160 @@
+"""
+Prometheus-style instrumentation: the MetricsRegistry every module records to,
+served on /metrics by main.py.
+
+    @metrics.timed("snapshot_read")
+    def read_filtered_trades(client_id, magic_number): ...
+
+    with metrics.timer("sqlite_lock_wait_seconds"):
+        ...
+"""
+# Standard Library Imports
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Local Imports
+import config
+
+logger = logging.getLogger(__name__)
+
+# Prometheus-style instrumentation served on /metrics next to the health check.
+METRICS_ENABLED = getattr(config, "METRICS_ENABLED", True)
+
+# ==================================================== #
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms exported in the Prometheus text format.
+
+    Every update is a dict lookup and an addition under one lock, so leaving it
+    enabled costs microseconds per request. Collectors registered with
+    add_collector() are called at render time to export gauges that other
+    components already keep (cache, pool, ingestion queue).
+    """
+
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    STAGE_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60)
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self._meta = {}
+        self._values = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, help_text, buckets=None):
+        """Declare a metric: kind is "counter", "gauge" or "histogram"."""
+        self._meta[name] = (kind, help_text, buckets)
+        self._values.setdefault(name, {})
+
+    def add_collector(self, collector):
+        """Register a callable returning [(name, labels dict, value)] gauge samples."""
+        self._collectors.append(collector)
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._values[name][tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        buckets = self._meta[name][2]
+        with self._lock:
+            series = self._values[name]
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0] * len(buckets) + [0, 0.0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the duration of the block in the histogram `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, stage):
+        """Decorator observing each call's duration as stage_duration_seconds{stage=...}."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer("stage_duration_seconds", stage=stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _labels(labels):
+        if not labels:
+            return ""
+        text = ",".join(f'{key}="{str(value)}"'.replace("\n", " ") for key, value in labels)
+        return "{" + text + "}"
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        collected = {}
+        for collector in self._collectors:
+            try:
+                for name, labels, value in collector():
+                    collected.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, buckets) in self._meta.items():
+                series = collected.get(name, self._values[name])
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in series.items():
+                    if kind != "histogram":
+                        lines.append(f"{name}{self._labels(key)} {value}")
+                        continue
+                    for bound, count in zip(buckets, value):
+                        lines.append(f"{name}_bucket{self._labels(key + (('le', bound),))} {count}")
+                    lines.append(f"{name}_bucket{self._labels(key + (('le', '+Inf'),))} {value[-2]}")
+                    lines.append(f"{name}_count{self._labels(key)} {value[-2]}")
+                    lines.append(f"{name}_sum{self._labels(key)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry(METRICS_ENABLED)
+metrics.describe("http_requests_in_flight", "gauge", "Requests currently being served.")
+metrics.describe("http_request_duration_seconds", "histogram", "Request latency by endpoint, method and status.",
+                 MetricsRegistry.LATENCY_BUCKETS)
+metrics.describe("stage_duration_seconds", "histogram", "Time spent in each processing stage.",
+                 MetricsRegistry.STAGE_BUCKETS)
+metrics.describe("ingested_rows_total", "counter", "Trade rows written to client databases.")
+metrics.describe("ingest_rows_per_second", "gauge", "Throughput of the most recent ingestion.")
+metrics.describe("sqlite_lock_wait_seconds", "histogram", "Time spent waiting for the SQLite write lock.",
+                 MetricsRegistry.STAGE_BUCKETS)
+metrics.describe("sqlite_pool_wait_seconds", "histogram", "Time spent waiting for a pooled connection.",
+                 MetricsRegistry.STAGE_BUCKETS)
+metrics.describe("sqlite_lock_errors_total", "counter", "Writes that failed because the database stayed locked.")
+metrics.describe("sqlite_pool_connections", "gauge", "Pooled SQLite connections by state.")
+metrics.describe("result_cache_entries", "gauge", "Entries in the output result cache.")
+metrics.describe("result_cache_requests_total", "counter", "Result cache lookups by outcome.")
+metrics.describe("ingest_queue_depth", "gauge", "Uploads waiting for an ingestion worker.")
+metrics.describe("ingest_jobs", "gauge", "Tracked ingestion jobs by status.")
+metrics.describe("ingest_compressed_bytes_total", "counter", "Compressed upload bytes received, by encoding.")
+metrics.describe("ingest_decompressed_bytes_total", "counter", "Bytes inflated from compressed uploads, by encoding.")
+metrics.describe("ingest_decompress_bytes_per_second", "gauge",
+                 "Decompression throughput (uncompressed bytes) of the most recent compressed upload.")
@@ -0,0 +1,49 @@
+"""
+Portfolio report over every client database under config.UPLOAD_DIR.
+
+Writes one JSON object per (client, magic number) to stdout or a file, computed
+in parallel worker processes.
+
+    python portfolio.py --sort total_profit --top 20
+    python portfolio.py --clients 1001,1002 --output report.ndjson
+"""
+# Standard Library Imports
+import argparse
+import json
+import sys
+
+# Local Imports
+from main import PORTFOLIO_WORKERS, iter_portfolio_outputs, rank_portfolio_rows
+
+
+# ==================================================== #
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compute outputs for every client and magic number.")
+    parser.add_argument("--clients", help="Comma-separated client ids (default: every client folder)")
+    parser.add_argument("--sort", help="Output key to rank by, e.g. total_profit")
+    parser.add_argument("--order", choices=("desc", "asc"), default="desc")
+    parser.add_argument("--top", type=int, help="Keep only the first N rows")
+    parser.add_argument("--workers", type=int, default=PORTFOLIO_WORKERS, help="Worker processes (default: one per core)")
+    parser.add_argument("--output", help="Write NDJSON to this file instead of stdout")
+    return parser.parse_args(argv)
+
+# ==================================================== #
+def main(argv=None):
+    args = parse_args(argv)
+    client_ids = [client.strip() for client in args.clients.split(",") if client.strip()] if args.clients else None
+
+    rows = rank_portfolio_rows(
+        iter_portfolio_outputs(client_ids, args.workers), args.sort, args.order == "desc", args.top
+    )
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for row in rows:
+            out.write(json.dumps(row) + "\n")
+            out.flush()
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
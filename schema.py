@@ -0,0 +1,453 @@
+"""
+The canonical 'trades' schema of a client database: column names, typed storage
+and the 'trade_codes' table, the natural key resent trades are dropped on, and
+the sync fingerprint and version kept in 'sync_meta'.
+
+Everything here works on an open cursor; connections come from database.py and
+upgrades of older databases live in migrations.py.
+"""
+# Standard Library Imports
+import csv
+import hashlib
+import logging
+import re
+import time
+
+# Third-Party Imports
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# ==================================================== #
+def _infer_sqlite_type(values):
+    """Pick the SQLite column type the way pandas would for a column of CSV strings."""
+    column_type = "INTEGER"
+    seen = False
+    for value in values:
+        if value is None:
+            continue
+        seen = True
+        if column_type == "INTEGER":
+            try:
+                int(value)
+                continue
+            except ValueError:
+                column_type = "REAL"
+        try:
+            float(value)
+        except ValueError:
+            return "TEXT"
+    return column_type if seen else "TEXT"
+
+# ==================================================== #
+# Canonical 'trades' schema. Column names are normalized on ingestion and values
+# stored typed: times as epoch seconds, durations as whole seconds and order
+# types / close reasons as small-int codes into the 'trade_codes' table. Columns
+# not listed here keep their inferred type.
+TRADES_SCHEMA_VERSION = 4
+TRADE_COLUMN_KINDS = {
+    "open_time": "time", "symbol": "text", "magic_number": "integer", "order_type": "code",
+    "volume": "real", "open_price": "real", "s_l": "real", "t_p": "real", "close_price": "real",
+    "close_time": "time", "commission": "real", "swap": "real", "profit": "real", "profit_points": "real",
+    "duration": "duration", "open_comment": "text", "close_comment": "text", "close_reason": "code",
+    "floating_drawdown": "real", "floating_drawdown_currency": "real"
+}
+TRADE_KIND_TYPES = {
+    "time": "INTEGER", "duration": "INTEGER", "code": "INTEGER", "integer": "INTEGER", "real": "REAL", "text": "TEXT"
+}
+TRADE_COLUMN_ALIASES = {"type": "order_type", "sl": "s_l", "tp": "t_p"}
+# Codes every database starts with, so folding a trade never needs a lookup.
+TRADE_CODE_SEEDS = {"order_type": ("buy", "sell"), "close_reason": ("sl", "tp")}
+# Natural key of a trade: its ticket when uploaded, else when and where it traded
+# plus whichever of the fill details are present, so basket orders opened and
+# closed in the same second stay distinct. A UNIQUE index on it lets INSERT OR
+# IGNORE drop resent trades.
+TRADE_TICKET_KEY = ("ticket",)
+TRADE_NATURAL_KEY = ("open_time", "symbol", "magic_number", "close_time")
+TRADE_FILL_KEY = ("order_type", "volume", "open_price", "close_price", "profit")
+
+def canonical_column(name):
+    """Canonical name of an uploaded column: lower snake case, "S/L" and "Type" aliases resolved."""
+    name = re.sub(r"[^0-9a-z]+", "_", str(name).strip().lower()).strip("_")
+    return TRADE_COLUMN_ALIASES.get(name, name)
+
+def canonical_header(header):
+    names = [canonical_column(column) for column in header]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Columns map to the same name: {duplicates}")
+    return names
+
+def _ensure_trade_codes(cursor):
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS trade_codes (column_name TEXT NOT NULL, code INTEGER NOT NULL, "
+        "value TEXT NOT NULL, PRIMARY KEY (column_name, code), UNIQUE (column_name, value))"
+    )
+    for column, values in TRADE_CODE_SEEDS.items():
+        cursor.executemany(
+            "INSERT OR IGNORE INTO trade_codes VALUES (?, ?, ?)",
+            [(column, code, value) for code, value in enumerate(values)]
+        )
+
+def load_trade_codes(cursor):
+    """Return {column: [value of code 0, value of code 1, ...]} for the coded columns."""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'trade_codes'")
+    codes = {column: list(values) for column, values in TRADE_CODE_SEEDS.items()}
+    if cursor.fetchone():
+        cursor.execute("SELECT column_name, value FROM trade_codes ORDER BY column_name, code")
+        codes = {}
+        for column, value in cursor.fetchall():
+            codes.setdefault(column, []).append(value)
+    return codes
+
+def trade_key_columns(names):
+    """Natural-key columns of a table with these columns, or None when it has no natural key."""
+    if set(TRADE_TICKET_KEY) <= set(names):
+        return TRADE_TICKET_KEY
+    if set(TRADE_NATURAL_KEY) <= set(names):
+        return TRADE_NATURAL_KEY + tuple(column for column in TRADE_FILL_KEY if column in names)
+    return None
+
+def _ensure_unique_key(cursor, table, columns, index):
+    """
+    Create a UNIQUE index on `columns` of `table` unless it exists. Rows already
+    stored twice would block it: all but the oldest row of every duplicate group
+    are first moved, not deleted, to '<table>_duplicates', where they can be
+    reviewed and restored. Rows with a NULL key column stay, as SQLite never
+    treats them as duplicates.
+
+    Only for schema upgrades and new tables: it runs in the caller's write
+    transaction, never per insert.
+
+    Returns:
+        int: Number of duplicate rows moved.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index,))
+    if cursor.fetchone():
+        return 0
+    quoted = ", ".join(f'"{column}"' for column in columns)
+    not_null = " AND ".join(f'"{column}" IS NOT NULL' for column in columns)
+    duplicate = f"{not_null} AND rowid NOT IN (SELECT MIN(rowid) FROM {table} GROUP BY {quoted})"
+    moved = cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {duplicate}").fetchone()[0]
+    if moved:
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}_duplicates AS SELECT * FROM {table} WHERE 0")
+        cursor.execute(f"INSERT INTO {table}_duplicates SELECT * FROM {table} WHERE {duplicate}")
+        cursor.execute(f"DELETE FROM {table} WHERE {duplicate}")
+        logger.warning(f"Moved {moved} duplicate rows from {table} to {table}_duplicates")
+    cursor.execute(f"CREATE UNIQUE INDEX {index} ON {table} ({quoted})")
+    return moved
+
+def _ensure_trade_key(cursor, names):
+    """Unique natural-key index on 'trades' (see trade_key_columns); returns the duplicates moved aside."""
+    key = trade_key_columns(names)
+    return _ensure_unique_key(cursor, "trades", key, "idx_trades_natural_key") if key else 0
+
+def insert_new_rows(cursor, sql, rows):
+    """
+    Run an INSERT OR IGNORE over `rows` and return one flag per row: True when it
+    was written, False when the unique key dropped it.
+
+    The batch goes through one executemany; only when it wrote fewer rows than it
+    was given is it rolled back and replayed row by row to find the duplicates.
+    """
+    cursor.execute("SAVEPOINT insert_new_rows")
+    cursor.executemany(sql, rows)
+    if cursor.rowcount == len(rows):
+        written = [True] * len(rows)
+    else:
+        cursor.execute("ROLLBACK TO insert_new_rows")
+        written = []
+        for row in rows:
+            cursor.execute(sql, row)
+            written.append(cursor.rowcount == 1)
+    cursor.execute("RELEASE insert_new_rows")
+    return written
+
+def create_trades_table(cursor, names, rows, table="trades"):
+    """Create the canonical 'trades' table for the given columns; unknown ones typed from `rows`."""
+    types = [
+        TRADE_KIND_TYPES[TRADE_COLUMN_KINDS[name]] if name in TRADE_COLUMN_KINDS
+        else _infer_sqlite_type(None if row[i] is None else str(row[i]) for row in rows)
+        for i, name in enumerate(names)
+    ]
+    definition = ", ".join(f'"{name}" {column_type}' for name, column_type in zip(names, types))
+    cursor.execute(f"CREATE TABLE {table} ({definition})")
+    if table == "trades":
+        _ensure_trade_key(cursor, names)
+    _ensure_trade_codes(cursor)
+    cursor.execute(f"PRAGMA user_version = {TRADES_SCHEMA_VERSION}")
+
+def _encode_times(values):
+    if pd.api.types.is_numeric_dtype(values):
+        return pd.to_numeric(values).astype("Int64")
+    times = pd.to_datetime(values).to_numpy().astype("datetime64[ns]")
+    seconds = pd.array(times.view(np.int64) // 10**9, dtype="Int64")
+    seconds[np.isnat(times)] = pd.NA
+    return pd.Series(seconds, index=values.index)
+
+def _encode_duration(values):
+    seconds = pd.to_numeric(values, errors="coerce")
+    text = seconds.isna() & values.notna()
+    if text.any():
+        seconds[text] = pd.to_timedelta(values[text]).dt.total_seconds()
+    return seconds.round().astype("Int64")
+
+def encode_trade_rows(cursor, names, rows, codes):
+    """
+    Convert raw trade rows (CSV text or JSON values) to the canonical typed values,
+    one vectorized conversion per column.
+
+    `codes` comes from load_trade_codes(); values without a code yet get the next
+    free one, written to 'trade_codes' through `cursor`.
+
+    Raises:
+        ValueError: If a time, number or duration cannot be parsed.
+    """
+    frame = pd.DataFrame.from_records(rows, columns=names)
+    encoded = []
+    for name in names:
+        values = frame[name]
+        kind = TRADE_COLUMN_KINDS.get(name)
+        try:
+            if kind == "time":
+                values = _encode_times(values)
+            elif kind == "duration":
+                values = _encode_duration(values)
+            elif kind == "integer":
+                values = pd.to_numeric(values).astype("Int64")
+            elif kind == "real":
+                values = pd.to_numeric(values).astype("Float64")
+            elif kind == "code":
+                labels = values.astype("string")
+                if name == "order_type":
+                    labels = labels.str.lower()
+                known = codes.setdefault(name, [])
+                for label in labels.dropna().unique():
+                    if label not in known:
+                        cursor.execute("INSERT INTO trade_codes VALUES (?, ?, ?)", (name, len(known), label))
+                        known.append(label)
+                values = labels.map({label: code for code, label in enumerate(known)}).astype("Int64")
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Column {name}: {e}") from None
+        encoded.append(values.astype(object).where(values.notna(), None).tolist())
+    return [list(row) for row in zip(*encoded)]
+
+def _trade_time(value):
+    """Timestamp of a stored (epoch seconds) or raw (text) trade time."""
+    if isinstance(value, (int, np.integer)):
+        return pd.Timestamp(int(value), unit="s")
+    return pd.Timestamp(value)
+
+def _trade_code(column, value):
+    """Seeded label of a stored code, or the raw value itself."""
+    if isinstance(value, (int, np.integer)):
+        seeds = TRADE_CODE_SEEDS[column]
+        return seeds[value] if 0 <= value < len(seeds) else None
+    return value
+
+def format_close_time(value):
+    """Format a stored close time the way the EA writes it ("2024.01.31 23:59:00")."""
+    if isinstance(value, (int, np.integer)):
+        return pd.Timestamp(int(value), unit="s").strftime("%Y.%m.%d %H:%M:%S")
+    return value
+
+# ==================================================== #
+# Sync fingerprint of a trade history, defined on the CSV the EA exports so the
+# EA can compute it too. Each trade becomes one line: the fields below in this
+# order, joined with ",", each normalized as
+#   times           "YYYY.MM.DD HH:MM:SS"
+#   symbol          the text with surrounding spaces removed
+#   magic_number    a decimal integer
+#   order_type      lower case ("buy", "sell")
+#   2 / 5           fixed point with that many decimals ("-0.00" written "0.00")
+# and "" for an empty value or a column the CSV lacks. The fingerprint is the
+# sum modulo 2**64 of the first 8 bytes (big endian) of each line's UTF-8
+# SHA-256, as 16 lower-case hex digits: independent of row order, and of how
+# the server stores the trades, so schema migrations leave it unchanged.
+FINGERPRINT_FIELDS = (
+    ("open_time", "time"), ("symbol", "text"), ("magic_number", "integer"), ("order_type", "label"),
+    ("volume", 2), ("open_price", 5), ("close_price", 5), ("close_time", "time"), ("profit", 2)
+)
+FINGERPRINT_MASK = (1 << 64) - 1
+
+def _fingerprint_formatter(kind, index, labels=None):
+    """Function normalizing field `index` of a row for the fingerprint line; `labels` decodes stored codes."""
+    if index is None:
+        return lambda row: ""
+    if kind in ("time", "label", "text"):
+        def field(row):
+            value = row[index]
+            if value is None:
+                return ""
+            if isinstance(value, (int, np.integer)):
+                if kind == "time":
+                    return time.strftime("%Y.%m.%d %H:%M:%S", time.gmtime(int(value)))
+                if kind == "label" and labels is not None:
+                    value = labels[value] if 0 <= value < len(labels) else ""
+            value = str(value).strip()
+            return value.lower() if kind == "label" else value
+        return field
+    if kind == "integer":
+        return lambda row: "" if row[index] is None or row[index] == "" else str(int(row[index]))
+
+    spec = f".{kind}f"
+    def field(row):
+        value = row[index]
+        if value is None or value == "":
+            return ""
+        text = format(float(value), spec)
+        return text[1:] if text[0] == "-" and not text.strip("-0.") else text
+    return field
+
+def _fingerprint_rows(names, rows, codes):
+    """Count and fingerprint sum of rows whose columns are `names` (canonical)."""
+    formatters = [
+        _fingerprint_formatter(kind, names.index(name) if name in names else None, codes.get(name))
+        for name, kind in FINGERPRINT_FIELDS
+    ]
+    count = fingerprint = 0
+    for row in rows:
+        line = ",".join([field(row) for field in formatters])
+        digest = hashlib.sha256(line.encode("utf-8")).digest()
+        fingerprint = (fingerprint + int.from_bytes(digest[:8], "big")) & FINGERPRINT_MASK
+        count += 1
+    return count, fingerprint
+
+def csv_fingerprint(lines):
+    """
+    Sync fingerprint of a trades CSV (any iterable of text lines), computed from
+    the file alone as a client would; equals the server's once it holds these trades.
+    """
+    reader = csv.reader(lines)
+    names = canonical_header(next(reader))
+    frame = pd.DataFrame.from_records([row for row in reader if row], columns=names)
+    for name in ("open_time", "close_time"):
+        if name in names:
+            seconds = _encode_times(frame[name])
+            frame[name] = seconds.astype(object).where(seconds.notna(), None)
+    _, fingerprint = _fingerprint_rows(names, frame.itertuples(index=False, name=None), {})
+    return f"{fingerprint:016x}"
+
+def _sqlite_max(a, b):
+    """Larger of two values in SQLite's ordering (NULL < numbers < text)."""
+    if a is None or b is None:
+        return b if a is None else a
+    if isinstance(a, str) != isinstance(b, str):
+        return a if isinstance(a, str) else b
+    return max(a, b)
+
+def _hash_trades_after(cursor, rowid):
+    """
+    Count, fingerprint (see FINGERPRINT_FIELDS) and max Close_Time of the
+    'trades' rows past a rowid.
+    """
+    codes = load_trade_codes(cursor)
+    cursor.execute("SELECT * FROM trades WHERE rowid > ?", (rowid,))
+    names = [canonical_column(description[0]) for description in cursor.description]
+    close_index = names.index("close_time") if "close_time" in names else None
+    max_close_time = None
+
+    def rows():
+        nonlocal max_close_time
+        for trade in cursor:
+            if close_index is not None:
+                max_close_time = _sqlite_max(max_close_time, trade[close_index])
+            yield trade
+
+    count, fingerprint = _fingerprint_rows(names, rows(), codes)
+    return count, fingerprint, max_close_time
+
+def _last_trade_rowid(cursor):
+    """Highest rowid in the 'trades' table, 0 when it is empty."""
+    cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM trades")
+    return cursor.fetchone()[0]
+
+# Trades an upload repeats line for line (no ticket, same fill) are stored once;
+# sync_meta counts the dropped copies in "duplicates" and their lines stay in the
+# fingerprint, so rows + duplicates and the fingerprint describe the client's CSV.
+def _ensure_sync_meta_table(cursor):
+    """Create the single-row 'sync_meta' table if it doesn't exist yet."""
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS sync_meta (id INTEGER PRIMARY KEY CHECK (id = 0), "
+        "row_count INTEGER NOT NULL, max_close_time, fingerprint TEXT NOT NULL, version INTEGER NOT NULL, "
+        "duplicates INTEGER NOT NULL DEFAULT 0)"
+    )
+
+def _read_sync_meta(cursor):
+    """
+    Read the sync metadata row, deriving it from the 'trades' table once for
+    databases ingested before sync_meta existed.
+    """
+    _ensure_sync_meta_table(cursor)
+    cursor.execute("SELECT row_count, max_close_time, fingerprint, version, duplicates FROM sync_meta WHERE id = 0")
+    row = cursor.fetchone()
+    if row is None:
+        row_count = fingerprint = 0
+        max_close_time = None
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'trades'")
+        if cursor.fetchone():
+            row_count, fingerprint, max_close_time = _hash_trades_after(cursor, 0)
+        row = (row_count, max_close_time, f"{fingerprint:016x}", 0, 0)
+        cursor.execute("INSERT INTO sync_meta VALUES (0, ?, ?, ?, ?, ?)", row)
+    return {"rows": row[0], "last_close_time": row[1], "fingerprint": row[2], "version": row[3], "duplicates": row[4]}
+
+def _write_sync_meta(cursor, base, rows, fingerprint, max_close_time, duplicates=0, magic_numbers=None):
+    """
+    Record a write to 'trades' on top of the metadata read before it, in the same
+    transaction. Pass base=None after the table was replaced. The Magic_Numbers
+    the write touched (default: all of them) take the new version in magic_versions.
+    """
+    if base is None:
+        _ensure_sync_meta_table(cursor)
+        cursor.execute("SELECT version FROM sync_meta WHERE id = 0")
+        row = cursor.fetchone()
+        base = {
+            "rows": 0, "last_close_time": None, "fingerprint": "0",
+            "version": row[0] if row else 0, "duplicates": 0
+        }
+    meta = {
+        "rows": base["rows"] + rows,
+        "last_close_time": _sqlite_max(base["last_close_time"], max_close_time),
+        "fingerprint": f"{(int(base['fingerprint'], 16) + fingerprint) & FINGERPRINT_MASK:016x}",
+        "version": base["version"] + 1,
+        "duplicates": base["duplicates"] + duplicates
+    }
+    cursor.execute(
+        "INSERT OR REPLACE INTO sync_meta VALUES (0, ?, ?, ?, ?, ?)",
+        (meta["rows"], meta["last_close_time"], meta["fingerprint"], meta["version"], meta["duplicates"])
+    )
+    _write_magic_versions(cursor, magic_numbers, meta["version"])
+    return meta
+
+def _write_magic_versions(cursor, magic_numbers, version):
+    """
+    Set the data version of the given Magic_Numbers, or of every Magic_Number in
+    'trades' when None. Versions come from sync_meta's counter, so a magic number's
+    version changes only when one of its trades does and never repeats.
+    """
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS magic_versions (magic_number INTEGER PRIMARY KEY, version INTEGER NOT NULL)"
+    )
+    if magic_numbers is None:
+        cursor.execute("DELETE FROM magic_versions")
+        cursor.execute("PRAGMA table_info(trades)")
+        if "magic_number" in {row[1].lower() for row in cursor.fetchall()}:
+            cursor.execute(
+                "INSERT INTO magic_versions SELECT DISTINCT Magic_Number, ? FROM trades WHERE Magic_Number IS NOT NULL",
+                (version,)
+            )
+        return
+    cursor.executemany(
+        "INSERT OR REPLACE INTO magic_versions VALUES (?, ?)", [(int(magic), version) for magic in magic_numbers if magic is not None]
+    )
+
+def _read_magic_version(cursor, magic_number, client_version):
+    """Data version of one Magic_Number; the client's for databases written before magic_versions existed."""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'magic_versions'")
+    if cursor.fetchone():
+        cursor.execute("SELECT version FROM magic_versions WHERE magic_number = ?", (magic_number,))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+    return client_version
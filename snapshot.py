@@ -0,0 +1,242 @@
+"""
+Columnar snapshot of each client's 'trades' table: one raw .bin file per column
+and magic number under <client>/columns, memory-mapped on read instead of
+querying SQLite. Writes in close order are appended, anything else re-exports
+the magic numbers involved, and a snapshot behind sync_meta is refreshed on read.
+"""
+# Standard Library Imports
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+
+# Third-Party Imports
+import numpy as np
+import pandas as pd
+
+# Local Imports
+import config
+from database import db_pool, get_db_path
+from monitoring import metrics
+from schema import _read_sync_meta, load_trade_codes
+
+logger = logging.getLogger(__name__)
+
+# ==================================================== #
+# Columns of the on-disk trade snapshot, by storage kind. Times and durations are
+# int64 nanoseconds, amounts float64, and coded columns the int16 'trade_codes'
+# codes, with their values copied to the manifest's category lists.
+SNAPSHOT_TIME_COLUMNS = ("open_time", "close_time")
+SNAPSHOT_FLOAT_COLUMNS = (
+    "profit", "volume", "commission", "swap", "floating_drawdown", "floating_drawdown_currency"
+)
+SNAPSHOT_CODE_COLUMNS = ("order_type", "close_reason")
+SNAPSHOT_DTYPES = {
+    **{name: np.int64 for name in SNAPSHOT_TIME_COLUMNS + ("duration",)},
+    **{name: np.float64 for name in SNAPSHOT_FLOAT_COLUMNS},
+    **{name: np.int16 for name in SNAPSHOT_CODE_COLUMNS}
+}
+NAT_NS = np.iinfo(np.int64).min
+
+_snapshot_locks = {}
+_snapshot_locks_guard = threading.Lock()
+
+def _snapshot_lock(client_id):
+    with _snapshot_locks_guard:
+        return _snapshot_locks.setdefault(client_id, threading.Lock())
+
+def _snapshot_dir(client_id):
+    return os.path.join(config.UPLOAD_DIR, client_id, "columns")
+
+def _load_snapshot_manifest(client_id):
+    try:
+        with open(os.path.join(_snapshot_dir(client_id), "manifest.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_snapshot_manifest(client_id, manifest):
+    path = os.path.join(_snapshot_dir(client_id), "manifest.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+def _encode_snapshot_frame(df, manifest):
+    """Convert canonical 'trades' rows to the snapshot's column arrays; no parsing involved."""
+    columns = {}
+    for name in manifest["columns"]:
+        values = pd.to_numeric(df[name])
+        if name in SNAPSHOT_FLOAT_COLUMNS:
+            columns[name] = values.to_numpy(dtype=np.float64)
+            continue
+        values = values.astype("Int64")
+        if name in SNAPSHOT_CODE_COLUMNS:
+            columns[name] = values.to_numpy(dtype=np.int64, na_value=-1).astype(np.int16)
+        else:
+            columns[name] = np.where(values.isna().to_numpy(), NAT_NS, values.to_numpy(dtype=np.int64, na_value=0) * 10**9)
+    return columns
+
+def _write_snapshot_columns(client_id, magic_number, columns, offset):
+    """
+    Write column arrays for one magic number at row `offset`. Rewrites go through a
+    temporary file and os.replace so readers that mapped the old file keep it.
+    """
+    folder = os.path.join(_snapshot_dir(client_id), str(magic_number))
+    os.makedirs(folder, exist_ok=True)
+    for name, values in columns.items():
+        path = os.path.join(folder, f"{name}.bin")
+        data = np.ascontiguousarray(values, dtype=SNAPSHOT_DTYPES[name])
+        if offset == 0:
+            with open(path + ".tmp", "wb") as f:
+                f.write(data.tobytes())
+            os.replace(path + ".tmp", path)
+        else:
+            with open(path, "r+b") as f:
+                f.seek(offset * data.itemsize)
+                f.write(data.tobytes())
+                f.truncate()
+
+def _select_snapshot_rows(cursor, manifest, where, params):
+    """Fetch the snapshot columns of the 'trades' rows matching a WHERE clause as a DataFrame."""
+    names = ", ".join(f'"{manifest["names"][name]}"' for name in ["magic_number"] + manifest["columns"])
+    cursor.execute(f"SELECT {names} FROM trades WHERE {where}", params)
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=["magic_number"] + manifest["columns"])
+
+def _export_snapshot_magic(cursor, client_id, manifest, magic_number):
+    """Rewrite the snapshot of one magic number from the 'trades' table in close order."""
+    df = _select_snapshot_rows(cursor, manifest, "Magic_Number = ? ORDER BY Close_Time", (magic_number,))
+    columns = _encode_snapshot_frame(df, manifest)
+    _write_snapshot_columns(client_id, magic_number, columns, 0)
+    closes = columns.get("close_time", np.empty(0, dtype=np.int64))
+    manifest["magics"][str(magic_number)] = {"rows": len(df), "max_close": int(closes.max()) if closes.size else NAT_NS}
+
+def _export_snapshot(cursor, client_id):
+    """Write a fresh snapshot of every magic number."""
+    shutil.rmtree(_snapshot_dir(client_id), ignore_errors=True)
+    os.makedirs(_snapshot_dir(client_id))
+    cursor.execute("PRAGMA table_info(trades)")
+    names = {row[1].lower(): row[1] for row in cursor.fetchall()}
+    manifest = {
+        "fingerprint": None,
+        "names": names,
+        "columns": [name for name in SNAPSHOT_DTYPES if name in names],
+        "categories": load_trade_codes(cursor),
+        "magics": {}
+    }
+    cursor.execute("SELECT DISTINCT Magic_Number FROM trades")
+    for (magic_number,) in cursor.fetchall():
+        _export_snapshot_magic(cursor, client_id, manifest, magic_number)
+    return manifest
+
+def _append_snapshot(cursor, client_id, manifest, after_rowid):
+    """
+    Append the 'trades' rows past a rowid to the snapshot. A magic number whose new
+    rows are not in close order after its stored ones is re-exported instead.
+    """
+    df = _select_snapshot_rows(cursor, manifest, "rowid > ? ORDER BY rowid", (after_rowid,))
+    manifest["categories"] = load_trade_codes(cursor)
+    for magic_number, group in df.groupby("magic_number", sort=False):
+        entry = manifest["magics"].get(str(magic_number))
+        columns = _encode_snapshot_frame(group, manifest)
+        closes = columns.get("close_time")
+        in_order = entry is not None and (
+            closes is None or (closes[0] >= entry["max_close"] and bool(np.all(np.diff(closes) >= 0)))
+        )
+        if not in_order:
+            _export_snapshot_magic(cursor, client_id, manifest, magic_number)
+            continue
+        _write_snapshot_columns(client_id, magic_number, columns, entry["rows"])
+        entry["rows"] += len(group)
+        if closes is not None:
+            entry["max_close"] = int(closes[-1])
+
+# ==================================================== #
+def refresh_trade_snapshot(client_id, after_rowid=None, base_fingerprint=None):
+    """
+    Bring the client's columnar trade snapshot up to date with the 'trades' table.
+
+    The snapshot is current when its manifest carries the sync_meta fingerprint.
+    After a write, pass the first new rowid and the fingerprint from before the
+    write: if the snapshot matched it, only the new rows are appended; otherwise
+    the whole snapshot is re-exported.
+
+    Returns:
+        dict: The snapshot manifest.
+    """
+    db_path = get_db_path(client_id)
+    with _snapshot_lock(client_id), db_pool.connection(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        meta = _read_sync_meta(cursor)
+        manifest = _load_snapshot_manifest(client_id)
+        if manifest and manifest["fingerprint"] == meta["fingerprint"]:
+            return manifest
+
+        if after_rowid is not None and manifest and manifest["fingerprint"] == base_fingerprint:
+            manifest["fingerprint"] = None
+            _save_snapshot_manifest(client_id, manifest)
+            _append_snapshot(cursor, client_id, manifest, after_rowid)
+        else:
+            manifest = _export_snapshot(cursor, client_id)
+
+        manifest["fingerprint"] = meta["fingerprint"]
+        _save_snapshot_manifest(client_id, manifest)
+        return manifest
+
+def _sync_trade_snapshot(client_id, after_rowid=None, base_fingerprint=None):
+    """Refresh the snapshot after a committed write; on failure it is rebuilt on the next read."""
+    try:
+        with metrics.timer("stage_duration_seconds", stage="snapshot_refresh"):
+            refresh_trade_snapshot(client_id, after_rowid, base_fingerprint)
+    except Exception as e:
+        logger.warning(f"Could not update the trade snapshot of client {client_id}: {e}")
+
+# ==================================================== #
+@metrics.timed("snapshot_read")
+def read_filtered_trades(client_id, magic_number):
+    """
+    Read the trades of one Magic_Number from the client's columnar snapshot.
+
+    The column files are memory-mapped, so only the pages of the columns the
+    metrics use are touched and nothing is parsed: the frame comes back with
+    lower-cased columns, datetime open/close times, timedelta durations and
+    categorical order types and close reasons, ordered by close time.
+    """
+    db_path = get_db_path(client_id)
+
+    if not os.path.exists(db_path):
+        logger.error(f"Original database not found: {db_path}")
+        return {"status": "error", "message": "Original database not found"}
+
+    try:
+        manifest = refresh_trade_snapshot(client_id)
+        entry = manifest["magics"].get(str(magic_number))
+
+        # If no transactions are found, return a warning
+        if not entry or entry["rows"] == 0:
+            logger.warning(f"No transactions found for Magic_Number {magic_number}.")
+            return {"status": "warning", "message": "No transactions found for the specified Magic_Number"}
+
+        folder = os.path.join(_snapshot_dir(client_id), str(magic_number))
+        data = {}
+        for name in manifest["columns"]:
+            values = np.memmap(os.path.join(folder, f"{name}.bin"), dtype=SNAPSHOT_DTYPES[name], mode="r", shape=(entry["rows"],))
+            if name in SNAPSHOT_TIME_COLUMNS:
+                values = values.view("datetime64[ns]")
+            elif name == "duration":
+                values = values.view("timedelta64[ns]")
+            elif name in SNAPSHOT_CODE_COLUMNS:
+                values = pd.Categorical.from_codes(values, categories=pd.Index(manifest["categories"].get(name, []), dtype=object))
+            data[name] = values
+        df = pd.DataFrame(data, copy=False)
+
+        return {"status": "success", "message": "Trades loaded", "data": df, "fingerprint": manifest["fingerprint"]}
+
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+        return {"status": "error", "message": f"Database error: {e}"}
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        return {"status": "error", "message": f"Unexpected error: {e}"}
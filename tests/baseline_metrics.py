@@ -0,0 +1,637 @@
+"""
+Frozen copy of the calculate_* helpers as they were before the fused metrics
+kernel (main.py at d7d4dcc), kept verbatim as the golden reference for
+tests/test_metrics.py. Do not update this file when main.py changes.
+"""
+# Third-Party Imports
+import pandas as pd
+
+
+def calculate_most_volume(df):
+    """
+    Calculate the maximum volume from the "Volume" column and return it as a float with two decimal places.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame containing a "Volume" column.
+
+    Returns:
+        float: Maximum volume rounded to two decimal places.
+    """
+    most_volume = df["volume"].max()
+    return round(float(most_volume), 2)
+
+# ==================================================== #
+def get_smallest_open_time(df):
+    """Find the smallest date in the Open_Time column."""
+    return df["open_time"].min().strftime("%Y-%m-%d")
+
+# ==================================================== #
+def get_largest_close_time(df):
+    """Find the largest date in the Close_Time column."""
+    return df["close_time"].max().strftime("%Y-%m-%d")
+
+# ==================================================== #
+def calculate_total_profit(df):
+    """Calculate the total profit."""
+    total_profit = df["profit"].sum()
+    return round(total_profit, 2)
+
+# ==================================================== #
+def calculate_drawdown(df):
+    """
+    Calculate total drawdown and separate drawdowns for Buy and Sell trades.
+    Ensures percentages sum correctly.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame with "profit" and "order_type" columns.
+
+    Returns:
+        dict: Drawdown values formatted as "$(%)".
+    """
+    if df.empty or "profit" not in df.columns:
+        return {"drawdown": "0.00 (0)", "drawdown_buy": "0.00 (0)", "drawdown_sell": "0.00 (0)"}
+
+    df = df.sort_index()
+
+    def calculate_drawdown_for_subset(sub_df):
+        if sub_df.empty:
+            return 0.00, 0.00
+
+        sub_df = sub_df.copy()
+        sub_df["peak"] = sub_df["profit"].cummax()
+        drawdown_dollar = (sub_df["peak"] - sub_df["profit"]).max()
+        peak_value = sub_df["peak"].max()
+
+        drawdown_percent = (drawdown_dollar / peak_value * 100) if peak_value > 0 else 0
+        drawdown_percent = min(drawdown_percent, 100)  # Cap at 100%
+
+        return drawdown_dollar, drawdown_percent
+
+    # Calculate total drawdown
+    total_dd, total_dd_pct = calculate_drawdown_for_subset(df)
+
+    # Calculate buy/sell drawdowns
+    if "order_type" in df.columns:
+        df["order_type"] = df["order_type"].astype(str).str.lower()
+        buy_dd, _ = calculate_drawdown_for_subset(df[df["order_type"] == "buy"])
+        sell_dd, _ = calculate_drawdown_for_subset(df[df["order_type"] == "sell"])
+    else:
+        buy_dd, sell_dd = 0.00, 0.00
+
+    # Ensure total drawdown matches buy + sell
+    if abs(total_dd - (buy_dd + sell_dd)) > 1e-2:
+        total_dd = buy_dd + sell_dd  
+
+    # Fix percentage distribution
+    buy_pct = (buy_dd / total_dd * total_dd_pct) if total_dd > 0 else 0
+    sell_pct = (sell_dd / total_dd * total_dd_pct) if total_dd > 0 else 0
+
+    return {
+        "drawdown": f"{total_dd:.2f} ({total_dd_pct:.2f})",
+        "drawdown_buy": f"{buy_dd:.2f} ({buy_pct:.2f})",
+        "drawdown_sell": f"{sell_dd:.2f} ({sell_pct:.2f})"
+    }
+
+# ==================================================== #
+def calculate_max_min_drawdowns(df):
+    """
+    Calculate maximum and minimum drawdowns for total, buy, and sell trades.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame with "profit" and "order_type" columns.
+
+    Returns:
+        dict: Formatted maximum and minimum drawdown results.
+    """
+    if df.empty or "profit" not in df.columns or "order_type" not in df.columns:
+        return {}
+
+    # Calculate cumulative maximum profit (peak)
+    df["peak"] = df["profit"].cummax()
+
+    # Total Drawdowns
+    drawdowns_total = df["peak"] - df["profit"]
+    max_drawdown_total = drawdowns_total.max()
+    min_drawdown_total = drawdowns_total[drawdowns_total > 0].min() if any(drawdowns_total > 0) else 0
+
+    # Maximum and Minimum Drawdown for Buy Trades
+    buy_df = df[df["order_type"] == "buy"]
+    if not buy_df.empty:
+        drawdowns_buy = buy_df["peak"] - buy_df["profit"]
+        max_drawdown_buy = drawdowns_buy.max()
+        min_drawdown_buy = drawdowns_buy[drawdowns_buy > 0].min() if any(drawdowns_buy > 0) else 0
+    else:
+        max_drawdown_buy = min_drawdown_buy = 0
+
+    # Maximum and Minimum Drawdown for Sell Trades
+    sell_df = df[df["order_type"] == "sell"]
+    if not sell_df.empty:
+        drawdowns_sell = sell_df["peak"] - sell_df["profit"]
+        max_drawdown_sell = drawdowns_sell.max()
+        min_drawdown_sell = drawdowns_sell[drawdowns_sell > 0].min() if any(drawdowns_sell > 0) else 0
+    else:
+        max_drawdown_sell = min_drawdown_sell = 0
+
+    # Calculate percentages based on peak value
+    peak_value = df["peak"].max()
+    if peak_value > 0:
+        max_drawdown_total_pct = (max_drawdown_total / peak_value) * 100
+        min_drawdown_total_pct = (min_drawdown_total / peak_value) * 100 if min_drawdown_total > 0 else 0
+        max_drawdown_buy_pct = (max_drawdown_buy / peak_value) * 100
+        min_drawdown_buy_pct = (min_drawdown_buy / peak_value) * 100 if min_drawdown_buy > 0 else 0
+        max_drawdown_sell_pct = (max_drawdown_sell / peak_value) * 100
+        min_drawdown_sell_pct = (min_drawdown_sell / peak_value) * 100 if min_drawdown_sell > 0 else 0
+    else:
+        max_drawdown_total_pct = max_drawdown_buy_pct = max_drawdown_sell_pct = 0
+        min_drawdown_total_pct = min_drawdown_buy_pct = min_drawdown_sell_pct = 0
+
+    # Return formatted results
+    return {
+        "max_drawdown": f"{max_drawdown_total:.2f} ({max_drawdown_total_pct:.2f})",
+        "max_drawdown_buy": f"{max_drawdown_buy:.2f} ({max_drawdown_buy_pct:.2f})",
+        "max_drawdown_sell": f"{max_drawdown_sell:.2f} ({max_drawdown_sell_pct:.2f})",
+        "min_drawdown": f"{min_drawdown_total:.2f} ({min_drawdown_total_pct:.2f})",
+        "min_drawdown_buy": f"{min_drawdown_buy:.2f} ({min_drawdown_buy_pct:.2f})",
+        "min_drawdown_sell": f"{min_drawdown_sell:.2f} ({min_drawdown_sell_pct:.2f})"
+    }
+
+# ==================================================== #
+def calculate_floating_drawdown(df):
+    """
+    Calculate floating drawdown with separate entries for each metric.
+    Returns format: value (percentage) as individual dictionary items.
+    """
+    # Initialize results with separate keys
+    results = {
+        # Overall drawdown
+        "drawdown_floating_current": "0.00 (0.00)",
+        "drawdown_floating_max": "0.00 (0.00)",
+        "drawdown_floating_min": "0.00 (0.00)",
+        
+        # Buy drawdown
+        "drawdown_floating_buy_current": "0.00 (0.00)",
+        "drawdown_floating_buy_max": "0.00 (0.00)",
+        "drawdown_floating_buy_min": "0.00 (0.00)",
+        
+        # Sell drawdown
+        "drawdown_floating_sell_current": "0.00 (0.00)",
+        "drawdown_floating_sell_max": "0.00 (0.00)",
+        "drawdown_floating_sell_min": "0.00 (0.00)"
+    }
+
+    # Check for required columns
+    required_cols = ['floating_drawdown', 'floating_drawdown_currency', 'order_type']
+    if df.empty or not all(col in df.columns for col in required_cols):
+        return results
+
+    # Ensure sorted by index
+    df = df.sort_index()
+
+    # Format helper
+    def format_drawdown(dollar_val, pct_val):
+        return f"{abs(dollar_val):.2f} ({abs(pct_val):.2f})"
+
+    # Calculate overall metrics
+    results["drawdown_floating_current"] = format_drawdown(
+        df['floating_drawdown_currency'].iloc[-1],
+        df['floating_drawdown'].iloc[-1]
+    )
+    results["drawdown_floating_max"] = format_drawdown(
+        df['floating_drawdown_currency'].max(),
+        df['floating_drawdown'].max()
+    )
+    results["drawdown_floating_min"] = format_drawdown(
+        df['floating_drawdown_currency'].min(),
+        df['floating_drawdown'].min()
+    )
+
+    # Calculate for Buy trades
+    buy_df = df[df["order_type"].str.lower() == "buy"]
+    if not buy_df.empty:
+        results["drawdown_floating_buy_current"] = format_drawdown(
+            buy_df['floating_drawdown_currency'].iloc[-1],
+            buy_df['floating_drawdown'].iloc[-1]
+        )
+        results["drawdown_floating_buy_max"] = format_drawdown(
+            buy_df['floating_drawdown_currency'].max(),
+            buy_df['floating_drawdown'].max()
+        )
+        results["drawdown_floating_buy_min"] = format_drawdown(
+            buy_df['floating_drawdown_currency'].min(),
+            buy_df['floating_drawdown'].min()
+        )
+
+    # Calculate for Sell trades
+    sell_df = df[df["order_type"].str.lower() == "sell"]
+    if not sell_df.empty:
+        results["drawdown_floating_sell_current"] = format_drawdown(
+            sell_df['floating_drawdown_currency'].iloc[-1],
+            sell_df['floating_drawdown'].iloc[-1]
+        )
+        results["drawdown_floating_sell_max"] = format_drawdown(
+            sell_df['floating_drawdown_currency'].max(),
+            sell_df['floating_drawdown'].max()
+        )
+        results["drawdown_floating_sell_min"] = format_drawdown(
+            sell_df['floating_drawdown_currency'].min(),
+            sell_df['floating_drawdown'].min()
+        )
+
+    return results
+
+# ==================================================== #
+def calculate_profit_factor(df):
+    """Calculate the profit factor."""
+    winning_trades = df[df["profit"] > 0]
+    losing_trades = df[df["profit"] < 0]
+    total_winning_profit = winning_trades["profit"].sum()
+    total_losing_loss = abs(losing_trades["profit"].sum())
+    # Calculate profit factor and round to two decimal places
+    profit_factor = total_winning_profit / total_losing_loss if total_losing_loss != 0 else 0
+    return round(profit_factor, 2)
+# ==================================================== #
+def calculate_trades_won_percentage(df):
+    """Calculate the total trades and win rate."""
+    total_trades = len(df)
+    winning_trades_count = len(df[df["profit"] > 0])
+    win_rate = (winning_trades_count / total_trades) * 100 if total_trades != 0 else 0
+    return f"{total_trades} ({win_rate:.2f} %)"
+
+# ==================================================== #
+def calculate_expected_payoff(df):
+    """Calculate the expected payoff."""
+    total_profit = df["profit"].sum()
+    total_trades = len(df)
+    expected_payoff = total_profit / total_trades if total_trades != 0 else 0
+    return round(expected_payoff, 2)
+
+# ==================================================== #
+def calculate_net_profit(df):
+    """Calculate the net profit (sum of positive profits)."""
+    net_profit = df[df["profit"] > 0]["profit"].sum()
+    return round(net_profit, 2)
+
+# ==================================================== #
+def calculate_net_loss(df):
+    """Calculate the net loss (sum of negative profits)."""
+    net_loss = df[df["profit"] < 0]["profit"].sum()
+    return round(net_loss, 2)
+
+# ==================================================== #
+def calculate_balance_max_drawdown(df):
+    """Calculate the ratio of total profit to maximum drawdown."""
+    total_profit = df["profit"].sum()
+    max_drawdown = df["floating_drawdown"].max()
+    balance_max_drawdown = total_profit / max_drawdown if max_drawdown != 0 else 0
+    return round(balance_max_drawdown, 2)
+
+# ==================================================== #
+def calculate_quantity_metrics(df):
+    """Calculate buy and sell quantities and their percentages."""
+    total_trades = len(df)
+    buy_trades = df[df["order_type"].str.lower() == "buy"]
+    sell_trades = df[df["order_type"].str.lower() == "sell"]
+    buy_quantity = len(buy_trades)
+    sell_quantity = len(sell_trades)
+    buy_percentage = (buy_quantity / total_trades) * 100 if total_trades != 0 else 0
+    sell_percentage = (sell_quantity / total_trades) * 100 if total_trades != 0 else 0
+    return {
+        "Quantity": total_trades,
+        "Quantity_Buy": f"{buy_quantity} ({buy_percentage:.2f})",
+        "Quantity_Sell": f"{sell_quantity} ({sell_percentage:.2f})"
+    }
+
+# ==================================================== #
+def calculate_profitability_metrics(df):
+    """Calculate profitable trades and their percentages."""
+    total_trades = len(df)
+    profitable_trades = df[df["profit"] > 0]
+    buy_trades = df[df["order_type"].str.lower() == "buy"]
+    sell_trades = df[df["order_type"].str.lower() == "sell"]
+    profitable_buy_trades = buy_trades[buy_trades["profit"] > 0]
+    profitable_sell_trades = sell_trades[sell_trades["profit"] > 0]
+    
+    profitable_percentage = (len(profitable_trades) / total_trades) * 100 if total_trades != 0 else 0
+    profitable_buy_percentage = (len(profitable_buy_trades) / len(buy_trades)) * 100 if len(buy_trades) != 0 else 0
+    profitable_sell_percentage = (len(profitable_sell_trades) / len(sell_trades)) * 100 if len(sell_trades) != 0 else 0
+    
+    return {
+        "Profitable": f"{len(profitable_trades)} ({profitable_percentage:.2f})",
+        "Profitable_Buy": f"{len(profitable_buy_trades)} ({profitable_buy_percentage:.2f})",
+        "Profitable_Sell": f"{len(profitable_sell_trades)} ({profitable_sell_percentage:.2f})"
+    }
+
+# ==================================================== #
+def format_time_delta(total_seconds):
+    """Convert total seconds to days:hours:minutes format."""
+    days = int(total_seconds // 86400)  # 24 * 3600
+    hours = int((total_seconds % 86400) // 3600)
+    minutes = int((total_seconds % 3600) // 60)
+    return f"{days:02}:{hours:02}:{minutes:02}"
+
+# ==================================================== #
+def calculate_closure_metrics(df):
+    """
+    Calculate trade closure reasons (Order, SL, TP) based on the "close_reason" column.
+    Returns:
+        dict: A dictionary with three keys:
+              - "Closed_by_Order": Count and percentage of trades closed for reasons other than SL or TP.
+              - "Closed_by_SL": Count and percentage of trades closed by stop-loss.
+              - "Closed_by_TP": Count and percentage of trades closed by take-profit.
+    """
+    # Normalize column names by stripping whitespace and converting to lowercase
+    df.columns = df.columns.str.strip().str.lower()
+
+    # Ensure the "close_reason" column exists
+    if "close_reason" not in df.columns:
+        raise ValueError("The 'close_reason' column is missing in the DataFrame.")
+
+    # Total number of trades
+    total_trades = len(df)
+
+    # Count trades by closure reason
+    closed_by_sl = df[df["close_reason"] == "sl"]
+    closed_by_tp = df[df["close_reason"] == "tp"]
+    closed_by_order = df[~df["close_reason"].isin(["sl", "tp"])]  # All reasons except SL and TP
+
+    closed_by_order_count = len(closed_by_order)
+    closed_by_sl_count = len(closed_by_sl)
+    closed_by_tp_count = len(closed_by_tp)
+
+    # Calculate percentages
+    closed_by_order_percentage = (closed_by_order_count / total_trades) * 100 if total_trades != 0 else 0
+    closed_by_sl_percentage = (closed_by_sl_count / total_trades) * 100 if total_trades != 0 else 0
+    closed_by_tp_percentage = (closed_by_tp_count / total_trades) * 100 if total_trades != 0 else 0
+
+    # Return the results
+    return {
+        "Closed_by_Order": f"{closed_by_order_count} ({closed_by_order_percentage:.2f})",
+        "Closed_by_SL": f"{closed_by_sl_count} ({closed_by_sl_percentage:.2f})",
+        "Closed_by_TP": f"{closed_by_tp_count} ({closed_by_tp_percentage:.2f})"
+    }
+# ==================================================== #
+def calculate_profit_distribution(df):
+    """
+    Calculate profit distribution for buy and sell trades.
+    Returns:
+        A dictionary with the following keys:
+        - "profit_Buy": Total profit from buy trades and its percentage of total profit.
+        - "profit_Sell": Total profit from sell trades and its percentage of total profit.
+    """
+    # Filter buy and sell trades
+    buy_trades = df[df["order_type"].str.lower() == "buy"]
+    sell_trades = df[df["order_type"].str.lower() == "sell"]
+
+    # Calculate total profit from buy and sell trades
+    profit_buy = buy_trades["profit"].sum()
+    profit_sell = sell_trades["profit"].sum()
+
+    # Calculate total profit
+    total_profit = df["profit"].sum()
+
+    # Calculate percentages
+    profit_buy_percentage = (profit_buy / total_profit) * 100 if total_profit != 0 else 0
+    profit_sell_percentage = (profit_sell / total_profit) * 100 if total_profit != 0 else 0
+
+    # Ensure percentages are non-negative when profit is zero
+    if profit_buy == 0:
+        profit_buy_percentage = 0.0
+    if profit_sell == 0:
+        profit_sell_percentage = 0.0
+
+    # Format the results
+    return {
+        "profit_Buy": f"{profit_buy:.2f} ({profit_buy_percentage:.2f})",
+        "profit_Sell": f"{profit_sell:.2f} ({profit_sell_percentage:.2f})"
+    }
+
+# ==================================================== #
+def calculate_time_extremes(df):
+    """Calculate max and min open time."""
+    df["duration"] = pd.to_timedelta(df["duration"])
+    max_open_time = df["duration"].max().total_seconds()
+    min_open_time = df["duration"].min().total_seconds()
+    return {
+        "Max_Open_Time": format_time_delta(max_open_time),
+        "Min_Open_Time": format_time_delta(min_open_time)
+    }
+
+# ==================================================== #
+def calculate_win_loss_metrics(df):
+    """Calculate biggest win, average win, biggest loss, and average loss, rounded to two decimal places."""
+    winning_trades = df[df["profit"] > 0]
+    losing_trades = df[df["profit"] < 0]
+    
+    biggest_win = round(winning_trades["profit"].max(), 2) if not winning_trades.empty else 0
+    average_win = round(winning_trades["profit"].mean(), 2) if not winning_trades.empty else 0
+    biggest_loss = round(losing_trades["profit"].min(), 2) if not losing_trades.empty else 0
+    average_loss = round(losing_trades["profit"].mean(), 2) if not losing_trades.empty else 0
+    
+    return {
+        "Biggest_Win": biggest_win,
+        "Average_Win": average_win,
+        "Biggest_Loss": biggest_loss,
+        "Average_Loss": average_loss
+    }
+
+# ==================================================== #
+def calculate_time_metrics(df):
+    """
+    Calculate time-based metrics.
+    
+    Parameters:
+        df (pd.DataFrame): DataFrame containing "duration" and "order_type" columns.
+        
+    Returns:
+        dict: A dictionary containing time-based metrics.
+    """
+    # Ensure the "duration" column is in timedelta format
+    if not pd.api.types.is_timedelta64_dtype(df["duration"]):
+        df["duration"] = pd.to_timedelta(df["duration"], unit="s")
+
+    # Calculate total open time in seconds
+    total_open_time = df["duration"].sum().total_seconds()
+
+    # Filter buy and sell trades
+    buy_trades = df[df["order_type"].str.lower() == "buy"]
+    sell_trades = df[df["order_type"].str.lower() == "sell"]
+
+    # Calculate total open time for buy and sell trades
+    buy_open_time = buy_trades["duration"].sum().total_seconds()
+    sell_open_time = sell_trades["duration"].sum().total_seconds()
+
+    # Calculate average open times
+    avg_open_time = total_open_time / len(df) if len(df) != 0 else 0
+    avg_buy = buy_open_time / len(buy_trades) if len(buy_trades) != 0 else 0
+    avg_sell = sell_open_time / len(sell_trades) if len(sell_trades) != 0 else 0
+
+    # Calculate percentages for buy and sell open times
+    buy_percentage = (buy_open_time / total_open_time) * 100 if total_open_time != 0 else 0
+    sell_percentage = (sell_open_time / total_open_time) * 100 if total_open_time != 0 else 0
+
+    # Calculate max and min open times
+    max_open_time = df["duration"].max().total_seconds()
+    min_open_time = df["duration"].min().total_seconds()
+
+    # Return the results
+    return {
+        "Open_Time": format_time_delta(total_open_time),
+        "Open_Time_Buy": f"{format_time_delta(buy_open_time)} ({buy_percentage:.2f})",
+        "Open_Time_Sell": f"{format_time_delta(sell_open_time)} ({sell_percentage:.2f})",
+        "Avg_Open_Time": format_time_delta(avg_open_time),
+        "Avg_Buy": format_time_delta(avg_buy),
+        "Avg_Sell": format_time_delta(avg_sell),
+        "Max_Open_Time": format_time_delta(max_open_time),
+        "Min_Open_Time": format_time_delta(min_open_time)
+    }
+
+# ==================================================== #
+def calculate_additional_metrics(df):
+    """
+    Calculate additional trading metrics based on the DataFrame.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame containing trading data with columns like "profit", "order_type",
+                           "duration", "lots", "commission", "swap", etc.
+
+    Returns:
+        dict: A dictionary containing the following metrics:
+              - "max_flat_period": Maximum flat period in days:hours:minutes format.
+              - "max_drawdown_time": Maximum drawdown time in days:hours:minutes format.
+              - "max_drawdown_trades": Number of trades during the maximum drawdown period.
+              - "most_winning_trades": Most winning trades in "count (total_profit)" format.
+              - "most_losing_trades": Most losing trades in "count (total_loss)" format.
+              - "winning_streak": Winning streak in "total_profit (count)" format.
+              - "losing_streak": Losing streak in "total_loss (count)" format.
+              - "sum_lots": Total sum of lots traded.
+              - "sum_commission": Total commission in "total_commission (percentage)" format.
+              - "sum_swap": Total swap in "total_swap (percentage)" format.
+    """
+    # Ensure the DataFrame is sorted by index (or time) if not already
+    df = df.sort_index()
+
+    # Initialize results dictionary
+    results = {}
+
+    # 1. Max Flat Period
+    max_flat_period = df["duration"].max().total_seconds()
+    results["max_flat_period"] = format_time_delta(max_flat_period)
+
+    # 2. Max Drawdown Time
+    df["peak"] = df["profit"].cummax()
+    drawdown = df["peak"] - df["profit"]
+    max_drawdown_time = df.loc[drawdown.idxmax(), "duration"].total_seconds()
+    results["max_drawdown_time"] = format_time_delta(max_drawdown_time)
+
+    # 3. Max Drawdown Trades
+    max_drawdown_trades = len(df[df["profit"] < df["peak"]])
+    results["max_drawdown_trades"] = max_drawdown_trades
+
+    # 4. Most Winning Trades
+    winning_trades = df[df["profit"] > 0]
+    most_winning_trades_count = len(winning_trades)
+    most_winning_trades_profit = winning_trades["profit"].sum()
+    results["most_winning_trades"] = f"{most_winning_trades_count} ({most_winning_trades_profit:.2f} USD)"
+
+    # 5. Most Losing Trades
+    losing_trades = df[df["profit"] < 0]
+    most_losing_trades_count = len(losing_trades)
+    most_losing_trades_loss = losing_trades["profit"].sum()
+    results["most_losing_trades"] = f"{most_losing_trades_count} ({most_losing_trades_loss:.2f} USD)"
+
+    # 6. Winning Streak
+    winning_streak = df[df["profit"] > 0]["profit"].sum()
+    winning_streak_count = len(df[df["profit"] > 0])
+    results["winning_streak"] = f"{winning_streak:.2f} USD ({winning_streak_count})"
+
+    # 7. Losing Streak
+    losing_streak, losing_streak_count = calculate_losing_streak(df)
+    results["losing_streak"] = f"{losing_streak:.2f} USD ({losing_streak_count})"
+
+    # 8. Sum Lots
+    sum_lots = round(df["volume"].sum(), 2)  # Round to 2 decimal places
+    results["sum_lots"] = sum_lots
+
+    # 9. Sum Commission
+    sum_commission = df["commission"].sum()
+    commission_percentage = (sum_commission / df["profit"].sum()) * 100 if df["profit"].sum() != 0 else 0
+    results["sum_commission"] = f"{sum_commission:.2f} USD ({commission_percentage:.2f})"
+
+    # 10. Sum Swap
+    sum_swap = df["swap"].sum()
+    swap_percentage = (sum_swap / df["profit"].sum()) * 100 if df["profit"].sum() != 0 else 0
+    results["sum_swap"] = f"{sum_swap:.2f} USD ({swap_percentage:.2f})"
+
+    return results
+
+# ==================================================== #
+def format_time_delta(total_seconds):
+    """Convert total seconds to days:hours:minutes format."""
+    days = int(total_seconds // (24 * 3600))
+    total_seconds %= 24 * 3600
+    hours = int(total_seconds // 3600)
+    total_seconds %= 3600
+    minutes = int(total_seconds // 60)
+    return f"{days}:{hours:02}:{minutes:02}"
+
+# ==================================================== #
+def calculate_losing_streak(df):
+    """
+    Calculate the losing streak (longest sequence of consecutive losing trades).
+
+    Parameters:
+        df (pd.DataFrame): DataFrame containing trading data with a "profit" column.
+
+    Returns:
+        float: Total loss during the losing streak.
+        int: Number of trades in the losing streak.
+    """
+    losing_streak_loss = 0
+    losing_streak_count = 0
+    current_streak_loss = 0
+    current_streak_count = 0
+
+    for profit in df["profit"]:
+        if profit < 0:
+            current_streak_loss += profit
+            current_streak_count += 1
+        else:
+            if current_streak_loss < losing_streak_loss:
+                losing_streak_loss = current_streak_loss
+                losing_streak_count = current_streak_count
+            current_streak_loss = 0
+            current_streak_count = 0
+
+    # Check the last streak
+    if current_streak_loss < losing_streak_loss:
+        losing_streak_loss = current_streak_loss
+        losing_streak_count = current_streak_count
+
+    return losing_streak_loss, losing_streak_count
+
+# ==================================================== #
+def baseline_outputs(df):
+    """The legacy payload in calculate_outputs order, built from the frozen helpers above."""
+    return {
+        "Most_Volume": calculate_most_volume(df),
+        "smallest_open_time": get_smallest_open_time(df),
+        "largest_close_time": get_largest_close_time(df),
+        "total_profit": calculate_total_profit(df),
+        "profit_factor": calculate_profit_factor(df),
+        "trades_won_percentage": calculate_trades_won_percentage(df),
+        "expected_payoff": calculate_expected_payoff(df),
+        "netProfit": calculate_net_profit(df),
+        "NetLoss": calculate_net_loss(df),
+        "Balance_mDD": calculate_balance_max_drawdown(df),
+        **calculate_drawdown(df),
+        **calculate_max_min_drawdowns(df),
+        **calculate_floating_drawdown(df),
+        **calculate_quantity_metrics(df),
+        **calculate_profitability_metrics(df),
+        **calculate_profit_distribution(df),
+        **calculate_time_metrics(df),
+        **calculate_time_extremes(df),
+        **calculate_win_loss_metrics(df),
+        **calculate_closure_metrics(df),
+        **calculate_additional_metrics(df)
+    }
@@ -0,0 +1,45 @@
+import io
+import os
+import sys
+
+# main.py and benchmark.py live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Third-Party Imports
+import pytest
+
+# Local Imports
+import config
+import main
+from benchmark import create_main_database
+from uploads import ChunkedUploadStore
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """
+    Flask test client of main.py against a temporary UPLOAD_DIR and main database,
+    the way benchmark.py runs it; nothing under the configured folders is touched.
+    """
+    monkeypatch.setattr(config, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(config, "database_file_path", str(tmp_path / "main.db"))
+    os.makedirs(config.UPLOAD_DIR)
+    create_main_database(config.database_file_path)
+    monkeypatch.setattr(main, "result_cache", main.ResultCache(main.RESULT_CACHE_MAX_ENTRIES, main.RESULT_CACHE_TTL))
+    monkeypatch.setattr(main, "chunked_uploads", ChunkedUploadStore(str(tmp_path / "_chunked"), read_size=1024))
+    yield main.app.test_client()
+    main.db_pool.close_all()
+
+@pytest.fixture
+def upload(server):
+    """POST a trades frame (or CSV bytes) to check_and_upload the way the EA does; returns the response."""
+    def post(client_id, trades, rows_count=None, filename="trades.csv", **form):
+        body = trades if isinstance(trades, bytes) else trades.to_csv(index=False).encode()
+        fields = {key: str(value) for key, value in form.items()}
+        fields.update({
+            "clientID": client_id,
+            "rows_count": str(len(trades) if rows_count is None else rows_count),
+            "file": (io.BytesIO(body), filename)
+        })
+        return server.post(f"/{config.call_back_token}/check_and_upload", data=fields, content_type="multipart/form-data")
+    return post
@@ -0,0 +1,90 @@
+"""
+Aggregate states folded one transaction at a time against a rebuild from the
+'trades' table, and CSV uploads without the optional Close_Reason column.
+"""
+# Standard Library Imports
+import json
+import math
+import sqlite3
+
+# Third-Party Imports
+import pandas as pd
+
+# Local Imports
+import aggregates
+import config
+import main
+from benchmark import generate_trades, transaction_payloads
+
+
+def stored_state(client_id, magic_number=1):
+    with sqlite3.connect(main.get_db_path(client_id)) as conn:
+        row = conn.execute("SELECT state FROM magic_aggregates WHERE magic_number = ?", (magic_number,)).fetchone()
+        return json.loads(row[0])
+
+def rebuilt_state(client_id, magic_number=1):
+    with sqlite3.connect(main.get_db_path(client_id)) as conn:
+        aggregates.rebuild_aggregates(conn, [magic_number])
+    return stored_state(client_id, magic_number)
+
+def assert_close(folded, rebuilt, path="state"):
+    # Running sums pick up rounding the one-pass build does not, hence the tolerance
+    if isinstance(rebuilt, dict):
+        assert folded.keys() == rebuilt.keys(), path
+        for key in rebuilt:
+            assert_close(folded[key], rebuilt[key], f"{path}.{key}")
+    elif isinstance(rebuilt, float):
+        assert math.isclose(folded, rebuilt, rel_tol=1e-9, abs_tol=1e-9), path
+    else:
+        assert folded == rebuilt, path
+
+def count_rebuilds(monkeypatch):
+    calls = []
+    rebuild = aggregates.rebuild_aggregates
+    def spy(conn, magic_numbers=None):
+        calls.append(magic_numbers)
+        return rebuild(conn, magic_numbers)
+    monkeypatch.setattr(aggregates, "rebuild_aggregates", spy)
+    return calls
+
+
+# ==================================================== #
+def test_folded_transactions_match_a_rebuild(server, upload, monkeypatch):
+    assert upload("c1", generate_trades(200, seed=1)).status_code == 201
+    rebuilds = count_rebuilds(monkeypatch)
+
+    for payload in transaction_payloads(generate_trades(25, seed=2, start="2031-01-01"), "c1"):
+        assert server.post("/upload_transaction", json=payload).status_code == 200
+
+    assert rebuilds == []
+    folded = stored_state("c1")
+    assert folded["n"] == 225
+    assert_close(folded, rebuilt_state("c1"))
+
+def test_out_of_order_transaction_rebuilds_the_magic_number(server, upload, monkeypatch):
+    assert upload("c1", generate_trades(200, seed=3)).status_code == 201
+    rebuilds = count_rebuilds(monkeypatch)
+    late = generate_trades(1, seed=4, start="2023-02-01")
+    assert pd.Timestamp(late["Close_Time"][0].replace(".", "-")) < pd.Timestamp(stored_state("c1")["max_close"])
+
+    assert server.post("/upload_transaction", json=transaction_payloads(late, "c1")[0]).status_code == 200
+
+    assert rebuilds == [[1]]
+    state = stored_state("c1")
+    assert state["n"] == 201
+    assert state == rebuilt_state("c1")
+
+def test_upload_without_close_reason_counts_every_trade_as_closed_by_order(server, upload):
+    trades = generate_trades(40, seed=5).drop(columns=["Close_Reason"])
+    assert upload("c1", trades).status_code == 201
+
+    for query in ({}, {"from": "2023-01-01"}):
+        response = server.get(
+            f"/{config.call_back_token_sync}/get_filtered_outputs",
+            query_string={"client_id": "c1", "magic_number": 1, **query}
+        )
+        assert response.status_code == 200
+        outputs = response.get_json()
+        assert (outputs["Closed_by_Order"], outputs["Closed_by_SL"], outputs["Closed_by_TP"]) == (
+            "40 (100.00)", "0 (0.00)", "0 (0.00)"
+        )
@@ -0,0 +1,150 @@
+"""
+Resumable check_and_upload: chunks may arrive in any order and be resent, bad
+chunks are refused and stay missing, idle uploads expire, and clientID must be
+a single path segment (main.py and app.py).
+"""
+# Standard Library Imports
+import hashlib
+import io
+import os
+import time
+
+# Third-Party Imports
+import pytest
+
+# Local Imports
+import app as upload_app
+import config
+import main
+import schema
+from benchmark import generate_trades
+from uploads import ChunkedUploadStore, UnknownUploadError
+
+CHUNK_SIZE = 4096
+
+
+def base_url(upload_id=""):
+    return f"/{config.call_back_token}/check_and_upload/chunked" + (f"/{upload_id}" if upload_id else "")
+
+def open_upload(server, body, client_id="c1", rows_count=1):
+    return server.post(base_url(), data={
+        "clientID": client_id, "rows_count": str(rows_count), "filename": "trades.csv",
+        "size": str(len(body)), "chunk_size": str(CHUNK_SIZE)
+    })
+
+def put_chunk(server, upload_id, body, index, offset=None, checksum=None):
+    chunk = body[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]
+    return server.put(
+        f"{base_url(upload_id)}/{index}",
+        query_string={
+            "offset": index * CHUNK_SIZE if offset is None else offset,
+            "checksum": checksum or hashlib.sha256(chunk).hexdigest()
+        },
+        data=chunk
+    )
+
+@pytest.fixture
+def csv_body():
+    body = generate_trades(120, seed=1).to_csv(index=False).encode()
+    assert len(body) > 3 * CHUNK_SIZE
+    return body
+
+
+# ==================================================== #
+def test_chunks_in_any_order_are_assembled_and_ingested(server, csv_body):
+    opened = open_upload(server, csv_body, rows_count=120)
+    assert opened.status_code == 201
+    upload = opened.get_json()
+
+    for index in reversed(range(upload["chunks"])):
+        assert put_chunk(server, upload["upload_id"], csv_body, index).status_code == 200
+    assert put_chunk(server, upload["upload_id"], csv_body, 0).status_code == 200
+
+    finalized = server.post(f"{base_url(upload['upload_id'])}/finalize")
+    assert finalized.status_code == 201
+    assert finalized.get_json()["rows_saved"] == 120
+    assert main.read_sync_meta("c1")["fingerprint"] == schema.csv_fingerprint(csv_body.decode().splitlines())
+
+def test_status_lists_the_missing_chunks_to_resume_from(server, csv_body):
+    upload = open_upload(server, csv_body, rows_count=120).get_json()
+    for index in (0, 2):
+        put_chunk(server, upload["upload_id"], csv_body, index)
+
+    status = server.get(base_url(upload["upload_id"])).get_json()
+    assert status["received"] == [0, 2]
+    assert status["missing"] == [1] + list(range(3, upload["chunks"]))
+    assert status["bytes_received"] == 2 * CHUNK_SIZE
+    assert status["complete"] is False
+    assert server.post(f"{base_url(upload['upload_id'])}/finalize").status_code == 409
+
+    for index in status["missing"]:
+        put_chunk(server, upload["upload_id"], csv_body, index)
+    assert server.get(base_url(upload["upload_id"])).get_json()["complete"] is True
+    assert server.post(f"{base_url(upload['upload_id'])}/finalize").status_code == 201
+
+def test_bad_chunks_are_refused_and_stay_missing(server, csv_body):
+    upload_id = open_upload(server, csv_body).get_json()["upload_id"]
+
+    assert put_chunk(server, upload_id, csv_body, 1, checksum="0" * 64).status_code == 400
+    assert put_chunk(server, upload_id, csv_body, 1, offset=CHUNK_SIZE + 1).status_code == 400
+    assert put_chunk(server, upload_id, csv_body, 99).status_code == 400
+    assert server.put(
+        f"{base_url(upload_id)}/1", query_string={"offset": CHUNK_SIZE, "checksum": "0" * 64}, data=b"short"
+    ).status_code == 400
+
+    assert 1 in server.get(base_url(upload_id)).get_json()["missing"]
+    assert server.get(base_url("f" * 32)).status_code == 404
+
+def test_idle_uploads_expire(tmp_path):
+    store = ChunkedUploadStore(str(tmp_path), ttl=60)
+    idle = store.create(10, 4)["upload_id"]
+    active = store.create(10, 4)["upload_id"]
+    old = time.time() - 120
+    os.utime(os.path.join(str(tmp_path), idle, "chunks"), (old, old))
+
+    store.create(10, 4)
+
+    assert store.status(active)["missing"] == [0, 1, 2]
+    with pytest.raises(UnknownUploadError):
+        store.status(idle)
+
+@pytest.mark.parametrize("client_id", ["../../x", "..", "a/b", "a\\b"])
+def test_client_id_must_be_one_path_segment(server, upload, csv_body, client_id):
+    assert open_upload(server, csv_body, client_id=client_id).status_code == 400
+    assert upload(client_id, generate_trades(5, seed=2)).status_code == 400
+    assert not os.path.exists(os.path.join(config.UPLOAD_DIR, "x"))
+
+
+@pytest.fixture
+def upload_server(tmp_path, monkeypatch):
+    """Flask test client of app.py against a temporary upload folder."""
+    monkeypatch.setitem(upload_app.app.config, "UPLOAD_FOLDER", str(tmp_path / "uploads"))
+    monkeypatch.setattr(upload_app, "chunked_uploads", ChunkedUploadStore(str(tmp_path / "uploads" / "_chunked")))
+    return upload_app.app.test_client()
+
+def test_upload_app_rejects_client_ids_outside_its_folder(upload_server, tmp_path):
+    form = {"clientID": "../../x", "filename": "trades.csv", "size": "10", "chunk_size": "4"}
+    assert upload_server.post("/upload_csv/chunked", data=form).status_code == 400
+
+    response = upload_server.post(
+        "/upload_csv", data={"clientID": "../x", "file": (io.BytesIO(b"a,b\n"), "trades.csv")},
+        content_type="multipart/form-data"
+    )
+    assert response.status_code == 400
+    assert not os.path.exists(tmp_path / "x")
+
+def test_upload_app_assembles_chunks_in_the_client_folder(upload_server, tmp_path):
+    body = b"0123456789"
+    upload_id = upload_server.post(
+        "/upload_csv/chunked", data={"clientID": "1001", "filename": "trades.csv", "size": "10", "chunk_size": "4"}
+    ).get_json()["upload_id"]
+    for index in (2, 0, 1):
+        chunk = body[index * 4:(index + 1) * 4]
+        response = upload_server.put(
+            f"/upload_csv/chunked/{upload_id}/{index}",
+            query_string={"offset": index * 4, "checksum": hashlib.sha256(chunk).hexdigest()}, data=chunk
+        )
+        assert response.status_code == 200
+
+    assert upload_server.post(f"/upload_csv/chunked/{upload_id}/finalize").status_code == 200
+    assert (tmp_path / "uploads" / "1001" / "trades.csv").read_bytes() == body
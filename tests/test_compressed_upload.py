@@ -0,0 +1,77 @@
+"""
+Compressed uploads to check_and_upload: a .csv.gz file part or a gzip
+Content-Encoding body is inflated while it streams, up to
+UPLOAD_MAX_DECOMPRESSED_BYTES (413 past it); other encodings are refused with 415.
+"""
+# Standard Library Imports
+import gzip
+import io
+
+# Third-Party Imports
+import pytest
+
+# Local Imports
+import config
+import main
+import schema
+from benchmark import generate_trades
+
+
+def multipart_body(client_id, rows_count, body, filename):
+    """Encode a check_and_upload form the way the test client does, to compress it as a whole."""
+    request = main.app.test_request_context(
+        method="POST", content_type="multipart/form-data",
+        data={"clientID": client_id, "rows_count": str(rows_count), "file": (io.BytesIO(body), filename)}
+    ).request
+    return request.get_data(), request.content_type
+
+def bomb():
+    """A CSV of 50 trades whose data lines repeat until it inflates to about 7 MB."""
+    header, *lines = generate_trades(50, seed=9).to_csv(index=False).splitlines(keepends=True)
+    return gzip.compress((header + "".join(lines) * 500).encode())
+
+def post_encoded(server, body, content_type, encoding):
+    return server.post(
+        f"/{config.call_back_token}/check_and_upload", data=body,
+        headers={"Content-Type": content_type, "Content-Encoding": encoding}
+    )
+
+
+# ==================================================== #
+def test_gzip_file_part_is_ingested(server, upload):
+    trades = generate_trades(200, seed=1)
+    csv = trades.to_csv(index=False).encode()
+
+    response = upload("c1", gzip.compress(csv), rows_count=200, filename="trades.csv.gz")
+
+    assert response.status_code == 201
+    assert response.get_json()["memory"]["decompression"]["bytes_out"] == len(csv)
+    assert main.read_sync_meta("c1")["fingerprint"] == schema.csv_fingerprint(csv.decode().splitlines())
+
+def test_zstd_file_part_is_ingested(server, upload):
+    zstandard = pytest.importorskip("zstandard")
+    csv = generate_trades(200, seed=2).to_csv(index=False).encode()
+    assert upload("c1", zstandard.ZstdCompressor().compress(csv), rows_count=200, filename="trades.csv.zst").status_code == 201
+    assert main.read_sync_meta("c1")["rows"] == 200
+
+def test_gzip_encoded_body_is_ingested(server):
+    body, content_type = multipart_body("c1", 200, generate_trades(200, seed=3).to_csv(index=False).encode(), "trades.csv")
+    assert post_encoded(server, gzip.compress(body), content_type, "gzip").status_code == 201
+    assert main.read_sync_meta("c1")["rows"] == 200
+
+def test_file_part_inflating_past_the_limit_is_413(server, upload, monkeypatch):
+    monkeypatch.setattr(main, "UPLOAD_MAX_DECOMPRESSED_BYTES", 1024 * 1024)
+    response = upload("c1", bomb(), rows_count=25_000, filename="trades.csv.gz")
+    assert response.status_code == 413
+    assert (main.read_sync_meta("c1") or {"rows": 0})["rows"] == 0
+
+def test_encoded_body_inflating_past_the_limit_is_413(server, monkeypatch):
+    monkeypatch.setattr(main, "UPLOAD_MAX_DECOMPRESSED_BYTES", 1024 * 1024)
+    body, content_type = multipart_body("c1", 25_000, gzip.decompress(bomb()), "trades.csv")
+    assert post_encoded(server, gzip.compress(body), content_type, "gzip").status_code == 413
+    assert (main.read_sync_meta("c1") or {"rows": 0})["rows"] == 0
+
+def test_unknown_content_encoding_is_415(server):
+    body, content_type = multipart_body("c1", 10, generate_trades(10, seed=4).to_csv(index=False).encode(), "trades.csv")
+    assert post_encoded(server, body, content_type, "compress").status_code == 415
+    assert not main.database_exists("c1")
@@ -0,0 +1,68 @@
+"""
+from/to on get_filtered_outputs: inclusive close time bounds, and a date
+without a time of day covers that whole day whatever its format.
+"""
+# Third-Party Imports
+import pandas as pd
+import pytest
+
+# Local Imports
+import config
+import main
+from benchmark import generate_trades
+
+# Trades closed at these times, one each
+CLOSE_TIMES = [
+    "2024.05.01 00:00:00", "2024.05.01 12:00:00", "2024.05.31 10:00:00",
+    "2024.05.31 23:59:59", "2024.06.01 00:00:00"
+]
+
+
+def quantity(server, **query):
+    response = server.get(
+        f"/{config.call_back_token_sync}/get_filtered_outputs",
+        query_string={"client_id": "c1", "magic_number": 1, **query}
+    )
+    return response.get_json()["Quantity"] if response.status_code == 200 else response.status_code
+
+@pytest.fixture
+def history(server, upload):
+    trades = generate_trades(len(CLOSE_TIMES), seed=1)
+    trades["Open_Time"] = "2024.04.30 00:00:00"
+    trades["Close_Time"] = CLOSE_TIMES
+    assert upload("c1", trades).status_code == 201
+    return server
+
+
+# ==================================================== #
+@pytest.mark.parametrize("date_to", ["2024-05-31", "2024.05.31", "2024-5-31", "May 31, 2024", "20240531"])
+def test_date_only_to_covers_the_whole_day(date_to):
+    assert main.parse_close_time_range(None, date_to)[1] == pd.Timestamp("2024-05-31 23:59:59")
+
+@pytest.mark.parametrize("date_to, end", [
+    ("2024-05-31 10:00", "2024-05-31 10:00:00"),
+    ("2024-5-1 3:00", "2024-05-01 03:00:00"),
+    ("2024-05-31T00:00:00", "2024-05-31 00:00:00"),
+    ("2024.05.31 00:00", "2024-05-31 00:00:00")
+])
+def test_to_with_a_time_is_exact(date_to, end):
+    assert main.parse_close_time_range(None, date_to)[1] == pd.Timestamp(end)
+
+def test_from_is_not_widened():
+    assert main.parse_close_time_range("2024-05-31", None) == (pd.Timestamp("2024-05-31"), None)
+
+def test_inverted_or_unparseable_range_is_rejected(history):
+    with pytest.raises(ValueError):
+        main.parse_close_time_range("2024-06-01", "2024-05-31")
+    assert quantity(history, **{"from": "2024-06-01", "to": "2024-05-31"}) == 400
+    assert quantity(history, **{"from": "not a date"}) == 400
+
+def test_bounds_are_inclusive(history):
+    assert quantity(history, **{"from": "2024-05-01 00:00:00", "to": "2024-05-31 10:00:00"}) == 3
+    assert quantity(history, **{"from": "2024-05-01 00:00:01", "to": "2024-05-31 09:59:59"}) == 1
+    assert quantity(history, **{"from": "2024-05-31 23:59:59"}) == 2
+
+def test_date_only_bounds_select_whole_days(history):
+    assert quantity(history, **{"from": "2024-05-01", "to": "2024-05-31"}) == 4
+    assert quantity(history, **{"from": "2024-05-31", "to": "2024.05.31"}) == 2
+    assert quantity(history, to="2024-5-1") == 2
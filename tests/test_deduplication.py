@@ -0,0 +1,65 @@
+"""
+Duplicate trades: resent transactions are ignored, and schema upgrades move
+duplicates stored before the natural-key index aside instead of deleting them.
+"""
+# Standard Library Imports
+import sqlite3
+
+# Third-Party Imports
+import pandas as pd
+
+# Local Imports
+import config
+import main
+import migrations
+import schema
+from benchmark import generate_trades, transaction_payloads
+
+
+def count(path, table):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+# ==================================================== #
+def test_resent_transaction_is_reported_and_not_stored_twice(server, upload):
+    assert upload("c1", generate_trades(20, seed=1)).status_code == 201
+    payload = transaction_payloads(generate_trades(1, seed=2, start="2031-01-01"), "c1")[0]
+
+    first = server.post("/upload_transaction", json=payload)
+    again = server.post("/upload_transaction", json=payload)
+
+    assert first.status_code == 200 and "duplicate" not in first.get_json()
+    assert again.get_json()["duplicate"] is True
+    assert count(config.database_file_path, "Trade_Transaction") == 1
+    assert main.count_database_rows("c1") == 21
+
+def test_main_database_upgrade_moves_duplicates_aside(server):
+    row = tuple(transaction_payloads(generate_trades(1, seed=3), "c1")[0].values())[:19]
+    with sqlite3.connect(config.database_file_path) as conn:
+        conn.executemany("INSERT INTO Trade_Transaction VALUES (" + ", ".join("?" * 19) + ")", [row, row, row])
+
+    with sqlite3.connect(config.database_file_path) as conn:
+        assert migrations.upgrade_transaction_schema(conn) == 2
+        assert migrations.upgrade_transaction_schema(conn) == 0
+
+    assert count(config.database_file_path, "Trade_Transaction") == 1
+    assert count(config.database_file_path, "Trade_Transaction_duplicates") == 2
+
+def test_trades_upgrade_moves_duplicates_aside_and_counts_them(server, upload):
+    trades = generate_trades(30, seed=4)
+    assert upload("c1", trades).status_code == 201
+    main.db_pool.close_all()
+    db_path = main.get_db_path("c1")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DROP INDEX idx_trades_natural_key")
+        conn.execute("INSERT INTO trades SELECT * FROM trades WHERE rowid <= 3")
+        conn.execute("PRAGMA user_version = 2")
+
+    meta = main.read_sync_meta("c1")
+
+    assert (meta["rows"], meta["duplicates"]) == (30, 3)
+    assert count(db_path, "trades") == 30
+    assert count(db_path, "trades_duplicates") == 3
+    duplicated = pd.concat([trades, trades.iloc[:3]])
+    assert meta["fingerprint"] == schema.csv_fingerprint(duplicated.to_csv(index=False).splitlines())
@@ -0,0 +1,75 @@
+"""
+Delta sync through check_and_upload: a client that holds the server's row count
+and last close time appends only newer trades; anything else is answered 409.
+"""
+# Standard Library Imports
+import sqlite3
+
+# Local Imports
+import config
+import main
+import schema
+from benchmark import generate_trades
+
+
+def history(n, seed):
+    return generate_trades(n, seed=seed).sort_values("Close_Time", ignore_index=True)
+
+def handshake(server, client_id, rows_count):
+    return server.post(
+        f"/{config.call_back_token}/check_and_upload", data={"clientID": client_id, "rows_count": str(rows_count)}
+    ).get_json()
+
+def stored_rows(client_id):
+    with sqlite3.connect(main.get_db_path(client_id)) as conn:
+        return conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+
+
+# ==================================================== #
+def test_delta_from_the_reported_offset_is_appended(server, upload):
+    trades = history(40, 1)
+    assert upload("c1", trades[:30]).status_code == 201
+    state = handshake(server, "c1", 40)
+    assert state["rows"] == 30
+    assert state["last_close_time"] == trades["Close_Time"][29]
+
+    response = upload(
+        "c1", trades[30:], rows_count=40, mode="delta",
+        base_rows=state["rows"], base_close_time=state["last_close_time"]
+    )
+
+    assert response.status_code == 201
+    assert response.get_json()["rows_saved"] == 10
+    meta = main.read_sync_meta("c1")
+    assert (meta["rows"], meta["last_close_time"]) == (40, trades["Close_Time"][39])
+    assert meta["fingerprint"] == schema.csv_fingerprint(trades.to_csv(index=False).splitlines())
+    assert handshake(server, "c1", 40)["message"] == "No need to upload. Data is up-to-date."
+
+def test_delta_from_a_stale_offset_is_rejected(server, upload):
+    trades = history(40, 2)
+    assert upload("c1", trades[:30]).status_code == 201
+
+    for offset in ({"base_rows": 29}, {"base_rows": 30, "base_close_time": trades["Close_Time"][28]}, {}):
+        response = upload("c1", trades[30:], rows_count=40, mode="delta", **offset)
+        assert response.status_code == 409
+        body = response.get_json()
+        assert (body["rows"], body["last_close_time"]) == (30, trades["Close_Time"][29])
+    assert stored_rows("c1") == 30
+
+def test_delta_without_history_is_rejected(server, upload):
+    response = upload("c1", history(10, 3), mode="delta", base_rows=0)
+    assert response.status_code == 409
+    assert not main.database_exists("c1")
+
+def test_delta_that_diverges_is_rolled_back(server, upload):
+    trades = history(40, 4)
+    assert upload("c1", trades[:30]).status_code == 201
+    offset = {"base_rows": 30, "base_close_time": trades["Close_Time"][29]}
+
+    # Starts before the last stored close time
+    assert upload("c1", trades[25:], rows_count=45, mode="delta", **offset).status_code == 409
+    # Client and server disagree on the row count afterwards
+    assert upload("c1", trades[30:], rows_count=41, mode="delta", **offset).status_code == 409
+
+    assert stored_rows("c1") == 30
+    assert main.read_sync_meta("c1")["rows"] == 30
@@ -0,0 +1,93 @@
+"""
+Asynchronous uploads: check_and_upload with async=1 answers 202 and an
+IngestionJobQueue worker moves the job through queued -> running -> done | failed.
+"""
+# Standard Library Imports
+import glob
+import os
+import threading
+
+# Third-Party Imports
+import pytest
+
+# Local Imports
+import config
+import main
+from benchmark import generate_trades
+
+
+@pytest.fixture
+def jobs(server, monkeypatch):
+    """One worker, one queue slot; ingestion waits for `release` once `started` is set."""
+    queue = main.IngestionJobQueue(1, 1, 10)
+    started, release = threading.Event(), threading.Event()
+    ingest = main.ingest_csv_stream
+    def gated(*args, **kwargs):
+        started.set()
+        assert release.wait(10)
+        return ingest(*args, **kwargs)
+    monkeypatch.setattr(main, "ingest_jobs", queue)
+    monkeypatch.setattr(main, "ingest_csv_stream", gated)
+    queue.started, queue.release = started, release
+    yield queue
+    release.set()
+    queue._queue.join()
+
+def status(server, job_id):
+    return server.get(f"/{config.call_back_token}/jobs/{job_id}").get_json()
+
+def spooled(client_id):
+    return glob.glob(os.path.join(config.UPLOAD_DIR, client_id, "upload_*.csv"))
+
+
+# ==================================================== #
+def test_job_moves_from_queued_to_done(server, upload, jobs):
+    response = upload("c1", generate_trades(50, seed=1), **{"async": 1})
+
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job["status"] == "queued"
+    assert job["status_url"] == f"/{config.call_back_token}/jobs/{job['job_id']}"
+
+    assert jobs.started.wait(10)
+    assert status(server, job["job_id"])["status"] == "running"
+    jobs.release.set()
+    jobs._queue.join()
+
+    done = status(server, job["job_id"])
+    assert (done["status"], done["rows_processed"], done["error"]) == ("done", 50, None)
+    assert done["duration"] is not None
+    assert main.read_sync_meta("c1")["rows"] == 50
+    assert spooled("c1") == []
+
+def test_diverged_delta_job_fails(server, upload, jobs):
+    jobs.release.set()
+    trades = generate_trades(20, seed=2).sort_values("Close_Time", ignore_index=True)
+    assert upload("c1", trades[:10]).status_code == 201
+
+    response = upload(
+        "c1", trades[10:], rows_count=25, mode="delta", base_rows=10,
+        base_close_time=trades["Close_Time"][9], **{"async": 1}
+    )
+    assert response.status_code == 202
+    jobs._queue.join()
+
+    failed = status(server, response.get_json()["job_id"])
+    assert failed["status"] == "failed"
+    assert failed["error"] == "History diverged. Full upload required."
+    assert main.read_sync_meta("c1")["rows"] == 10
+
+def test_full_queue_is_answered_503(server, upload, jobs):
+    assert upload("c1", generate_trades(10, seed=3), **{"async": 1}).status_code == 202
+    assert jobs.started.wait(10)
+    assert upload("c2", generate_trades(10, seed=4), **{"async": 1}).status_code == 202
+
+    response = upload("c3", generate_trades(10, seed=5), **{"async": 1})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
+    assert spooled("c3") == []
+    assert jobs.stats()["queued"] == 1
+
+def test_unknown_job_is_404(server):
+    assert server.get(f"/{config.call_back_token}/jobs/nope").status_code == 404
@@ -0,0 +1,140 @@
+"""
+compute_metrics (the fused kernel) against a frozen copy of the baseline
+calculate_* helpers (tests/baseline_metrics.py) on generated trade histories.
+"""
+# Standard Library Imports
+import json
+
+# Third-Party Imports
+import pandas as pd
+import pytest
+
+# Local Imports
+import trade_metrics
+from baseline_metrics import baseline_outputs
+from benchmark import generate_trades
+
+# Keys whose meaning changed on purpose: drawdowns are peak-to-trough on the
+# equity curve (user-016) and streaks are the longest run (user-015).
+REDEFINED_KEYS = {
+    "drawdown", "drawdown_buy", "drawdown_sell",
+    "max_drawdown", "max_drawdown_buy", "max_drawdown_sell",
+    "min_drawdown", "min_drawdown_buy", "min_drawdown_sell",
+    "max_drawdown_time", "max_drawdown_trades",
+    "winning_streak", "losing_streak"
+}
+
+
+def prepared(n, seed, **kwargs):
+    return trade_metrics._prepare_trades_frame(generate_trades(n, seed=seed, **kwargs))
+
+def assert_matches_baseline(df):
+    # The kernel reads trades in close-time order, so the baseline gets the same
+    # order; it used to take whatever order the rows came out of the database.
+    reference = baseline_outputs(trade_metrics.sort_by_close_time(df.copy()))
+    outputs = trade_metrics.compute_metrics(df.copy())
+    assert [key for key in outputs if key in reference] == list(reference)
+    mismatched = {
+        key: (reference[key], outputs[key]) for key in reference.keys() - REDEFINED_KEYS
+        if json.dumps(reference[key]) != json.dumps(outputs[key]) or type(reference[key]) is not type(outputs[key])
+    }
+    assert not mismatched
+
+
+# ==================================================== #
+@pytest.mark.parametrize("n, seed", [(1, 1), (2, 2), (50, 3), (1_000, 4), (20_000, 5)])
+def test_matches_baseline_helpers(n, seed):
+    assert_matches_baseline(prepared(n, seed))
+
+@pytest.mark.parametrize("n, seed", [(50, 6), (1_000, 7)])
+def test_matches_baseline_helpers_on_unsorted_input(n, seed):
+    df = prepared(n, seed)
+    shuffled = df.sample(frac=1, random_state=seed)
+    assert_matches_baseline(shuffled)
+    assert json.dumps(trade_metrics.compute_metrics(shuffled.copy())) == json.dumps(trade_metrics.compute_metrics(df.copy()))
+
+def test_matches_baseline_helpers_with_one_side_only():
+    df = prepared(300, 8)
+    df["profit"] = df["profit"].abs() + 1
+    df["order_type"] = "buy"
+    assert_matches_baseline(df)
+
+def test_new_keys_come_after_the_baseline_keys():
+    df = prepared(100, 10)
+    reference = list(baseline_outputs(trade_metrics.sort_by_close_time(df.copy())))
+    assert list(trade_metrics.compute_metrics(df))[:len(reference)] == reference
+
+def test_drawdown_percent_is_capped():
+    df = trade_metrics.sort_by_close_time(prepared(200, 9))
+    df["profit"] = -50.0
+    df.loc[0, "profit"] = 10.0
+    outputs = trade_metrics.compute_metrics(df)
+    assert outputs["max_drawdown_percent"] == 100.0
+    assert outputs["max_drawdown"].endswith("(100.00)")
+    assert outputs["drawdown"].endswith("(100.00)")
+
+def hand_built(profits, sides):
+    """Trades opened on the hour from 2024-01-01 and closed 30 minutes later."""
+    df = prepared(len(profits), 11)
+    df["open_time"] = pd.Timestamp("2024-01-01") + pd.to_timedelta(range(len(profits)), unit="h")
+    df["close_time"] = df["open_time"] + pd.Timedelta(minutes=30)
+    df["profit"] = [float(profit) for profit in profits]
+    df["order_type"] = sides
+    return df
+
+def test_drawdowns_follow_the_equity_curve():
+    # equity      10   6   3   8  17  20  18    (buy: 10 6 . . 15 18 .    sell: . . -3 2 . . 0)
+    # drawdown     0   4   7   2   0   0   2
+    df = hand_built([10, -4, -3, 5, 9, 3, -2], ["buy", "buy", "sell", "sell", "buy", "buy", "sell"])
+    outputs = trade_metrics.compute_metrics(df, trade_metrics.StructuredFields)
+
+    assert outputs["drawdown"] == {"value": 2.0, "percent": 10.0}
+    assert outputs["max_drawdown"] == {"value": 7.0, "percent": 70.0}
+    assert outputs["min_drawdown"] == {"value": 2.0, "percent": 10.0}
+    assert outputs["max_drawdown_start"] == "2024-01-01T00:30:00"
+    assert outputs["max_drawdown_trough"] == "2024-01-01T02:30:00"
+    assert outputs["max_drawdown_recovery"] == "2024-01-01T04:30:00"
+    assert outputs["max_drawdown_time"] == {"seconds": 4 * 3600.0}
+    assert outputs["max_drawdown_trades"] == 3
+    assert outputs["max_drawdown_percent"] == 70.0
+
+    assert outputs["max_drawdown_buy"] == {"value": 4.0, "percent": 40.0}
+    assert outputs["drawdown_buy"] == {"value": 0.0, "percent": 0.0}
+    assert outputs["max_drawdown_trough_buy"] == "2024-01-01T01:30:00"
+    assert outputs["max_drawdown_trades_buy"] == 1
+
+    # The sell curve starts under water, so its first drawdown starts at the first open
+    # and has no peak to be a percentage of; the open one has lost the whole peak
+    assert outputs["max_drawdown_sell"] == {"value": 3.0, "percent": 0.0}
+    assert outputs["max_drawdown_start_sell"] == "2024-01-01T02:00:00"
+    assert outputs["max_drawdown_recovery_sell"] == "2024-01-01T03:30:00"
+    assert outputs["max_drawdown_time_sell"] == {"seconds": 5400.0}
+    assert outputs["drawdown_sell"] == {"value": 2.0, "percent": 100.0}
+    assert outputs["max_drawdown_percent_sell"] == 100.0
+
+def test_open_drawdown_runs_to_the_last_trade():
+    df = hand_built([5, -1, -2, -1], ["buy"] * 4)
+    outputs = trade_metrics.compute_metrics(df)
+    assert outputs["max_drawdown"] == "4.00 (80.00)"
+    assert outputs["max_drawdown_recovery"] is None
+    assert outputs["max_drawdown_time"] == "0:03:00"
+    assert outputs["max_drawdown_trades"] == 3
+
+def test_streaks_are_runs_of_consecutive_trades():
+    # W W L W W W L L; buy: W L W W, sell: W W L L
+    df = hand_built([5, 3, -2, 4, 1, 2, -6, -1], ["buy", "sell", "buy", "buy", "sell", "buy", "sell", "sell"])
+    runs = trade_metrics.streak_runs(df["profit"])
+    assert (runs["win"]["n"], runs["win"]["pnl"], runs["win"]["cur_n"]) == (3, 7.0, 0)
+    assert (runs["loss"]["n"], runs["loss"]["pnl"], runs["loss"]["cur_n"], runs["loss"]["cur_pnl"]) == (2, -7.0, 2, -7.0)
+
+    outputs = trade_metrics.compute_metrics(df)
+    assert outputs["winning_streak"] == "7.00 USD (3)"
+    assert outputs["losing_streak"] == "-7.00 USD (2)"
+    assert outputs["winning_streak_current"] == "0.00 USD (0)"
+    assert outputs["losing_streak_current"] == "-7.00 USD (2)"
+    assert outputs["winning_streak_buy"] == outputs["winning_streak_buy_current"] == "6.00 USD (2)"
+    assert outputs["losing_streak_buy"] == "-2.00 USD (1)"
+    assert outputs["losing_streak_buy_current"] == "0.00 USD (0)"
+    assert outputs["winning_streak_sell"] == "4.00 USD (2)"
+    assert outputs["losing_streak_sell"] == outputs["losing_streak_sell_current"] == "-7.00 USD (2)"
+    assert all(outputs[key] == value for key, value in trade_metrics.calculate_streak_metrics(df).items())
@@ -0,0 +1,97 @@
+"""
+get_filtered_outputs revalidation and compression: the ETag follows the data
+version of the requested magic number, If-None-Match hits answer 304, and
+bodies are brotli or gzip compressed as Accept-Encoding asks.
+"""
+# Standard Library Imports
+import gzip
+import json
+
+# Third-Party Imports
+import pandas as pd
+import pytest
+
+# Local Imports
+import config
+import main
+from benchmark import generate_trades, transaction_payloads
+
+
+def outputs(server, magic_number=1, headers=None, **query):
+    return server.get(
+        f"/{config.call_back_token_sync}/get_filtered_outputs",
+        query_string={"client_id": "c1", "magic_number": magic_number, **query}, headers=headers or {}
+    )
+
+def revalidate(server, response, magic_number=1, **query):
+    return outputs(server, magic_number, {"If-None-Match": response.headers["ETag"]}, **query)
+
+def post_transaction(server, magic_number):
+    trade = generate_trades(1, seed=10 + magic_number, magic_number=magic_number, start="2031-01-01")
+    assert server.post("/upload_transaction", json=transaction_payloads(trade, "c1")[0]).status_code == 200
+
+@pytest.fixture
+def history(server, upload):
+    trades = pd.concat([generate_trades(300, seed=1), generate_trades(300, seed=2, magic_number=2)])
+    assert upload("c1", trades).status_code == 201
+    return server
+
+
+# ==================================================== #
+def test_if_none_match_is_answered_304(history):
+    first = outputs(history)
+    assert first.status_code == 200
+    assert first.headers["ETag"].startswith('W/"')
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    again = revalidate(history, first)
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+def test_etag_depends_on_the_request(history):
+    first = outputs(history)
+    assert revalidate(history, first, format="structured").status_code == 200
+    assert revalidate(history, first, **{"from": "2023-06-01"}).status_code == 200
+    assert revalidate(history, first, magic_number=2).status_code == 200
+
+def test_etag_follows_writes_to_its_magic_number_only(history, upload):
+    first, other = outputs(history), outputs(history, 2)
+
+    post_transaction(history, 2)
+    assert revalidate(history, first).status_code == 304
+    assert revalidate(history, other, 2).status_code == 200
+
+    post_transaction(history, 1)
+    assert revalidate(history, first).status_code == 200
+
+    current = outputs(history)
+    assert upload("c1", generate_trades(300, seed=3)).status_code == 201
+    assert revalidate(history, current).status_code == 200
+
+def test_gzip_response_when_brotli_is_not_accepted(history):
+    plain = outputs(history, headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    compressed = outputs(history, headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(compressed.data)) == plain.get_json()
+    assert compressed.headers["ETag"] == plain.headers["ETag"]
+
+def test_brotli_response_when_preferred(history):
+    brotli = pytest.importorskip("brotli")
+    plain = outputs(history, headers={"Accept-Encoding": "identity"})
+
+    compressed = outputs(history, headers={"Accept-Encoding": "gzip;q=0.5, br"})
+
+    assert compressed.headers["Content-Encoding"] == "br"
+    assert json.loads(brotli.decompress(compressed.data)) == plain.get_json()
+
+def test_brotli_falls_back_to_gzip_without_the_package(history, monkeypatch):
+    monkeypatch.setattr(main, "brotli", None)
+    assert outputs(history, headers={"Accept-Encoding": "br, gzip"}).headers["Content-Encoding"] == "gzip"
+
+def test_small_responses_stay_uncompressed(history, monkeypatch):
+    monkeypatch.setattr(main, "RESPONSE_COMPRESS_MIN_BYTES", 10**6)
+    assert "Content-Encoding" not in outputs(history, headers={"Accept-Encoding": "gzip"}).headers
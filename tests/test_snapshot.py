@@ -0,0 +1,79 @@
+"""
+Columnar trade snapshot: writes in close order are appended to the column files,
+an out-of-order write re-exports its magic number, and either way the snapshot
+reads back the same as a fresh export of the 'trades' table.
+"""
+# Standard Library Imports
+import shutil
+
+# Third-Party Imports
+import pandas as pd
+
+# Local Imports
+import main
+import snapshot
+from benchmark import generate_trades, transaction_payloads
+
+
+def snapshot_frame(client_id, magic_number):
+    return snapshot.read_filtered_trades(client_id, magic_number)["data"].copy()
+
+def assert_matches_fresh_export(client_id, magic_numbers=(1, 2)):
+    current = {magic_number: snapshot_frame(client_id, magic_number) for magic_number in magic_numbers}
+    shutil.rmtree(snapshot._snapshot_dir(client_id))
+    for magic_number in magic_numbers:
+        assert current[magic_number]["close_time"].is_monotonic_increasing
+        pd.testing.assert_frame_equal(current[magic_number], snapshot_frame(client_id, magic_number))
+
+def count_exports(monkeypatch):
+    calls = []
+    export_magic, export = snapshot._export_snapshot_magic, snapshot._export_snapshot
+    def spy_magic(cursor, client_id, manifest, magic_number):
+        calls.append(magic_number)
+        return export_magic(cursor, client_id, manifest, magic_number)
+    def spy(cursor, client_id):
+        calls.append("all")
+        return export(cursor, client_id)
+    monkeypatch.setattr(snapshot, "_export_snapshot_magic", spy_magic)
+    monkeypatch.setattr(snapshot, "_export_snapshot", spy)
+    return calls
+
+def two_magics(server, upload):
+    trades = pd.concat([generate_trades(100, seed=1), generate_trades(100, seed=2, magic_number=2)])
+    assert upload("c1", trades).status_code == 201
+    assert len(snapshot_frame("c1", 1)) == 100
+
+
+# ==================================================== #
+def test_write_in_close_order_is_appended(server, upload, monkeypatch):
+    two_magics(server, upload)
+    exports = count_exports(monkeypatch)
+
+    batch = transaction_payloads(generate_trades(10, seed=3, start="2031-01-01").sort_values("Close_Time"), "c1")
+    assert server.post("/upload_transactions", json=batch).status_code == 200
+
+    assert len(snapshot_frame("c1", 1)) == 110
+    assert exports == []
+    assert_matches_fresh_export("c1")
+
+def test_out_of_order_write_re_exports_its_magic_number(server, upload, monkeypatch):
+    two_magics(server, upload)
+    exports = count_exports(monkeypatch)
+
+    late = generate_trades(1, seed=4, start="2023-03-01")
+    assert server.post("/upload_transaction", json=transaction_payloads(late, "c1")[0]).status_code == 200
+
+    assert len(snapshot_frame("c1", 1)) == 101
+    assert exports == [1]
+    assert_matches_fresh_export("c1")
+
+def test_snapshot_behind_the_database_is_re_exported(server, upload, monkeypatch):
+    two_magics(server, upload)
+    monkeypatch.setattr(main, "_sync_trade_snapshot", lambda *args, **kwargs: None)
+    later = generate_trades(5, seed=5, start="2031-01-01")
+    assert server.post("/upload_transactions", json=transaction_payloads(later, "c1")).status_code == 200
+    exports = count_exports(monkeypatch)
+
+    assert len(snapshot_frame("c1", 1)) == 105
+    assert exports[0] == "all"
+    assert_matches_fresh_export("c1")
@@ -0,0 +1,65 @@
+"""
+sync_meta fingerprints: independent of row order, equal to what a client
+computes from its CSV, and trusted by the handshake only when they match.
+"""
+# Third-Party Imports
+import pandas as pd
+
+# Local Imports
+import config
+import main
+import schema
+from benchmark import generate_trades, transaction_payloads
+
+
+def fingerprint(trades):
+    return schema.csv_fingerprint(trades.to_csv(index=False).splitlines())
+
+def handshake(server, client_id, rows_count, fingerprint):
+    return server.post(
+        f"/{config.call_back_token}/check_and_upload",
+        data={"clientID": client_id, "rows_count": str(rows_count), "fingerprint": fingerprint}
+    )
+
+
+# ==================================================== #
+def test_fingerprint_does_not_depend_on_row_order(server, upload):
+    trades = generate_trades(100, seed=1)
+    shuffled = trades.sample(frac=1, random_state=1)
+    assert fingerprint(shuffled) == fingerprint(trades)
+
+    assert upload("c1", trades).status_code == 201
+    assert upload("c2", shuffled).status_code == 201
+
+    assert main.read_sync_meta("c1")["fingerprint"] == main.read_sync_meta("c2")["fingerprint"] == fingerprint(trades)
+
+def test_fingerprint_follows_the_content(server):
+    trades = generate_trades(100, seed=2)
+    changed = trades.copy()
+    changed.loc[50, "Profit"] += 0.01
+    assert fingerprint(changed) != fingerprint(trades)
+    assert fingerprint(trades[:99]) != fingerprint(trades)
+
+def test_handshake_trusts_counts_only_with_a_matching_fingerprint(server, upload):
+    trades = generate_trades(30, seed=3)
+    assert upload("c1", trades).status_code == 201
+
+    same = handshake(server, "c1", 30, fingerprint(trades.sample(frac=1, random_state=3)).upper())
+    assert same.status_code == 200
+    assert same.get_json()["message"] == "No need to upload. Data is up-to-date."
+
+    other = handshake(server, "c1", 30, fingerprint(generate_trades(30, seed=4)))
+    assert other.status_code == 400
+    assert other.get_json()["error"] == "No file provided"
+
+def test_transactions_keep_the_fingerprint_of_the_whole_history(server, upload):
+    trades = generate_trades(30, seed=5)
+    later = generate_trades(5, seed=6, start="2031-01-01")
+    assert upload("c1", trades).status_code == 201
+
+    for payload in transaction_payloads(later, "c1"):
+        assert server.post("/upload_transaction", json=payload).status_code == 200
+
+    meta = main.read_sync_meta("c1")
+    assert meta["rows"] == 35
+    assert meta["fingerprint"] == fingerprint(pd.concat([later, trades]))
@@ -0,0 +1,74 @@
+"""
+/upload_transactions: a JSON array or NDJSON batch answered row by row, 207
+when some rows are rejected, with the valid ones written in one commit.
+"""
+# Standard Library Imports
+import json
+import sqlite3
+
+# Third-Party Imports
+import pytest
+
+# Local Imports
+import config
+import main
+from benchmark import generate_trades, transaction_payloads
+
+
+def mixed_batch(client_id):
+    """Five trades: valid, missing Profit, valid, a bad Close_Time, no client_id."""
+    batch = transaction_payloads(generate_trades(5, seed=1, start="2031-01-01"), client_id)
+    del batch[1]["Profit"]
+    batch[3]["Close_Time"] = "not a time"
+    batch[4]["client_id"] = ""
+    return batch
+
+def post(server, batch, ndjson):
+    if ndjson:
+        body = "\n".join(json.dumps(trade) for trade in batch) + "\n"
+        return server.post("/upload_transactions", data=body, content_type="application/x-ndjson")
+    return server.post("/upload_transactions", json=batch)
+
+def main_rows():
+    with sqlite3.connect(config.database_file_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM Trade_Transaction").fetchone()[0]
+
+
+# ==================================================== #
+@pytest.mark.parametrize("ndjson", [False, True])
+def test_partial_failure_is_answered_row_by_row(server, upload, ndjson):
+    assert upload("c1", generate_trades(20, seed=2)).status_code == 201
+
+    response = post(server, mixed_batch("c1"), ndjson)
+
+    assert response.status_code == 207
+    body = response.get_json()
+    assert (body["accepted"], body["duplicates"], body["rejected"]) == (2, 0, 3)
+    assert [result["index"] for result in body["results"]] == [0, 1, 2, 3, 4]
+    assert [result["status"] for result in body["results"]] == ["ok", "error", "ok", "error", "error"]
+    assert "profit" in body["results"][1]["error"]
+    assert "close_time" in body["results"][3]["error"]
+    assert "Client_ID" in body["results"][4]["error"]
+    assert main_rows() == 2
+    assert main.read_sync_meta("c1")["rows"] == 22
+
+@pytest.mark.parametrize("ndjson", [False, True])
+def test_resent_batch_reports_duplicates(server, upload, ndjson):
+    assert upload("c1", generate_trades(20, seed=3)).status_code == 201
+    batch = transaction_payloads(generate_trades(3, seed=4, start="2031-01-01"), "c1")
+    assert post(server, batch, ndjson).status_code == 200
+
+    response = post(server, batch, ndjson)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body["accepted"], body["duplicates"], body["rejected"]) == (0, 3, 0)
+    assert [result["status"] for result in body["results"]] == ["duplicate"] * 3
+    assert main_rows() == 3
+    assert main.read_sync_meta("c1")["rows"] == 23
+
+def test_malformed_batch_is_rejected_whole(server):
+    assert server.post("/upload_transactions", data="[{]", content_type="application/json").status_code == 400
+    assert server.post("/upload_transactions", data='{"a": 1}\n[1]\n', content_type="application/x-ndjson").status_code == 400
+    assert server.post("/upload_transactions", json=[]).status_code == 400
+    assert main_rows() == 0
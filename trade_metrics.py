@@ -0,0 +1,1402 @@
+"""
+The metrics kernel behind get_filtered_outputs: an aggregate state built in one
+pass over a magic number's trades (or folded one trade at a time), rendered as
+the legacy strings or structured numbers, plus the legacy calculate_* helpers
+it replaced, kept for calculate_outputs_legacy and the self-check.
+"""
+# Standard Library Imports
+import json
+import logging
+import sqlite3
+
+# Third-Party Imports
+import numpy as np
+import pandas as pd
+
+# Local Imports
+import config
+from monitoring import metrics
+from schema import _trade_code, _trade_time
+
+logger = logging.getLogger(__name__)
+
+# Recompute every metrics request with the legacy calculate_* helpers as well
+# and log any key where the fused kernel disagrees.
+METRICS_SELF_CHECK = getattr(config, "METRICS_SELF_CHECK", False)
+
+# ==================================================== #
+@metrics.timed("datetime_conversion")
+def _prepare_trades_frame(df, codes=None):
+    """
+    Turn 'trades' rows into the frame the metrics read: epoch-second times become
+    datetimes and, given load_trade_codes() output, coded columns categoricals.
+    Frames of raw CSV text are lower-cased and parsed instead.
+    """
+    df.columns = df.columns.str.strip().str.lower()
+    for name in ("open_time", "close_time"):
+        if pd.api.types.is_numeric_dtype(df[name]):
+            df[name] = pd.to_datetime(df[name], unit="s")
+        else:
+            df[name] = pd.to_datetime(df[name])
+    for name, labels in (codes or {}).items():
+        if name in df.columns and pd.api.types.is_numeric_dtype(df[name]):
+            df[name] = pd.Categorical.from_codes(
+                df[name].fillna(-1).astype(np.int64), categories=pd.Index(labels, dtype=object)
+            )
+    return df
+
+def sort_by_close_time(df):
+    """
+    Return the trades in close time order (stable, with a fresh index), the order
+    the equity curve, streaks and current floating drawdown are read in.
+    """
+    if df["close_time"].is_monotonic_increasing and df.index.is_monotonic_increasing:
+        return df
+    return df.sort_values("close_time", kind="stable").reset_index(drop=True)
+
+# ==================================================== #
+def calculate_outputs(df):
+    """
+    Perform calculations on the filtered trades and return the results.
+    """
+    try:
+        # Check if the DataFrame is empty
+        if df.empty:
+            logger.warning("No data found in the filtered trades.")
+            return None
+
+        # Normalize column names and convert date columns to datetime
+        df = _prepare_trades_frame(df)
+
+        # Compute every output in one pass over the columns
+        outputs = compute_metrics(df)
+        if METRICS_SELF_CHECK:
+            _check_metrics_equivalence(df, outputs)
+
+        logger.info("Calculations completed successfully.")
+        return outputs
+
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        return None
+
+# ==================================================== #
+@metrics.timed("legacy_helpers")
+def calculate_outputs_legacy(df):
+    """
+    Reference implementation: fan out to the individual calculate_* helpers.
+
+    Kept to check compute_metrics against (see METRICS_SELF_CHECK). The helpers
+    modify the DataFrame, so pass a copy. Like compute_metrics, they read the
+    trades in close time order.
+    """
+    df = sort_by_close_time(df)
+    return {
+        "Most_Volume": calculate_most_volume(df),
+        "smallest_open_time": get_smallest_open_time(df),
+        "largest_close_time": get_largest_close_time(df),
+        "total_profit": calculate_total_profit(df),
+        "profit_factor": calculate_profit_factor(df),
+        "trades_won_percentage": calculate_trades_won_percentage(df),
+        "expected_payoff": calculate_expected_payoff(df),
+        "netProfit": calculate_net_profit(df),
+        "NetLoss": calculate_net_loss(df),
+        "Balance_mDD": calculate_balance_max_drawdown(df),
+        **calculate_drawdown(df),
+        **calculate_max_min_drawdowns(df),
+        **calculate_floating_drawdown(df),
+        **calculate_quantity_metrics(df),
+        **calculate_profitability_metrics(df),
+        **calculate_profit_distribution(df),
+        **calculate_time_metrics(df),
+        **calculate_time_extremes(df),
+        **calculate_win_loss_metrics(df),
+        **calculate_closure_metrics(df),
+        **calculate_additional_metrics(df),
+        **calculate_streak_metrics(df),
+        **calculate_drawdown_timing(df)
+    }
+
+# ==================================================== #
+def _check_metrics_equivalence(df, outputs):
+    """Log every output key where compute_metrics disagrees with the legacy helpers."""
+    reference = calculate_outputs_legacy(df.copy())
+    mismatched = [
+        key for key in reference.keys() | outputs.keys()
+        if json.dumps(reference.get(key), default=str) != json.dumps(outputs.get(key), default=str)
+    ]
+    if mismatched:
+        logger.warning(f"compute_metrics differs from the legacy helpers on: {sorted(mismatched)}")
+
+# ==================================================== #
+def _nan_max(values):
+    """Maximum ignoring NaN, NaN for an empty selection (pandas semantics)."""
+    values = values[~np.isnan(values)]
+    return values.max() if values.size else np.nan
+
+def _nan_min(values):
+    """Minimum ignoring NaN, NaN for an empty selection (pandas semantics)."""
+    values = values[~np.isnan(values)]
+    return values.min() if values.size else np.nan
+
+def _label_mask(values, label, lower=False):
+    """Rows equal to `label`; categoricals are matched on their codes, without string work per row."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories.astype(str)
+        if lower:
+            categories = categories.str.lower()
+        return np.isin(values.cat.codes.to_numpy(), np.flatnonzero(categories == label))
+    if lower:
+        return (values.astype(str).str.lower() == label).to_numpy()
+    return values.to_numpy(dtype=object) == label
+
+def _seconds(nanoseconds):
+    """Convert a nanosecond count to seconds exactly like Timedelta.total_seconds()."""
+    return pd.Timedelta(int(nanoseconds)).total_seconds()
+
+def _duration_ns(durations):
+    """Convert durations in seconds (or timedeltas) to int64 nanoseconds, NaT as None-able mask."""
+    durations = pd.Series(durations)
+    if not pd.api.types.is_timedelta64_dtype(durations):
+        durations = pd.to_timedelta(pd.to_numeric(durations, errors="coerce"), unit="s")
+    durations = durations.to_numpy().astype("timedelta64[ns]")
+    valid = ~np.isnat(durations)
+    return np.where(valid, durations.astype(np.int64), 0), valid
+
+def _opt(value):
+    """Store a NumPy scalar as a plain float, NaN as None."""
+    return None if value is None or np.isnan(value) else float(value)
+
+def _f(value):
+    """Read a stored float back as np.float64, None as NaN, so rounding matches pandas."""
+    return np.float64(np.nan if value is None else value)
+
+# ==================================================== #
+class LegacyFields:
+    """Render the composite output values as the legacy strings, e.g. "12.50 (3.10)"."""
+
+    @staticmethod
+    def amount_pct(value, pct):
+        return f"{value:.2f} ({pct:.2f})"
+
+    @staticmethod
+    def usd_pct(value, pct):
+        return f"{value:.2f} USD ({pct:.2f})"
+
+    @staticmethod
+    def count_pct(count, pct):
+        return f"{count} ({pct:.2f})"
+
+    @staticmethod
+    def count_rate(count, pct):
+        return f"{count} ({pct:.2f} %)"
+
+    @staticmethod
+    def count_usd(count, value):
+        return f"{count} ({value:.2f} USD)"
+
+    @staticmethod
+    def usd_count(value, count):
+        return f"{value:.2f} USD ({count})"
+
+    @staticmethod
+    def duration(seconds):
+        return format_time_delta(seconds)
+
+    @staticmethod
+    def duration_pct(seconds, pct):
+        return f"{format_time_delta(seconds)} ({pct:.2f})"
+
+def _num(value):
+    return round(float(value), 2)
+
+class StructuredFields:
+    """
+    Render the composite output values as numbers in separate fields, e.g.
+    {"value": 12.5, "percent": 3.1}, rounded to the precision the strings show
+    (durations as seconds).
+    """
+
+    @staticmethod
+    def amount_pct(value, pct):
+        return {"value": _num(value), "percent": _num(pct)}
+
+    usd_pct = amount_pct
+
+    @staticmethod
+    def count_pct(count, pct):
+        return {"count": int(count), "percent": _num(pct)}
+
+    count_rate = count_pct
+
+    @staticmethod
+    def count_usd(count, value):
+        return {"count": int(count), "value": _num(value)}
+
+    @staticmethod
+    def usd_count(value, count):
+        return {"value": _num(value), "count": int(count)}
+
+    @staticmethod
+    def duration(seconds):
+        return {"seconds": _num(seconds)}
+
+    @staticmethod
+    def duration_pct(seconds, pct):
+        return {"seconds": _num(seconds), "percent": _num(pct)}
+
+def _to_float(value):
+    """Parse a raw CSV/JSON value as float, NaN when missing."""
+    if value is None or value == "":
+        return np.nan
+    return float(value)
+
+def _fold_max(current, value):
+    if np.isnan(value):
+        return current
+    return value if current is None or value > current else current
+
+def _fold_min(current, value):
+    if np.isnan(value):
+        return current
+    return value if current is None or value < current else current
+
+def _longest_run(profit, starts, ends):
+    """Pick the longest run, the larger absolute P&L on ties, then the earliest."""
+    lengths = ends - starts
+    candidates = np.flatnonzero(lengths == lengths.max())
+    sums = [sum(profit[starts[i]:ends[i]].tolist()) for i in candidates]
+    best = int(np.argmax(np.abs(sums)))
+    return sums[best], int(lengths[candidates[best]])
+
+def streak_runs(profit):
+    """
+    Find the longest and the current run of consecutive winning and losing trades.
+
+    Runs are located with a diff over the win/loss masks, so the cost is a few NumPy
+    passes however many trades there are. A zero or missing profit ends both kinds
+    of run. Run P&L is summed left to right like a running total.
+
+    Returns:
+        dict: {"win": {...}, "loss": {...}}, each with "n"/"pnl" for the longest run
+        and "cur_n"/"cur_pnl" for the run still open at the last trade.
+    """
+    profit = np.asarray(profit, dtype=np.float64)
+    result = {}
+    for kind, mask in (("win", profit > 0), ("loss", profit < 0)):
+        runs = {"n": 0, "pnl": 0.0, "cur_n": 0, "cur_pnl": 0.0}
+        if mask.any():
+            edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+            starts = np.flatnonzero(edges == 1)
+            ends = np.flatnonzero(edges == -1)
+            runs["pnl"], runs["n"] = _longest_run(profit, starts, ends)
+            if ends[-1] == profit.size:
+                runs["cur_pnl"] = sum(profit[starts[-1]:].tolist())
+                runs["cur_n"] = int(profit.size - starts[-1])
+        result[kind] = runs
+    return result
+
+def _fold_streak(runs, profit):
+    """Extend streak_runs() output by one trade."""
+    for kind, extends in (("win", profit > 0), ("loss", profit < 0)):
+        entry = runs[kind]
+        if not extends:
+            entry["cur_n"], entry["cur_pnl"] = 0, 0.0
+            continue
+        entry["cur_n"] += 1
+        entry["cur_pnl"] += profit
+        if entry["cur_n"] > entry["n"] or (entry["cur_n"] == entry["n"] and abs(entry["cur_pnl"]) > abs(entry["pnl"])):
+            entry["n"], entry["pnl"] = entry["cur_n"], entry["cur_pnl"]
+
+def _streak_outputs(streaks, fields=LegacyFields):
+    """Format the streaks of each side as the winning_/losing_streak output keys."""
+    outputs = {}
+    for scope in ("all", "buy", "sell"):
+        suffix = "" if scope == "all" else f"_{scope}"
+        for kind, label in (("win", "winning"), ("loss", "losing")):
+            runs = streaks[scope][kind]
+            outputs[f"{label}_streak{suffix}"] = fields.usd_count(runs["pnl"], runs["n"])
+            outputs[f"{label}_streak{suffix}_current"] = fields.usd_count(runs["cur_pnl"], runs["cur_n"])
+    return outputs
+
+# ==================================================== #
+def _iso(nanoseconds):
+    return pd.Timestamp(int(nanoseconds)).isoformat()
+
+def _drawdown_record(depth, peak, start, trough, recovery, n):
+    """One drawdown episode: from the peak it fell from until equity got back to it."""
+    depth, peak = float(depth), float(peak)
+    return {
+        "depth": depth, "pct": depth / peak * 100 if peak > 0 else 0.0,
+        "start": start, "trough": trough, "recovery": recovery, "n": int(n)
+    }
+
+def _rank_drawdown(best, record):
+    """Fold a finished episode into the deepest, the deepest in percent and the shallowest."""
+    if best["max"] is None or record["depth"] > best["max"]["depth"]:
+        best["max"] = record
+    if best["max_pct"] is None or record["pct"] > best["max_pct"]["pct"]:
+        best["max_pct"] = record
+    if best["min"] is None or record["depth"] < best["min"]["depth"]:
+        best["min"] = record
+
+def equity_drawdowns(profit, open_ns, close_ns):
+    """
+    Drawdowns of the equity curve (running sum of profit) of trades in close order.
+
+    The curve starts at zero and the peak is its running maximum, so every point
+    below the peak belongs to a drawdown episode that lasts until equity reaches
+    the peak again. Episodes are located with a diff over the under-water mask
+    and their depths with one reduceat, so the cost is a few NumPy passes.
+
+    Parameters:
+        profit (np.ndarray): Trade profits; NaN counts as zero.
+        open_ns, close_ns (np.ndarray): Open and close times as int64 nanoseconds.
+
+    Returns:
+        dict: "n", "equity", "peak", "peak_time" (last close at the peak), "last_close",
+        "episode" (the drawdown still open, if any) and "max"/"max_pct"/"min" (the
+        deepest, deepest in percent and shallowest recovered episodes).
+    """
+    state = {"n": int(profit.size), "equity": 0.0, "peak": 0.0, "peak_time": None, "last_close": None,
+             "episode": None, "max": None, "max_pct": None, "min": None}
+    if profit.size == 0:
+        return state
+
+    equity = np.cumsum(np.nan_to_num(profit, nan=0.0))
+    peak = np.maximum(np.maximum.accumulate(equity), 0.0)
+    drawdown = peak - equity
+    under = drawdown > 0
+
+    state["equity"], state["peak"] = float(equity[-1]), float(peak[-1])
+    state["last_close"] = _iso(close_ns[-1])
+    at_peak = np.flatnonzero(~under)
+    if at_peak.size:
+        state["peak_time"] = _iso(close_ns[at_peak[-1]])
+    if not under.any():
+        return state
+
+    edges = np.diff(np.concatenate(([0], under.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    depths = np.maximum.reduceat(np.append(drawdown, 0.0), np.column_stack((starts, ends)).ravel())[::2]
+    peaks = peak[starts]
+
+    def record(i):
+        start, end = starts[i], ends[i]
+        trough = start + int(np.argmax(drawdown[start:end]))
+        return _drawdown_record(
+            depths[i], peaks[i],
+            _iso(close_ns[start - 1]) if start > 0 else _iso(open_ns[start]),
+            _iso(close_ns[trough]),
+            _iso(close_ns[end]) if end < profit.size else None,
+            end - start
+        )
+
+    recovered = starts.size - 1 if ends[-1] == profit.size else starts.size
+    if ends[-1] == profit.size:
+        state["episode"] = record(starts.size - 1)
+        state["episode"]["peak"] = float(peaks[-1])
+    if recovered:
+        pct = np.zeros(recovered)
+        above = peaks[:recovered] > 0
+        pct[above] = depths[:recovered][above] / peaks[:recovered][above] * 100
+        state["max"] = record(int(np.argmax(depths[:recovered])))
+        state["max_pct"] = record(int(np.argmax(pct)))
+        state["min"] = record(int(np.argmin(depths[:recovered])))
+    return state
+
+def _fold_equity(state, profit, open_time, close_time):
+    """Extend equity_drawdowns() output by one trade."""
+    state["n"] += 1
+    state["equity"] += 0.0 if np.isnan(profit) else profit
+    state["last_close"] = close_time
+    if state["equity"] >= state["peak"]:
+        if state["equity"] > state["peak"]:
+            state["peak"] = state["equity"]
+        episode = state["episode"]
+        if episode is not None:
+            _rank_drawdown(state, _drawdown_record(
+                episode["depth"], episode["peak"], episode["start"], episode["trough"], close_time, episode["n"]
+            ))
+            state["episode"] = None
+        state["peak_time"] = close_time
+        return
+    drawdown = state["peak"] - state["equity"]
+    episode = state["episode"]
+    if episode is None:
+        episode = state["episode"] = {
+            "depth": 0.0, "pct": 0.0, "peak": state["peak"], "start": state["peak_time"] or open_time,
+            "trough": None, "recovery": None, "n": 0
+        }
+    episode["n"] += 1
+    if drawdown > episode["depth"]:
+        episode["depth"], episode["trough"] = drawdown, close_time
+        episode["pct"] = drawdown / episode["peak"] * 100 if episode["peak"] > 0 else 0.0
+
+def _drawdown_outputs(equity, fields=LegacyFields):
+    """
+    Format the equity drawdowns of each side as the drawdown output keys.
+
+    "drawdown" is the current distance below the peak, "max_drawdown" and
+    "min_drawdown" the deepest and shallowest episodes (the open one included),
+    each as "money (percent of the peak)". Percentages are capped at 100, as the
+    per-trade drawdowns were: once equity falls below zero the loss exceeds the
+    peak and the ratio stops meaning anything.
+    """
+    outputs = {}
+    for scope in ("all", "buy", "sell"):
+        suffix = "" if scope == "all" else f"_{scope}"
+        state = equity[scope]
+        best = {key: state[key] for key in ("max", "max_pct", "min")}
+        if state["episode"] is not None:
+            _rank_drawdown(best, {key: value for key, value in state["episode"].items() if key != "peak"})
+
+        current = state["peak"] - state["equity"]
+        current_pct = min(current / state["peak"] * 100, 100.0) if state["peak"] > 0 else 0.0
+        outputs[f"drawdown{suffix}"] = fields.amount_pct(current, current_pct)
+        for key, record in (("max_drawdown", best["max"]), ("min_drawdown", best["min"])):
+            outputs[f"{key}{suffix}"] = (
+                fields.amount_pct(record["depth"], min(record["pct"], 100.0)) if record else fields.amount_pct(0, 0)
+            )
+
+        deepest = best["max"]
+        under_water = 0
+        if deepest is not None:
+            end = deepest["recovery"] or state["last_close"]
+            under_water = (pd.Timestamp(end) - pd.Timestamp(deepest["start"])).total_seconds()
+        outputs[f"max_drawdown_time{suffix}"] = fields.duration(under_water)
+        outputs[f"max_drawdown_trades{suffix}"] = deepest["n"] if deepest else 0
+        outputs[f"max_drawdown_percent{suffix}"] = round(min(best["max_pct"]["pct"], 100.0), 2) if best["max_pct"] else 0.0
+        for key in ("start", "trough", "recovery"):
+            outputs[f"max_drawdown_{key}{suffix}"] = deepest[key] if deepest else None
+    return outputs
+
+# ==================================================== #
+def empty_aggregate_state():
+    """Return the aggregate state of a magic number without trades."""
+    return {
+        "n": 0, "min_open": None, "max_close": None,
+        "volume_max": None, "volume_sum": 0.0,
+        "profit_sum": 0.0, "commission_sum": 0.0, "swap_sum": 0.0,
+        "win_n": 0, "win_sum": 0.0, "win_max": None,
+        "loss_n": 0, "loss_sum": 0.0, "loss_min": None,
+        "buy_n": 0, "sell_n": 0, "buy_profit": 0.0, "sell_profit": 0.0, "buy_win_n": 0, "sell_win_n": 0,
+        "dur_ns": 0, "buy_dur_ns": 0, "sell_dur_ns": 0, "dur_max_ns": None, "dur_min_ns": None,
+        "sl_n": 0, "tp_n": 0,
+        "fdd_max": None, "has_floating": True,
+        "floating": {"all": None, "buy": None, "sell": None},
+        "equity": {scope: equity_drawdowns(np.empty(0), None, None) for scope in ("all", "buy", "sell")},
+        "streaks": {scope: streak_runs([]) for scope in ("all", "buy", "sell")}
+    }
+
+AGGREGATE_STATE_KEYS = frozenset(empty_aggregate_state())
+
+# ==================================================== #
+@metrics.timed("build_aggregate_state")
+def build_aggregate_state(df):
+    """
+    Build the aggregate state of one magic number from its trades in one pass.
+
+    The columns are extracted once and the buy/sell/win/loss masks are built once.
+    The state holds every sum, count, extreme, equity curve drawdown and streak the
+    outputs need, so fold_trade() can extend it one trade at a time.
+
+    Parameters:
+        df (pd.DataFrame): Lower-cased columns with open/close times already parsed,
+                           ordered by close time.
+    """
+    state = empty_aggregate_state()
+    n = len(df)
+    if n == 0:
+        return state
+
+    # Columns and masks, built once
+    profit = df["profit"].to_numpy(dtype=np.float64)
+    volume = df["volume"].to_numpy(dtype=np.float64)
+    floating = df["floating_drawdown"].to_numpy(dtype=np.float64)
+    has_floating = "floating_drawdown_currency" in df.columns
+    duration_ns, duration_valid = _duration_ns(df["duration"])
+
+    masks = {
+        "all": np.ones(n, dtype=bool),
+        "buy": _label_mask(df["order_type"], "buy", lower=True),
+        "sell": _label_mask(df["order_type"], "sell", lower=True)
+    }
+    win = profit > 0
+    loss = profit < 0
+
+    state["n"] = n
+    state["min_open"] = df["open_time"].min().isoformat()
+    state["max_close"] = df["close_time"].max().isoformat()
+    state["volume_max"] = _opt(_nan_max(volume))
+    state["volume_sum"] = float(np.nansum(volume))
+    state["profit_sum"] = float(np.nansum(profit))
+    state["commission_sum"] = float(np.nansum(df["commission"].to_numpy(dtype=np.float64)))
+    state["swap_sum"] = float(np.nansum(df["swap"].to_numpy(dtype=np.float64)))
+
+    state["win_n"] = int(win.sum())
+    state["win_sum"] = float(np.nansum(profit[win]))
+    state["win_max"] = _opt(_nan_max(profit[win]))
+    state["loss_n"] = int(loss.sum())
+    state["loss_sum"] = float(np.nansum(profit[loss]))
+    state["loss_min"] = _opt(_nan_min(profit[loss]))
+
+    for side in ("buy", "sell"):
+        mask = masks[side]
+        state[f"{side}_n"] = int(mask.sum())
+        state[f"{side}_profit"] = float(np.nansum(profit[mask]))
+        state[f"{side}_win_n"] = int((mask & win).sum())
+        state[f"{side}_dur_ns"] = int(duration_ns[mask].sum())
+
+    state["dur_ns"] = int(duration_ns.sum())
+    if duration_valid.any():
+        state["dur_max_ns"] = int(duration_ns[duration_valid].max())
+        state["dur_min_ns"] = int(duration_ns[duration_valid].min())
+    # Without a Close_Reason column every trade counts as closed by order
+    if "close_reason" in df.columns:
+        state["sl_n"] = int(_label_mask(df["close_reason"], "sl").sum())
+        state["tp_n"] = int(_label_mask(df["close_reason"], "tp").sum())
+
+    # Floating drawdown, overall and per side
+    state["fdd_max"] = _opt(_nan_max(floating))
+    state["has_floating"] = has_floating
+    if has_floating:
+        floating_currency = df["floating_drawdown_currency"].to_numpy(dtype=np.float64)
+        for side, mask in masks.items():
+            if not mask.any():
+                continue
+            percents, dollars = floating[mask], floating_currency[mask]
+            state["floating"][side] = {
+                "last_pct": float(percents[-1]), "last_cur": float(dollars[-1]),
+                "max_pct": _opt(_nan_max(percents)), "min_pct": _opt(_nan_min(percents)),
+                "max_cur": _opt(_nan_max(dollars)), "min_cur": _opt(_nan_min(dollars))
+            }
+
+    # Equity curve drawdowns, overall and per side
+    open_ns = df["open_time"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+    close_ns = df["close_time"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+    for side, mask in masks.items():
+        state["equity"][side] = equity_drawdowns(profit[mask], open_ns[mask], close_ns[mask])
+
+    for side, mask in masks.items():
+        state["streaks"][side] = streak_runs(profit[mask])
+    return state
+
+# ==================================================== #
+def fold_trade(state, trade):
+    """
+    Extend an aggregate state with one trade closed after all trades already in it.
+
+    Parameters:
+        state (dict): State from build_aggregate_state() or empty_aggregate_state(); updated in place.
+        trade (dict): Canonical column name -> stored value (see encode_trade_rows); raw
+                      text values are accepted too.
+    """
+    profit = _to_float(trade.get("profit"))
+    volume = _to_float(trade.get("volume"))
+    side = str(_trade_code("order_type", trade.get("order_type"))).lower()
+    close_reason = _trade_code("close_reason", trade.get("close_reason"))
+    duration_ns, duration_valid = _duration_ns([trade.get("duration")])
+    duration_ns = int(duration_ns[0]) if duration_valid[0] else None
+    open_time = _trade_time(trade.get("open_time"))
+    close_time = _trade_time(trade.get("close_time"))
+
+    state["n"] += 1
+    if state["min_open"] is None or open_time < pd.Timestamp(state["min_open"]):
+        state["min_open"] = open_time.isoformat()
+    if state["max_close"] is None or close_time > pd.Timestamp(state["max_close"]):
+        state["max_close"] = close_time.isoformat()
+
+    state["volume_max"] = _fold_max(state["volume_max"], volume)
+    for key, value in (("volume_sum", volume), ("profit_sum", profit),
+                       ("commission_sum", _to_float(trade.get("commission"))),
+                       ("swap_sum", _to_float(trade.get("swap")))):
+        if not np.isnan(value):
+            state[key] += value
+
+    if profit > 0:
+        state["win_n"] += 1
+        state["win_sum"] += profit
+        state["win_max"] = _fold_max(state["win_max"], profit)
+    elif profit < 0:
+        state["loss_n"] += 1
+        state["loss_sum"] += profit
+        state["loss_min"] = _fold_min(state["loss_min"], profit)
+
+    sides = ("all", side) if side in ("buy", "sell") else ("all",)
+    if side in ("buy", "sell"):
+        state[f"{side}_n"] += 1
+        if not np.isnan(profit):
+            state[f"{side}_profit"] += profit
+        if profit > 0:
+            state[f"{side}_win_n"] += 1
+        state[f"{side}_dur_ns"] += duration_ns or 0
+
+    if duration_ns is not None:
+        state["dur_ns"] += duration_ns
+        state["dur_max_ns"] = duration_ns if state["dur_max_ns"] is None else max(state["dur_max_ns"], duration_ns)
+        state["dur_min_ns"] = duration_ns if state["dur_min_ns"] is None else min(state["dur_min_ns"], duration_ns)
+    if close_reason == "sl":
+        state["sl_n"] += 1
+    elif close_reason == "tp":
+        state["tp_n"] += 1
+
+    # Floating drawdown
+    percent = _to_float(trade.get("floating_drawdown"))
+    state["fdd_max"] = _fold_max(state["fdd_max"], percent)
+    if state["has_floating"]:
+        dollars = _to_float(trade.get("floating_drawdown_currency"))
+        for key in sides:
+            entry = state["floating"][key] or {
+                "max_pct": None, "min_pct": None, "max_cur": None, "min_cur": None
+            }
+            entry["last_pct"], entry["last_cur"] = percent, dollars
+            entry["max_pct"] = _fold_max(entry["max_pct"], percent)
+            entry["min_pct"] = _fold_min(entry["min_pct"], percent)
+            entry["max_cur"] = _fold_max(entry["max_cur"], dollars)
+            entry["min_cur"] = _fold_min(entry["min_cur"], dollars)
+            state["floating"][key] = entry
+
+    # Winning and losing runs, equity curve drawdowns
+    for key in sides:
+        _fold_streak(state["streaks"][key], profit)
+        _fold_equity(state["equity"][key], profit, open_time.isoformat(), close_time.isoformat())
+
+    return state
+
+# ==================================================== #
+@metrics.timed("render_outputs")
+def render_outputs(state, fields=LegacyFields):
+    """
+    Format an aggregate state as the calculate_outputs response.
+
+    Values that the legacy helpers rounded as NumPy scalars are rounded as NumPy
+    scalars here too, so a state built from the full history renders byte-identical
+    JSON to calculate_outputs_legacy. `fields` renders the composite values:
+    LegacyFields as strings, StructuredFields as numbers.
+    """
+    total_trades = state["n"]
+    total_profit = _f(state["profit_sum"])
+    win_profit = _f(state["win_sum"])
+    loss_profit = _f(state["loss_sum"])
+    win_count, loss_count = state["win_n"], state["loss_n"]
+    buy_count, sell_count = state["buy_n"], state["sell_n"]
+
+    outputs = {}
+
+    # Totals
+    outputs["Most_Volume"] = round(float(_f(state["volume_max"])), 2)
+    outputs["smallest_open_time"] = state["min_open"][:10]
+    outputs["largest_close_time"] = state["max_close"][:10]
+    outputs["total_profit"] = round(total_profit, 2)
+
+    total_losing_loss = abs(loss_profit)
+    profit_factor = win_profit / total_losing_loss if total_losing_loss != 0 else 0
+    outputs["profit_factor"] = round(profit_factor, 2)
+
+    win_rate = (win_count / total_trades) * 100 if total_trades != 0 else 0
+    outputs["trades_won_percentage"] = fields.count_rate(total_trades, win_rate)
+    expected_payoff = total_profit / total_trades if total_trades != 0 else 0
+    outputs["expected_payoff"] = round(expected_payoff, 2)
+    outputs["netProfit"] = round(win_profit, 2)
+    outputs["NetLoss"] = round(loss_profit, 2)
+
+    max_floating = _f(state["fdd_max"])
+    balance_max_drawdown = total_profit / max_floating if max_floating != 0 else 0
+    outputs["Balance_mDD"] = round(balance_max_drawdown, 2)
+
+    # Equity curve drawdowns
+    drawdowns = _drawdown_outputs(state["equity"], fields)
+    for key in ("drawdown", "drawdown_buy", "drawdown_sell", "max_drawdown", "max_drawdown_buy",
+                "max_drawdown_sell", "min_drawdown", "min_drawdown_buy", "min_drawdown_sell"):
+        outputs[key] = drawdowns.pop(key)
+
+    # Floating drawdown
+    for suffix, side in (("", "all"), ("_buy", "buy"), ("_sell", "sell")):
+        current = maximum = minimum = fields.amount_pct(0, 0)
+        entry = state["floating"][side] if state["has_floating"] else None
+        if entry is not None:
+            current = fields.amount_pct(abs(_f(entry["last_cur"])), abs(_f(entry["last_pct"])))
+            maximum = fields.amount_pct(abs(_f(entry["max_cur"])), abs(_f(entry["max_pct"])))
+            minimum = fields.amount_pct(abs(_f(entry["min_cur"])), abs(_f(entry["min_pct"])))
+        outputs[f"drawdown_floating{suffix}_current"] = current
+        outputs[f"drawdown_floating{suffix}_max"] = maximum
+        outputs[f"drawdown_floating{suffix}_min"] = minimum
+
+    # Quantities and profitability
+    buy_percentage = (buy_count / total_trades) * 100 if total_trades != 0 else 0
+    sell_percentage = (sell_count / total_trades) * 100 if total_trades != 0 else 0
+    outputs["Quantity"] = total_trades
+    outputs["Quantity_Buy"] = fields.count_pct(buy_count, buy_percentage)
+    outputs["Quantity_Sell"] = fields.count_pct(sell_count, sell_percentage)
+
+    buy_win_count, sell_win_count = state["buy_win_n"], state["sell_win_n"]
+    profitable_percentage = (win_count / total_trades) * 100 if total_trades != 0 else 0
+    profitable_buy_percentage = (buy_win_count / buy_count) * 100 if buy_count != 0 else 0
+    profitable_sell_percentage = (sell_win_count / sell_count) * 100 if sell_count != 0 else 0
+    outputs["Profitable"] = fields.count_pct(win_count, profitable_percentage)
+    outputs["Profitable_Buy"] = fields.count_pct(buy_win_count, profitable_buy_percentage)
+    outputs["Profitable_Sell"] = fields.count_pct(sell_win_count, profitable_sell_percentage)
+
+    buy_profit, sell_profit = _f(state["buy_profit"]), _f(state["sell_profit"])
+    profit_buy_percentage = (buy_profit / total_profit) * 100 if total_profit != 0 else 0
+    profit_sell_percentage = (sell_profit / total_profit) * 100 if total_profit != 0 else 0
+    if buy_profit == 0:
+        profit_buy_percentage = 0.0
+    if sell_profit == 0:
+        profit_sell_percentage = 0.0
+    outputs["profit_Buy"] = fields.amount_pct(buy_profit, profit_buy_percentage)
+    outputs["profit_Sell"] = fields.amount_pct(sell_profit, profit_sell_percentage)
+
+    # Time metrics
+    total_open_time = _seconds(state["dur_ns"])
+    buy_open_time = _seconds(state["buy_dur_ns"])
+    sell_open_time = _seconds(state["sell_dur_ns"])
+    avg_open_time = total_open_time / total_trades if total_trades != 0 else 0
+    avg_buy = buy_open_time / buy_count if buy_count != 0 else 0
+    avg_sell = sell_open_time / sell_count if sell_count != 0 else 0
+    buy_time_percentage = (buy_open_time / total_open_time) * 100 if total_open_time != 0 else 0
+    sell_time_percentage = (sell_open_time / total_open_time) * 100 if total_open_time != 0 else 0
+    max_open_time = _seconds(state["dur_max_ns"])
+    min_open_time = _seconds(state["dur_min_ns"])
+    outputs["Open_Time"] = fields.duration(total_open_time)
+    outputs["Open_Time_Buy"] = fields.duration_pct(buy_open_time, buy_time_percentage)
+    outputs["Open_Time_Sell"] = fields.duration_pct(sell_open_time, sell_time_percentage)
+    outputs["Avg_Open_Time"] = fields.duration(avg_open_time)
+    outputs["Avg_Buy"] = fields.duration(avg_buy)
+    outputs["Avg_Sell"] = fields.duration(avg_sell)
+    outputs["Max_Open_Time"] = fields.duration(max_open_time)
+    outputs["Min_Open_Time"] = fields.duration(min_open_time)
+
+    # Wins and losses
+    outputs["Biggest_Win"] = round(_f(state["win_max"]), 2) if win_count else 0
+    outputs["Average_Win"] = round(win_profit / win_count, 2) if win_count else 0
+    outputs["Biggest_Loss"] = round(_f(state["loss_min"]), 2) if loss_count else 0
+    outputs["Average_Loss"] = round(loss_profit / loss_count, 2) if loss_count else 0
+
+    # Closure reasons
+    closed_by_sl_count, closed_by_tp_count = state["sl_n"], state["tp_n"]
+    closed_by_order_count = total_trades - closed_by_sl_count - closed_by_tp_count
+    for key, count in (("Closed_by_Order", closed_by_order_count),
+                       ("Closed_by_SL", closed_by_sl_count),
+                       ("Closed_by_TP", closed_by_tp_count)):
+        percentage = (count / total_trades) * 100 if total_trades != 0 else 0
+        outputs[key] = fields.count_pct(count, percentage)
+
+    # Additional metrics
+    outputs["max_flat_period"] = fields.duration(max_open_time)
+    outputs["max_drawdown_time"] = drawdowns.pop("max_drawdown_time")
+    outputs["max_drawdown_trades"] = drawdowns.pop("max_drawdown_trades")
+    outputs["most_winning_trades"] = fields.count_usd(win_count, win_profit)
+    outputs["most_losing_trades"] = fields.count_usd(loss_count, loss_profit)
+    streaks = _streak_outputs(state["streaks"], fields)
+    outputs["winning_streak"] = streaks.pop("winning_streak")
+    outputs["losing_streak"] = streaks.pop("losing_streak")
+    outputs["sum_lots"] = round(_f(state["volume_sum"]), 2)
+
+    sum_commission = _f(state["commission_sum"])
+    commission_percentage = (sum_commission / total_profit) * 100 if total_profit != 0 else 0
+    outputs["sum_commission"] = fields.usd_pct(sum_commission, commission_percentage)
+    sum_swap = _f(state["swap_sum"])
+    swap_percentage = (sum_swap / total_profit) * 100 if total_profit != 0 else 0
+    outputs["sum_swap"] = fields.usd_pct(sum_swap, swap_percentage)
+
+    # Current runs and per-side streaks, drawdown timing
+    outputs.update(streaks)
+    outputs.update(drawdowns)
+
+    return outputs
+
+# ==================================================== #
+def compute_metrics(df, fields=LegacyFields):
+    """
+    Compute every calculate_outputs key in one pass over NumPy columns.
+
+    Parameters:
+        df (pd.DataFrame): Lower-cased columns with open/close times already parsed,
+                           in any order (see sort_by_close_time).
+        fields: LegacyFields or StructuredFields, see render_outputs.
+
+    Returns:
+        dict: Output key -> value, in the legacy key order.
+    """
+    return render_outputs(build_aggregate_state(sort_by_close_time(df)), fields)
+
+# ==================================================== #
+# TODO test function ✅
+def calculate_most_volume(df):
+    """
+    Calculate the maximum volume from the "Volume" column and return it as a float with two decimal places.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame containing a "Volume" column.
+
+    Returns:
+        float: Maximum volume rounded to two decimal places.
+    """
+    most_volume = df["volume"].max()
+    return round(float(most_volume), 2)
+
+# ==================================================== #
+# TODO test function ✅
+def get_smallest_open_time(df):
+    """Find the smallest date in the Open_Time column."""
+    return df["open_time"].min().strftime("%Y-%m-%d")
+
+# ==================================================== #
+# TODO test function ✅
+def get_largest_close_time(df):
+    """Find the largest date in the Close_Time column."""
+    return df["close_time"].max().strftime("%Y-%m-%d")
+
+# ==================================================== #
+# TODO test function ✅
+def calculate_total_profit(df):
+    """Calculate the total profit."""
+    total_profit = df["profit"].sum()
+    return round(total_profit, 2)
+
+# ==================================================== #
+def calculate_equity_drawdowns(df):
+    """
+    Calculate every drawdown key from the equity curves of all, buy and sell trades.
+
+    The curves are the running sum of profit in close time order, built once per
+    side by equity_drawdowns().
+
+    Returns:
+        dict: "drawdown*", "max_drawdown*", "min_drawdown*" as "money (percent)" and
+              the timing of the deepest drawdown ("max_drawdown_time", "..._trades",
+              "..._percent", "..._start", "..._trough", "..._recovery").
+    """
+    close_ns = pd.to_datetime(df["close_time"]).to_numpy(dtype="datetime64[ns]").view(np.int64)
+    order = np.argsort(close_ns, kind="stable")
+    close_ns = close_ns[order]
+    open_ns = pd.to_datetime(df["open_time"]).to_numpy(dtype="datetime64[ns]").view(np.int64)[order]
+    profit = df["profit"].to_numpy(dtype=np.float64)[order]
+    masks = {
+        "all": np.ones(profit.size, dtype=bool),
+        "buy": _label_mask(df["order_type"], "buy", lower=True)[order],
+        "sell": _label_mask(df["order_type"], "sell", lower=True)[order],
+    }
+    return _drawdown_outputs({
+        side: equity_drawdowns(profit[mask], open_ns[mask], close_ns[mask]) for side, mask in masks.items()
+    })
+
+# ==================================================== #
+def calculate_drawdown(df):
+    """
+    Calculate the current drawdown of the equity curve, total and for Buy and Sell trades.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame with "profit", "order_type" and open/close time columns.
+
+    Returns:
+        dict: Drawdown values formatted as "$(%)".
+    """
+    outputs = calculate_equity_drawdowns(df)
+    return {key: outputs[key] for key in ("drawdown", "drawdown_buy", "drawdown_sell")}
+
+# ==================================================== #
+def calculate_max_min_drawdowns(df):
+    """
+    Calculate the deepest and shallowest equity drawdowns for total, buy, and sell trades.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame with "profit", "order_type" and open/close time columns.
+
+    Returns:
+        dict: Formatted maximum and minimum drawdown results.
+    """
+    outputs = calculate_equity_drawdowns(df)
+    return {
+        f"{kind}_drawdown{suffix}": outputs[f"{kind}_drawdown{suffix}"]
+        for kind in ("max", "min") for suffix in ("", "_buy", "_sell")
+    }
+
+# ==================================================== #
+def calculate_drawdown_timing(df):
+    """
+    Calculate when the deepest drawdown of each side started, bottomed out and recovered.
+
+    Returns:
+        dict: "max_drawdown_percent", "max_drawdown_start", "max_drawdown_trough" and
+              "max_drawdown_recovery" per side, plus the buy/sell "max_drawdown_time"
+              and "max_drawdown_trades".
+    """
+    outputs = calculate_equity_drawdowns(df)
+    for key in ("drawdown", "max_drawdown", "min_drawdown"):
+        for suffix in ("", "_buy", "_sell"):
+            del outputs[f"{key}{suffix}"]
+    del outputs["max_drawdown_time"], outputs["max_drawdown_trades"]
+    return outputs
+
+# ==================================================== #
+# TODO test function ✅
+def calculate_floating_drawdown(df):
+    """
+    Calculate floating drawdown with separate entries for each metric.
+    Returns format: value (percentage) as individual dictionary items.
+    """
+    # Initialize results with separate keys
+    results = {
+        # Overall drawdown
+        "drawdown_floating_current": "0.00 (0.00)",
+        "drawdown_floating_max": "0.00 (0.00)",
+        "drawdown_floating_min": "0.00 (0.00)",
+        
+        # Buy drawdown
+        "drawdown_floating_buy_current": "0.00 (0.00)",
+        "drawdown_floating_buy_max": "0.00 (0.00)",
+        "drawdown_floating_buy_min": "0.00 (0.00)",
+        
+        # Sell drawdown
+        "drawdown_floating_sell_current": "0.00 (0.00)",
+        "drawdown_floating_sell_max": "0.00 (0.00)",
+        "drawdown_floating_sell_min": "0.00 (0.00)"
+    }
+
+    # Check for required columns
+    required_cols = ['floating_drawdown', 'floating_drawdown_currency', 'order_type']
+    if df.empty or not all(col in df.columns for col in required_cols):
+        return results
+
+    # Ensure sorted by index
+    df = df.sort_index()
+
+    # Format helper
+    def format_drawdown(dollar_val, pct_val):
+        return f"{abs(dollar_val):.2f} ({abs(pct_val):.2f})"
+
+    # Calculate overall metrics
+    results["drawdown_floating_current"] = format_drawdown(
+        df['floating_drawdown_currency'].iloc[-1],
+        df['floating_drawdown'].iloc[-1]
+    )
+    results["drawdown_floating_max"] = format_drawdown(
+        df['floating_drawdown_currency'].max(),
+        df['floating_drawdown'].max()
+    )
+    results["drawdown_floating_min"] = format_drawdown(
+        df['floating_drawdown_currency'].min(),
+        df['floating_drawdown'].min()
+    )
+
+    # Calculate for Buy trades
+    buy_df = df[df["order_type"].str.lower() == "buy"]
+    if not buy_df.empty:
+        results["drawdown_floating_buy_current"] = format_drawdown(
+            buy_df['floating_drawdown_currency'].iloc[-1],
+            buy_df['floating_drawdown'].iloc[-1]
+        )
+        results["drawdown_floating_buy_max"] = format_drawdown(
+            buy_df['floating_drawdown_currency'].max(),
+            buy_df['floating_drawdown'].max()
+        )
+        results["drawdown_floating_buy_min"] = format_drawdown(
+            buy_df['floating_drawdown_currency'].min(),
+            buy_df['floating_drawdown'].min()
+        )
+
+    # Calculate for Sell trades
+    sell_df = df[df["order_type"].str.lower() == "sell"]
+    if not sell_df.empty:
+        results["drawdown_floating_sell_current"] = format_drawdown(
+            sell_df['floating_drawdown_currency'].iloc[-1],
+            sell_df['floating_drawdown'].iloc[-1]
+        )
+        results["drawdown_floating_sell_max"] = format_drawdown(
+            sell_df['floating_drawdown_currency'].max(),
+            sell_df['floating_drawdown'].max()
+        )
+        results["drawdown_floating_sell_min"] = format_drawdown(
+            sell_df['floating_drawdown_currency'].min(),
+            sell_df['floating_drawdown'].min()
+        )
+
+    return results
+
+# ==================================================== #
+# TODO test function ✅
+def calculate_profit_factor(df):
+    """Calculate the profit factor."""
+    winning_trades = df[df["profit"] > 0]
+    losing_trades = df[df["profit"] < 0]
+    total_winning_profit = winning_trades["profit"].sum()
+    total_losing_loss = abs(losing_trades["profit"].sum())
+    # Calculate profit factor and round to two decimal places
+    profit_factor = total_winning_profit / total_losing_loss if total_losing_loss != 0 else 0
+    return round(profit_factor, 2)
+# ==================================================== #
+# TODO test function ✅
+def calculate_trades_won_percentage(df):
+    """Calculate the total trades and win rate."""
+    total_trades = len(df)
+    winning_trades_count = len(df[df["profit"] > 0])
+    win_rate = (winning_trades_count / total_trades) * 100 if total_trades != 0 else 0
+    return f"{total_trades} ({win_rate:.2f} %)"
+
+# ==================================================== #
+# TODO test function ✅
+def calculate_expected_payoff(df):
+    """Calculate the expected payoff."""
+    total_profit = df["profit"].sum()
+    total_trades = len(df)
+    expected_payoff = total_profit / total_trades if total_trades != 0 else 0
+    return round(expected_payoff, 2)
+
+# ==================================================== #
+# TODO test function ✅
+def calculate_net_profit(df):
+    """Calculate the net profit (sum of positive profits)."""
+    net_profit = df[df["profit"] > 0]["profit"].sum()
+    return round(net_profit, 2)
+
+# ==================================================== #
+# TODO test function ✅
+def calculate_net_loss(df):
+    """Calculate the net loss (sum of negative profits)."""
+    net_loss = df[df["profit"] < 0]["profit"].sum()
+    return round(net_loss, 2)
+
+# ==================================================== #
+# TODO test function ✅
+def calculate_balance_max_drawdown(df):
+    """Calculate the ratio of total profit to maximum drawdown."""
+    total_profit = df["profit"].sum()
+    max_drawdown = df["floating_drawdown"].max()
+    balance_max_drawdown = total_profit / max_drawdown if max_drawdown != 0 else 0
+    return round(balance_max_drawdown, 2)
+
+# ==================================================== #
+# TODO test function ✅
+def calculate_quantity_metrics(df):
+    """Calculate buy and sell quantities and their percentages."""
+    total_trades = len(df)
+    buy_trades = df[df["order_type"].str.lower() == "buy"]
+    sell_trades = df[df["order_type"].str.lower() == "sell"]
+    buy_quantity = len(buy_trades)
+    sell_quantity = len(sell_trades)
+    buy_percentage = (buy_quantity / total_trades) * 100 if total_trades != 0 else 0
+    sell_percentage = (sell_quantity / total_trades) * 100 if total_trades != 0 else 0
+    return {
+        "Quantity": total_trades,
+        "Quantity_Buy": f"{buy_quantity} ({buy_percentage:.2f})",
+        "Quantity_Sell": f"{sell_quantity} ({sell_percentage:.2f})"
+    }
+
+# ==================================================== #
+# TODO test function ✅
+def calculate_profitability_metrics(df):
+    """Calculate profitable trades and their percentages."""
+    total_trades = len(df)
+    profitable_trades = df[df["profit"] > 0]
+    buy_trades = df[df["order_type"].str.lower() == "buy"]
+    sell_trades = df[df["order_type"].str.lower() == "sell"]
+    profitable_buy_trades = buy_trades[buy_trades["profit"] > 0]
+    profitable_sell_trades = sell_trades[sell_trades["profit"] > 0]
+    
+    profitable_percentage = (len(profitable_trades) / total_trades) * 100 if total_trades != 0 else 0
+    profitable_buy_percentage = (len(profitable_buy_trades) / len(buy_trades)) * 100 if len(buy_trades) != 0 else 0
+    profitable_sell_percentage = (len(profitable_sell_trades) / len(sell_trades)) * 100 if len(sell_trades) != 0 else 0
+    
+    return {
+        "Profitable": f"{len(profitable_trades)} ({profitable_percentage:.2f})",
+        "Profitable_Buy": f"{len(profitable_buy_trades)} ({profitable_buy_percentage:.2f})",
+        "Profitable_Sell": f"{len(profitable_sell_trades)} ({profitable_sell_percentage:.2f})"
+    }
+
+# ==================================================== #
+# TODO test function ✅
+def format_time_delta(total_seconds):
+    """Convert total seconds to days:hours:minutes format."""
+    days = int(total_seconds // (24 * 3600))
+    total_seconds %= 24 * 3600
+    hours = int(total_seconds // 3600)
+    total_seconds %= 3600
+    minutes = int(total_seconds // 60)
+    return f"{days}:{hours:02}:{minutes:02}"
+
+# ==================================================== #
+# TODO test function ✅
+def calculate_closure_metrics(df):
+    """
+    Calculate trade closure reasons (Order, SL, TP) based on the "close_reason" column.
+    Returns:
+        dict: A dictionary with three keys:
+              - "Closed_by_Order": Count and percentage of trades closed for reasons other than SL or TP.
+              - "Closed_by_SL": Count and percentage of trades closed by stop-loss.
+              - "Closed_by_TP": Count and percentage of trades closed by take-profit.
+    """
+    # Normalize column names by stripping whitespace and converting to lowercase
+    df.columns = df.columns.str.strip().str.lower()
+
+    # Ensure the "close_reason" column exists
+    if "close_reason" not in df.columns:
+        raise ValueError("The 'close_reason' column is missing in the DataFrame.")
+
+    # Total number of trades
+    total_trades = len(df)
+
+    # Count trades by closure reason
+    closed_by_sl = df[df["close_reason"] == "sl"]
+    closed_by_tp = df[df["close_reason"] == "tp"]
+    closed_by_order = df[~df["close_reason"].isin(["sl", "tp"])]  # All reasons except SL and TP
+
+    closed_by_order_count = len(closed_by_order)
+    closed_by_sl_count = len(closed_by_sl)
+    closed_by_tp_count = len(closed_by_tp)
+
+    # Calculate percentages
+    closed_by_order_percentage = (closed_by_order_count / total_trades) * 100 if total_trades != 0 else 0
+    closed_by_sl_percentage = (closed_by_sl_count / total_trades) * 100 if total_trades != 0 else 0
+    closed_by_tp_percentage = (closed_by_tp_count / total_trades) * 100 if total_trades != 0 else 0
+
+    # Return the results
+    return {
+        "Closed_by_Order": f"{closed_by_order_count} ({closed_by_order_percentage:.2f})",
+        "Closed_by_SL": f"{closed_by_sl_count} ({closed_by_sl_percentage:.2f})",
+        "Closed_by_TP": f"{closed_by_tp_count} ({closed_by_tp_percentage:.2f})"
+    }
+# ==================================================== #
+# TODO test function ✅
+def calculate_profit_distribution(df):
+    """
+    Calculate profit distribution for buy and sell trades.
+    Returns:
+        A dictionary with the following keys:
+        - "profit_Buy": Total profit from buy trades and its percentage of total profit.
+        - "profit_Sell": Total profit from sell trades and its percentage of total profit.
+    """
+    # Filter buy and sell trades
+    buy_trades = df[df["order_type"].str.lower() == "buy"]
+    sell_trades = df[df["order_type"].str.lower() == "sell"]
+
+    # Calculate total profit from buy and sell trades
+    profit_buy = buy_trades["profit"].sum()
+    profit_sell = sell_trades["profit"].sum()
+
+    # Calculate total profit
+    total_profit = df["profit"].sum()
+
+    # Calculate percentages
+    profit_buy_percentage = (profit_buy / total_profit) * 100 if total_profit != 0 else 0
+    profit_sell_percentage = (profit_sell / total_profit) * 100 if total_profit != 0 else 0
+
+    # Ensure percentages are non-negative when profit is zero
+    if profit_buy == 0:
+        profit_buy_percentage = 0.0
+    if profit_sell == 0:
+        profit_sell_percentage = 0.0
+
+    # Format the results
+    return {
+        "profit_Buy": f"{profit_buy:.2f} ({profit_buy_percentage:.2f})",
+        "profit_Sell": f"{profit_sell:.2f} ({profit_sell_percentage:.2f})"
+    }
+
+# ==================================================== #
+# TODO test function ✅
+def calculate_time_extremes(df):
+    """Calculate max and min open time."""
+    df["duration"] = pd.to_timedelta(df["duration"])
+    max_open_time = df["duration"].max().total_seconds()
+    min_open_time = df["duration"].min().total_seconds()
+    return {
+        "Max_Open_Time": format_time_delta(max_open_time),
+        "Min_Open_Time": format_time_delta(min_open_time)
+    }
+
+# ==================================================== #
+# TODO test function ✅
+def calculate_win_loss_metrics(df):
+    """Calculate biggest win, average win, biggest loss, and average loss, rounded to two decimal places."""
+    winning_trades = df[df["profit"] > 0]
+    losing_trades = df[df["profit"] < 0]
+    
+    biggest_win = round(winning_trades["profit"].max(), 2) if not winning_trades.empty else 0
+    average_win = round(winning_trades["profit"].mean(), 2) if not winning_trades.empty else 0
+    biggest_loss = round(losing_trades["profit"].min(), 2) if not losing_trades.empty else 0
+    average_loss = round(losing_trades["profit"].mean(), 2) if not losing_trades.empty else 0
+    
+    return {
+        "Biggest_Win": biggest_win,
+        "Average_Win": average_win,
+        "Biggest_Loss": biggest_loss,
+        "Average_Loss": average_loss
+    }
+
+# ==================================================== #
+# TODO test function ✅
+def calculate_time_metrics(df):
+    """
+    Calculate time-based metrics.
+    
+    Parameters:
+        df (pd.DataFrame): DataFrame containing "duration" and "order_type" columns.
+        
+    Returns:
+        dict: A dictionary containing time-based metrics.
+    """
+    # Ensure the "duration" column is in timedelta format
+    if not pd.api.types.is_timedelta64_dtype(df["duration"]):
+        df["duration"] = pd.to_timedelta(df["duration"], unit="s")
+
+    # Calculate total open time in seconds
+    total_open_time = df["duration"].sum().total_seconds()
+
+    # Filter buy and sell trades
+    buy_trades = df[df["order_type"].str.lower() == "buy"]
+    sell_trades = df[df["order_type"].str.lower() == "sell"]
+
+    # Calculate total open time for buy and sell trades
+    buy_open_time = buy_trades["duration"].sum().total_seconds()
+    sell_open_time = sell_trades["duration"].sum().total_seconds()
+
+    # Calculate average open times
+    avg_open_time = total_open_time / len(df) if len(df) != 0 else 0
+    avg_buy = buy_open_time / len(buy_trades) if len(buy_trades) != 0 else 0
+    avg_sell = sell_open_time / len(sell_trades) if len(sell_trades) != 0 else 0
+
+    # Calculate percentages for buy and sell open times
+    buy_percentage = (buy_open_time / total_open_time) * 100 if total_open_time != 0 else 0
+    sell_percentage = (sell_open_time / total_open_time) * 100 if total_open_time != 0 else 0
+
+    # Calculate max and min open times
+    max_open_time = df["duration"].max().total_seconds()
+    min_open_time = df["duration"].min().total_seconds()
+
+    # Return the results
+    return {
+        "Open_Time": format_time_delta(total_open_time),
+        "Open_Time_Buy": f"{format_time_delta(buy_open_time)} ({buy_percentage:.2f})",
+        "Open_Time_Sell": f"{format_time_delta(sell_open_time)} ({sell_percentage:.2f})",
+        "Avg_Open_Time": format_time_delta(avg_open_time),
+        "Avg_Buy": format_time_delta(avg_buy),
+        "Avg_Sell": format_time_delta(avg_sell),
+        "Max_Open_Time": format_time_delta(max_open_time),
+        "Min_Open_Time": format_time_delta(min_open_time)
+    }
+
+# ==================================================== #
+def calculate_additional_metrics(df):
+    """
+    Calculate additional trading metrics based on the DataFrame.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame containing trading data with columns like "profit", "order_type",
+                           "duration", "lots", "commission", "swap", etc.
+
+    Returns:
+        dict: A dictionary containing the following metrics:
+              - "max_flat_period": Maximum flat period in days:hours:minutes format.
+              - "max_drawdown_time": Maximum drawdown time in days:hours:minutes format.
+              - "max_drawdown_trades": Number of trades during the maximum drawdown period.
+              - "most_winning_trades": Most winning trades in "count (total_profit)" format.
+              - "most_losing_trades": Most losing trades in "count (total_loss)" format.
+              - "winning_streak": Longest run of consecutive wins in "total_profit (count)" format.
+              - "losing_streak": Longest run of consecutive losses in "total_loss (count)" format.
+              - "sum_lots": Total sum of lots traded.
+              - "sum_commission": Total commission in "total_commission (percentage)" format.
+              - "sum_swap": Total swap in "total_swap (percentage)" format.
+    """
+    # Ensure the DataFrame is sorted by index (or time) if not already
+    df = df.sort_index()
+
+    # Initialize results dictionary
+    results = {}
+
+    # 1. Max Flat Period
+    max_flat_period = df["duration"].max().total_seconds()
+    results["max_flat_period"] = format_time_delta(max_flat_period)
+
+    # 2. Max Drawdown Time and 3. Max Drawdown Trades, under water from peak to recovery
+    drawdowns = calculate_equity_drawdowns(df)
+    results["max_drawdown_time"] = drawdowns["max_drawdown_time"]
+    results["max_drawdown_trades"] = drawdowns["max_drawdown_trades"]
+
+    # 4. Most Winning Trades
+    winning_trades = df[df["profit"] > 0]
+    most_winning_trades_count = len(winning_trades)
+    most_winning_trades_profit = winning_trades["profit"].sum()
+    results["most_winning_trades"] = f"{most_winning_trades_count} ({most_winning_trades_profit:.2f} USD)"
+
+    # 5. Most Losing Trades
+    losing_trades = df[df["profit"] < 0]
+    most_losing_trades_count = len(losing_trades)
+    most_losing_trades_loss = losing_trades["profit"].sum()
+    results["most_losing_trades"] = f"{most_losing_trades_count} ({most_losing_trades_loss:.2f} USD)"
+
+    # 6. Winning Streak
+    winning_streak, winning_streak_count = calculate_winning_streak(df)
+    results["winning_streak"] = f"{winning_streak:.2f} USD ({winning_streak_count})"
+
+    # 7. Losing Streak
+    losing_streak, losing_streak_count = calculate_losing_streak(df)
+    results["losing_streak"] = f"{losing_streak:.2f} USD ({losing_streak_count})"
+
+    # 8. Sum Lots
+    sum_lots = round(df["volume"].sum(), 2)  # Round to 2 decimal places
+    results["sum_lots"] = sum_lots
+
+    # 9. Sum Commission
+    sum_commission = df["commission"].sum()
+    commission_percentage = (sum_commission / df["profit"].sum()) * 100 if df["profit"].sum() != 0 else 0
+    results["sum_commission"] = f"{sum_commission:.2f} USD ({commission_percentage:.2f})"
+
+    # 10. Sum Swap
+    sum_swap = df["swap"].sum()
+    swap_percentage = (sum_swap / df["profit"].sum()) * 100 if df["profit"].sum() != 0 else 0
+    results["sum_swap"] = f"{sum_swap:.2f} USD ({swap_percentage:.2f})"
+
+    return results
+
+# ==================================================== #
+def calculate_losing_streak(df):
+    """
+    Calculate the losing streak (longest sequence of consecutive losing trades).
+
+    Parameters:
+        df (pd.DataFrame): DataFrame containing trading data with a "profit" column.
+
+    Returns:
+        float: Total loss during the losing streak.
+        int: Number of trades in the losing streak.
+    """
+    runs = streak_runs(df["profit"].to_numpy(dtype=np.float64))["loss"]
+    return runs["pnl"], runs["n"]
+
+# ==================================================== #
+def calculate_winning_streak(df):
+    """
+    Calculate the winning streak (longest sequence of consecutive winning trades).
+
+    Returns:
+        float: Total profit during the winning streak.
+        int: Number of trades in the winning streak.
+    """
+    runs = streak_runs(df["profit"].to_numpy(dtype=np.float64))["win"]
+    return runs["pnl"], runs["n"]
+
+# ==================================================== #
+def calculate_streak_metrics(df):
+    """
+    Calculate the current runs and the per-side streaks.
+
+    Returns:
+        dict: "winning_streak_current", "losing_streak_current" and the longest and
+              current streaks of buy and sell trades ("winning_streak_buy",
+              "losing_streak_sell_current", ...), each as "pnl USD (count)".
+    """
+    profit = df["profit"].to_numpy(dtype=np.float64)
+    outputs = _streak_outputs({
+        "all": streak_runs(profit),
+        "buy": streak_runs(profit[_label_mask(df["order_type"], "buy", lower=True)]),
+        "sell": streak_runs(profit[_label_mask(df["order_type"], "sell", lower=True)])
+    })
+    del outputs["winning_streak"], outputs["losing_streak"]
+    return outputs
@@ -0,0 +1,370 @@
+"""
+Resumable chunked uploads, shared by app.py and main.py.
+
+A client opens an upload with its total size and chunk size, sends numbered
+chunks (each with its byte offset and SHA-256) in any order and as often as it
+needs to, asks which chunks are still missing after a dropped connection, and
+finalizes. Every chunk is written with os.pwrite straight to its offset in one
+preallocated .part file, so nothing is buffered in memory and finalizing is a
+rename rather than a copy.
+
+Uploads may also arrive gzip or zstd compressed, as a request body with a
+Content-Encoding header or as a file whose name ends in .gz / .zst.
+DecompressingReader inflates either incrementally, so the uncompressed data
+only ever exists a read at a time, and stops at a size limit.
+
+    store = ChunkedUploadStore("/srv/uploads/_chunked")
+    upload = store.create(size=10_485_760, chunk_size=1_048_576, meta={"clientID": "1001"})
+    store.write_chunk(upload["upload_id"], 0, 0, request.stream, "<sha256 hex>")
+    store.status(upload["upload_id"])["missing"]
+    path = store.complete(upload["upload_id"], "/srv/uploads/1001/history.csv")
+"""
+# Standard Library Imports
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+import zlib
+from datetime import datetime
+
+# Third-Party Imports
+from werkzeug.wsgi import get_input_stream
+
+try:
+    import zstandard
+except ImportError:  # optional: zstd uploads are refused without it
+    zstandard = None
+
+UPLOAD_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+# Content-Encoding values and file name suffixes accepted for compressed uploads.
+CONTENT_ENCODINGS = {"gzip": "gzip", "x-gzip": "gzip", "zstd": "zstd"}
+COMPRESSED_SUFFIXES = {".gz": "gzip", ".gzip": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+# Most a compressed upload may inflate to, so a small bomb cannot fill memory or disk.
+MAX_DECOMPRESSED_BYTES = 1024 * 1024 * 1024
+
+
+# ==================================================== #
+class UploadError(ValueError):
+    """Raised when an upload request or chunk is invalid."""
+
+
+class UnknownUploadError(UploadError):
+    """Raised for an upload id that does not exist or has expired."""
+
+
+class IncompleteUploadError(UploadError):
+    """Raised when an upload is finalized before every chunk arrived."""
+
+
+class UploadTooLargeError(UploadError):
+    """Raised when a compressed upload inflates past its size limit."""
+
+
+# ==================================================== #
+def split_compression(filename):
+    """
+    Split a compression suffix off a file name.
+
+    Returns:
+        tuple: (name without the suffix, "gzip" | "zstd" | None).
+    """
+    root, suffix = os.path.splitext(filename or "")
+    encoding = COMPRESSED_SUFFIXES.get(suffix.lower())
+    return (root, encoding) if encoding else (filename, None)
+
+def is_path_segment(name):
+    """True if name can be joined under an upload folder as one entry: no separators, not "." or ".."."""
+    return bool(name) and name not in (".", "..") and not any(c in name for c in ("/", "\\", "\0", os.sep))
+
+# ==================================================== #
+class _InputReader:
+    """File-like view of a stream or an iterator of byte chunks that counts what it reads and how long it waits."""
+
+    def __init__(self, source):
+        self._read = getattr(source, "read", None)
+        self._chunks = None if self._read else iter(source)
+        self._pending = b""
+        self.bytes = 0
+        self.wait = 0.0
+
+    def read(self, size=-1):
+        started = time.perf_counter()
+        if self._read:
+            data = self._read(size)
+        else:
+            while size < 0 or len(self._pending) < size:
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    break
+                self._pending += chunk
+            cut = len(self._pending) if size < 0 else size
+            data, self._pending = self._pending[:cut], self._pending[cut:]
+        self.wait += time.perf_counter() - started
+        self.bytes += len(data)
+        return data
+
+class DecompressingReader:
+    """
+    Read-only file-like object inflating a gzip or zstd stream incrementally.
+
+    `source` is a file-like object or an iterator of byte chunks. Iterating yields
+    decompressed pieces of at most `read_size` bytes. No more than `max_bytes`
+    are ever inflated. stats() reports the bytes in and out and the seconds spent
+    decompressing, not counting waits for input.
+
+    Raises:
+        UploadError: If the encoding is unsupported, or (from read) the data is corrupt.
+        UploadTooLargeError: From read, once the data inflates past `max_bytes`.
+    """
+
+    def __init__(self, source, encoding, read_size=64 * 1024, max_bytes=MAX_DECOMPRESSED_BYTES):
+        self.encoding = encoding
+        self.read_size = read_size
+        self.max_bytes = max_bytes
+        self._input = _InputReader(source)
+        if encoding == "gzip":
+            self._reader = gzip.GzipFile(fileobj=self._input, mode="rb")
+            self._errors = (OSError, EOFError, zlib.error)
+        elif encoding == "zstd":
+            if zstandard is None:
+                raise UploadError("zstd uploads need the zstandard package on the server")
+            self._reader = zstandard.ZstdDecompressor().stream_reader(self._input, read_across_frames=True)
+            self._errors = (zstandard.ZstdError, OSError)
+        else:
+            raise UploadError(f"Unsupported content encoding {encoding}")
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def read(self, size=-1):
+        # Never ask for more than one byte past the limit, so it is detected
+        # without inflating the rest
+        limit = self.max_bytes - self.bytes_out + 1
+        size = limit if size is None or size < 0 else min(size, limit)
+        started = time.perf_counter()
+        waited = self._input.wait
+        try:
+            data = self._reader.read(size)
+        except self._errors as e:
+            raise UploadError(f"Corrupt {self.encoding} data: {e}") from None
+        self.seconds += time.perf_counter() - started - (self._input.wait - waited)
+        self.bytes_out += len(data)
+        if self.bytes_out > self.max_bytes:
+            raise UploadTooLargeError(f"Upload inflates to more than {self.max_bytes} bytes")
+        return data
+
+    def __iter__(self):
+        return iter(lambda: self.read(self.read_size), b"")
+
+    def stats(self):
+        """Bytes in and out, decompression seconds and throughput in uncompressed bytes per second."""
+        return {
+            "encoding": self.encoding,
+            "bytes_in": self._input.bytes,
+            "bytes_out": self.bytes_out,
+            "seconds": round(self.seconds, 6),
+            "bytes_per_second": round(self.bytes_out / self.seconds, 1) if self.seconds > 0 else None
+        }
+
+def decompress_request_body(environ, max_bytes=MAX_DECOMPRESSED_BYTES):
+    """
+    Replace a gzip or zstd encoded WSGI request body with a DecompressingReader
+    inflating at most `max_bytes`, so the form and multipart parsers see the plain
+    body. Call it before anything reads the request stream.
+
+    Returns:
+        DecompressingReader | None: The reader, or None for an unencoded body.
+    """
+    encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+    if not encoding or encoding == "identity":
+        return None
+    if encoding not in CONTENT_ENCODINGS:
+        raise UploadError(f"Unsupported content encoding {encoding}")
+    reader = DecompressingReader(get_input_stream(environ), CONTENT_ENCODINGS[encoding], max_bytes=max_bytes)
+    environ["wsgi.input"] = reader
+    environ["wsgi.input_terminated"] = True
+    environ.pop("CONTENT_LENGTH", None)
+    return reader
+
+# ==================================================== #
+class ChunkedUploadStore:
+    """
+    Resumable uploads kept under one directory, one folder per upload id:
+
+        manifest.json   size, chunk size, chunk count and the caller's metadata
+        data.part       the file being assembled, preallocated to its final size
+        chunks          one byte per chunk, set to 1 once that chunk is stored
+
+    Chunks touch disjoint byte ranges of both files, so concurrent chunk requests
+    for one upload need no locking. Uploads idle for longer than `ttl` seconds are
+    removed when the next one is created.
+    """
+
+    def __init__(self, root, max_chunk_size=16 * 1024 * 1024, ttl=24 * 3600, read_size=64 * 1024):
+        self.root = root
+        self.max_chunk_size = max_chunk_size
+        self.ttl = ttl
+        self.read_size = read_size
+
+    def _dir(self, upload_id):
+        if not UPLOAD_ID_PATTERN.fullmatch(str(upload_id)):
+            raise UnknownUploadError(f"Unknown upload id {upload_id}")
+        return os.path.join(self.root, upload_id)
+
+    def create(self, size, chunk_size, meta=None):
+        """
+        Open an upload of `size` bytes sent in chunks of `chunk_size` (the last one
+        may be shorter) and return its status.
+
+        Raises:
+            UploadError: If the size or chunk size is out of range.
+        """
+        try:
+            size, chunk_size = int(size), int(chunk_size)
+        except (TypeError, ValueError):
+            raise UploadError("size and chunk_size must be integers") from None
+        if size < 0:
+            raise UploadError("size must be a non-negative integer")
+        if not 0 < chunk_size <= self.max_chunk_size:
+            raise UploadError(f"chunk_size must be between 1 and {self.max_chunk_size} bytes")
+
+        self.expire()
+        upload_id = uuid.uuid4().hex
+        folder = os.path.join(self.root, upload_id)
+        os.makedirs(folder)
+        manifest = {
+            "upload_id": upload_id,
+            "size": size,
+            "chunk_size": chunk_size,
+            "chunks": -(-size // chunk_size),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "meta": meta or {}
+        }
+        with open(os.path.join(folder, "data.part"), "wb") as f:
+            f.truncate(size)
+        with open(os.path.join(folder, "chunks"), "wb") as f:
+            f.write(bytes(manifest["chunks"]))
+        with open(os.path.join(folder, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+        return self.status(upload_id)
+
+    def get(self, upload_id):
+        """Return the manifest of an upload."""
+        try:
+            with open(os.path.join(self._dir(upload_id), "manifest.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UnknownUploadError(f"Unknown upload id {upload_id}") from None
+
+    def _received(self, upload_id):
+        with open(os.path.join(self._dir(upload_id), "chunks"), "rb") as f:
+            return f.read()
+
+    def status(self, upload_id):
+        """Return the upload's manifest fields with the chunk indexes received and missing."""
+        manifest = self.get(upload_id)
+        received = self._received(upload_id)
+        have = [index for index, flag in enumerate(received) if flag]
+        last = manifest["chunks"] - 1
+        return {
+            "upload_id": upload_id,
+            "size": manifest["size"],
+            "chunk_size": manifest["chunk_size"],
+            "chunks": manifest["chunks"],
+            "received": have,
+            "missing": [index for index, flag in enumerate(received) if not flag],
+            "bytes_received": sum(
+                manifest["size"] - index * manifest["chunk_size"] if index == last else manifest["chunk_size"]
+                for index in have
+            ),
+            "complete": len(have) == manifest["chunks"]
+        }
+
+    def write_chunk(self, upload_id, index, offset, stream, checksum):
+        """
+        Read chunk `index` from a file-like `stream` and write it at `offset` of the
+        upload. Sending a chunk again overwrites it, so retries are always safe.
+
+        Raises:
+            UnknownUploadError: If the upload does not exist.
+            UploadError: If the index, offset, length or SHA-256 `checksum` do not
+                match; the chunk is then left marked as missing.
+        """
+        manifest = self.get(upload_id)
+        try:
+            index, offset = int(index), int(offset)
+        except (TypeError, ValueError):
+            raise UploadError("index and offset must be integers") from None
+        if not 0 <= index < manifest["chunks"]:
+            raise UploadError(f"Chunk index must be between 0 and {manifest['chunks'] - 1}")
+        if offset != index * manifest["chunk_size"]:
+            raise UploadError(f"Chunk {index} starts at offset {index * manifest['chunk_size']}, not {offset}")
+        length = min(manifest["chunk_size"], manifest["size"] - offset)
+
+        folder = self._dir(upload_id)
+        digest = hashlib.sha256()
+        written = 0
+        fd = os.open(os.path.join(folder, "data.part"), os.O_WRONLY)
+        try:
+            while True:
+                piece = stream.read(min(self.read_size, length + 1 - written))
+                if not piece:
+                    break
+                if written + len(piece) > length:
+                    raise UploadError(f"Chunk {index} is longer than {length} bytes")
+                digest.update(piece)
+                os.pwrite(fd, piece, offset + written)
+                written += len(piece)
+        finally:
+            os.close(fd)
+        if written != length:
+            raise UploadError(f"Chunk {index} has {written} bytes, expected {length}")
+        if not checksum or checksum.lower() != digest.hexdigest():
+            raise UploadError(f"Chunk {index} does not match its checksum")
+
+        fd = os.open(os.path.join(folder, "chunks"), os.O_WRONLY)
+        try:
+            os.pwrite(fd, b"\x01", index)
+        finally:
+            os.close(fd)
+        return {"upload_id": upload_id, "index": index, "bytes": written, "sha256": digest.hexdigest()}
+
+    def complete(self, upload_id, target_path):
+        """
+        Move the assembled file to `target_path` and forget the upload.
+
+        Raises:
+            UnknownUploadError: If the upload does not exist.
+            IncompleteUploadError: If chunks are still missing.
+        """
+        status = self.status(upload_id)
+        if not status["complete"]:
+            raise IncompleteUploadError(f"{len(status['missing'])} of {status['chunks']} chunks are missing")
+        folder = self._dir(upload_id)
+        try:
+            os.replace(os.path.join(folder, "data.part"), target_path)
+        except FileNotFoundError:
+            raise UnknownUploadError(f"Unknown upload id {upload_id}") from None
+        shutil.rmtree(folder, ignore_errors=True)
+        return target_path
+
+    def discard(self, upload_id):
+        """Delete an upload and the chunks received so far."""
+        shutil.rmtree(self._dir(upload_id), ignore_errors=True)
+
+    def expire(self):
+        """Delete uploads that received nothing for longer than the ttl."""
+        if not os.path.isdir(self.root):
+            return
+        deadline = time.time() - self.ttl
+        for upload_id in os.listdir(self.root):
+            folder = os.path.join(self.root, upload_id)
+            try:
+                if os.path.getmtime(os.path.join(folder, "chunks")) < deadline:
+                    shutil.rmtree(folder, ignore_errors=True)
+            except OSError:
+                continue